@@ -12,40 +12,51 @@
 
 
 
+import asyncio
 import logging
 import os
 import re
 import subprocess
 import platform
 import sqlite3
+import time
+import uuid
+import zipfile
 
 import pandas as pd
 
 from fastapi import FastAPI, HTTPException, File, UploadFile, Depends, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
+from typing import List
 from pathlib import Path
 from datetime import datetime
 
 from setcfg import add_user, delete_user, read_users, show_users
 from main import get_config, sync_configs
-from scripts.process import generate_report
+from scripts.process import warm_up, preview_statement, resolve_period
+from scripts.browser import get_browser_pool
+from scripts.commands import get_setting
+from scripts.batch import unpack_uploads, stream_group_zip
+from scripts.jobs import (init_jobs_db, get_job, queue_position, group_jobs,
+                          STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+from scripts.exports import OUTPUT_FORMATS, FORMAT_PDF, get_media_type
+from scripts.counterparties import search_counterparties
+from scripts.diff import diff_statements, render_diff
+from scripts.admission import sniff_statement, estimate_cost, check_admission, admit_jobs
+from scripts.worker import (work_loop, make_worker_id, get_artifacts_dir, cleanup_orphans, embedded_workers_enabled,
+                            request_cancel)
 from scripts.telegram_start import start_bot
 
 
 
 
 DB_FILE = "users.db"
+BASE_URL = "http://127.0.0.1:8000"
 
 security = HTTPBearer()
 
-columns_to_check = ['Операции на счетах', 'Unnamed: 1', 'Unnamed: 2', 'Unnamed: 3', 'Unnamed: 4', 'Unnamed: 5', 'Unnamed: 6', 'Unnamed: 7', 
-                    'Unnamed: 8', 'Unnamed: 9', 'Unnamed: 10', 'Unnamed: 11', 'Unnamed: 12', 'Unnamed: 13', 'Unnamed: 14', 'Unnamed: 15', 
-                    'Unnamed: 16', 'Unnamed: 17', 'Unnamed: 18', 'Unnamed: 19', 'Unnamed: 20', 'Unnamed: 21', 'Unnamed: 22', 'Unnamed: 23', 
-                    'Unnamed: 24', 'Unnamed: 25', 'Unnamed: 26', 'Unnamed: 27', 'Unnamed: 28', 'Unnamed: 29', 
-                    'Unnamed: 30', 'Unnamed: 31', 'Unnamed: 32', 'Unnamed: 33', 'Unnamed: 34', 'Unnamed: 35']
-
 #RU
 # Классы и зависимости
 # Класс User представляет данные пользователя.
@@ -183,32 +194,120 @@ async def log_request(request: Request):
 
 
 app = FastAPI(dependencies=[Depends(log_request)])
+app.state.ready = False
+app.state.degraded = None
+
+#RU
+# Функция warm_up_app
+# На вход: ничего.
+# Возвращает: ничего.
+# Прогревает процесс (импорты, шаблоны, браузеры, пробный отчет) и отмечает его готовым.
+# До завершения прогрева /readyz отвечает 503. Неудачный прогрев повторяется с растущей паузой
+# (параметры warmup_attempts и warmup_backoff_max в секции [RENDER]); если все попытки не удались,
+# процесс все равно отмечается готовым, а /readyz сообщает о деградации и последней ошибке.
+
+#ENG
+# Function warm_up_app
+# Input: none.
+# Returns: none.
+# Warms the process up (imports, templates, browsers, dummy report) and marks it ready.
+# Until warm-up completes /readyz answers 503. A failed warm-up is retried with a growing pause
+# (the warmup_attempts and warmup_backoff_max parameters in the [RENDER] section); if every attempt fails,
+# the process is still marked ready, and /readyz reports the degraded state and the last error.
+async def warm_up_app():
+    if not get_setting('RENDER', 'warmup', True, bool):
+        app.state.ready = True
+        return
+    attempts = max(1, get_setting('RENDER', 'warmup_attempts', 5, int))
+    backoff_max = get_setting('RENDER', 'warmup_backoff_max', 60, float)
+    for attempt in range(1, attempts + 1):
+        try:
+            await warm_up()
+            app.state.degraded = None
+            logging.info("Прогрев завершен, инстанс готов принимать запросы.")
+            break
+        except Exception as e:
+            app.state.degraded = f"{type(e).__name__}: {e}"
+            logging.error(f"Ошибка при прогреве (попытка {attempt} из {attempts}): {e}")
+            if attempt < attempts:
+                await asyncio.sleep(min(backoff_max, 2 ** (attempt - 1)))
+    else:
+        # Без прогрева первый отчет будет медленнее, но рендер может и восстановиться сам:
+        # процесс принимает запросы, а балансировщик видит деградацию в ответе /readyz
+        logging.error("Прогрев не удался, инстанс работает без прогрева.")
+    app.state.ready = True
 
 #RU
 # Обработчик событий startup_event
 # На вход: ничего.
 # Возвращает: ничего.
-# Он запускает Телеграм-бот как отдельный процесс.
+# Он запускает Телеграм-бот как отдельный процесс (если API не запущен супервизором),
+# начинает прогрев и подключает очередь задач.
 
 #ENG
 # Event handler startup_event
 # Input: nothing.
 # Returns: nothing.
-# It launches the Telegram bot as a separate process.
+# It launches the Telegram bot as a separate process (unless the API runs under the supervisor),
+# starts the warm-up and attaches the job queue.
 
 
 @app.on_event("startup")
 async def startup_event():
-    try:
-        if platform.system() == "Windows":
-            command = ["py", "main.py"]
-        else:
-            command = ["python3", "main.py"]
+    # Под супервизором (runner.py) бот запускается и перезапускается самим супервизором
+    if not os.environ.get("REPORTGEN_SUPERVISED"):
+        try:
+            if platform.system() == "Windows":
+                command = ["py", "main.py"]
+            else:
+                command = ["python3", "main.py"]
+
+            subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            print("Телеграм-бот запущен как отдельный процесс.")
+        except Exception as e:
+            print(f"Ошибка при запуске телеграм-бота: {e}")
+
+    # Прогрев идет в фоне, чтобы /healthz отвечал сразу
+    app.state.warm_up_task = asyncio.create_task(warm_up_app())
+
+    # Очередь задач: задачи, не завершенные до перезапуска, будут подхвачены снова
+    init_jobs_db()
+    cleanup_orphans()
+    app.state.stop_workers = asyncio.Event()
+    if embedded_workers_enabled():
+        app.state.worker_task = asyncio.create_task(work_loop(make_worker_id(), stop_event=app.state.stop_workers))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.stop_workers.set()
+    await get_browser_pool().close()
 
-        subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print("Телеграм-бот запущен как отдельный процесс.")
-    except Exception as e:
-        print(f"Ошибка при запуске телеграм-бота: {e}")
+#RU
+# Маршруты /healthz и /readyz (GET)
+# На вход: ничего.
+# Возвращает: /healthz - 200, пока процесс жив; /readyz - 200 после прогрева, иначе 503.
+# Если прогрев так и не удался, /readyz отвечает 200 со статусом degraded и текстом последней ошибки.
+# Используются балансировщиком, чтобы направлять трафик только на прогретые инстансы.
+
+#ENG
+# Routes /healthz and /readyz (GET)
+# Input: nothing.
+# Returns: /healthz - 200 while the process is alive; /readyz - 200 after warm-up, otherwise 503.
+# If warm-up never succeeded, /readyz answers 200 with the degraded status and the last error text.
+# Used by the load balancer to send traffic only to warmed instances.
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={"status": "warming up", "error": app.state.degraded})
+    if app.state.degraded:
+        return {"status": "degraded", "error": app.state.degraded}
+    return {"status": "ready"}
 
 #RU
 # Маршрут /users (GET)
@@ -286,27 +385,130 @@ def remove_user(user_id: str, token: str = Depends(authenticate)):
 
 @app.get("/download/{file_name}")
 async def download_file(file_name: str):
-    file_path = f"./processed/{file_name}"
-    if not os.path.exists(file_path):
+    file_path = get_artifacts_dir() / file_name
+    if not file_path.exists():
         raise HTTPException(status_code=404, detail="Файл не найден")
-    return FileResponse(path=file_path, filename=file_name, media_type='application/pdf')
+    return FileResponse(path=file_path, filename=file_name, media_type=get_media_type(file_path))
+
+#RU
+# Функция job_response
+# На вход: словарь задачи из очереди.
+# Возвращает: описание задачи для ответа API (статус, позиция, ссылка на скачивание и сводка качества данных или ошибка).
+
+#ENG
+# Function job_response
+# Input: a job dictionary from the queue.
+# Returns: the job description for an API response (status, position, download link and data-quality summary, or error).
+def job_response(job: dict) -> dict:
+    response = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"{BASE_URL}/jobs/{job['id']}",
+    }
+    if job["status"] == STATUS_QUEUED:
+        response["lane"] = job["lane"]
+        response["position"] = queue_position(job["id"])
+    elif job["status"] == STATUS_DONE:
+        response["download_url"] = f"{BASE_URL}/download/{Path(job['result_path']).name}"
+        if job.get("meta") and job["meta"].get("quality"):
+            response["quality"] = job["meta"]["quality"]
+    elif job["status"] == STATUS_FAILED:
+        response["error"] = job["error"]
+    elif job["status"] == STATUS_RUNNING and job.get("cancel_requested"):
+        response["cancel_requested"] = True
+    if job.get("group_id"):
+        response["group_id"] = job["group_id"]
+    return response
+
+#RU
+# Функция load_job_response
+# На вход: ID задачи.
+# Возвращает: ответ по задаче (см. job_response) или None, если задачи нет.
+# Читает базу очереди синхронно, поэтому из маршрутов вызывается через asyncio.to_thread.
+
+#ENG
+# Function load_job_response
+# Input: job ID.
+# Returns: the job response (see job_response) or None if there is no such job.
+# Reads the queue database synchronously, so routes call it via asyncio.to_thread.
+def load_job_response(job_id: str):
+    job = get_job(job_id)
+    return job_response(job) if job else None
+
+#RU
+# Функция ensure_admitted
+# На вход: имя пользователя и оценка стоимости задачи.
+# Возвращает: ничего.
+# Если задачу нельзя принять, выбрасывает HTTPException 429 с заголовком Retry-After
+# (или 413, если файл превышает лимит на одну задачу).
+
+#ENG
+# Function ensure_admitted
+# Input: username and the estimated job cost.
+# Returns: nothing.
+# If the job cannot be admitted, raises HTTPException 429 with a Retry-After header
+# (or 413 if the file exceeds the per-job limit).
+def ensure_admitted(username: str, cost: int) -> None:
+    raise_rejected(check_admission(username, cost))
+
+#RU Отказ контроля приема в виде HTTPException: 413 для слишком большого файла, иначе 429 с Retry-After
+#ENG An admission rejection as HTTPException: 413 for a file that is too large, otherwise 429 with Retry-After
+def raise_rejected(decision) -> None:
+    if decision.admitted:
+        return
+    if not decision.retry_after:
+        raise HTTPException(status_code=413, detail=decision.reason)
+    raise HTTPException(
+        status_code=429,
+        detail=f"Сервис перегружен, попробуйте позже. {decision.reason}",
+        headers={"Retry-After": str(decision.retry_after)}
+    )
+
+#RU
+# Функция enqueue_admitted
+# На вход: имя пользователя, список задач (путь к файлу, исходное имя файла, параметры, стоимость) и ID группы задач.
+# Возвращает: список ID созданных задач.
+# Проверяет нагрузку и ставит задачи в очередь в одной транзакции (см. admit_jobs), поэтому
+# одновременные загрузки не превышают лимиты. При отказе выбрасывает HTTPException (см. ensure_admitted).
+
+#ENG
+# Function enqueue_admitted
+# Input: username, a list of jobs (file path, original file name, parameters, cost), and the job group ID.
+# Returns: the list of created job IDs.
+# Checks the load and enqueues the jobs in one transaction (see admit_jobs), so concurrent
+# uploads do not exceed the limits. Raises HTTPException on rejection (see ensure_admitted).
+async def enqueue_admitted(username: str, specs: list, group_id: str = None) -> list:
+    decision, job_ids = await asyncio.to_thread(admit_jobs, "api", username, specs, group_id)
+    raise_rejected(decision)
+    return job_ids
 
 #RU
 # Маршрут /process (POST)
-# На вход: загружаемый файл и токен для аутентификации.
-# Возвращает: URL для скачивания обработанного файла.
-# Он обрабатывает файл, проверяет его структуру, генерирует PDF и сохраняет результат
+# На вход: загружаемый файл, флаг ожидания результата, формат результата (pdf, csv, xlsx, json, html),
+# флаг инкрементального обновления, период (например, 2024-Q1 или 2024-01-01..2024-03-31)
+# и токен для аутентификации.
+# Возвращает: URL для скачивания обработанного файла или ID задачи в очереди.
+# Он проверяет структуру файла и ставит его в постоянную очередь задач.
+# При wait=true (по умолчанию) ждет завершения задачи, как и раньше.
+# Если клиент отключился, не дождавшись результата, задача отменяется.
 
 #ENG
 # Route /process (POST)
-# Input: uploaded file and token for authentication.
-# Returns: URL for downloading the processed file.
-# It processes the file, validates its structure, generates a PDF, and saves the result.
+# Input: uploaded file, wait-for-result flag, output format (pdf, csv, xlsx, json, html),
+# incremental update flag, period (e.g. 2024-Q1 or 2024-01-01..2024-03-31),
+# and token for authentication.
+# Returns: URL for downloading the processed file or the ID of the queued job.
+# It validates the file structure and puts it into the persistent job queue.
+# With wait=true (the default) it waits for the job to finish, as before.
+# If the client disconnects before the result is ready, the job is cancelled.
 
 
 @app.post("/process")
-async def process_files(file: UploadFile = File(...), token: str = Depends(authenticate)):
+async def process_files(request: Request, file: UploadFile = File(...), wait: bool = True,
+                        output_format: str = FORMAT_PDF, incremental: bool = None, period: str = "",
+                        token: str = Depends(authenticate)):
     temp_file_path = None  # Инициализация переменной
+    job_id = None
 
     try:
         # Проверяем, что файл загружен
@@ -324,18 +526,28 @@ async def process_files(file: UploadFile = File(...), token: str = Depends(authe
                 detail="Неверный формат файла. Ожидается файл с расширением .xlsx"
             )
 
+        output_format = check_output_format(output_format)
+        period = check_period(period)
+        if incremental is None:
+            incremental = get_setting("INCREMENTAL", "enabled", False, bool)
+
         # Создаём временную директорию для файлов API
         api_dir = Path("./downloads/api/")
         api_dir.mkdir(parents=True, exist_ok=True)
 
-        # Очищаем имя файла
-        safe_filename = sanitize_filename(file.filename)
+        # Очищаем имя файла, префикс не дает одноименным файлам в очереди перезаписать друг друга
+        safe_filename = f"{uuid.uuid4().hex[:8]}_{sanitize_filename(file.filename)}"
         temp_file_path = api_dir / safe_filename  # Pathlib автоматически адаптирует путь для ОС
 
+        username = get_username_by_token(token)
+        content = await file.read()
+        logging.info(f"Размер полученного файла: {len(content)} байт")
+
+        # Первая проверка нагрузки - по размеру файла, еще до записи на диск
+        ensure_admitted(username, estimate_cost(len(content)))
+
         # Сохраняем файл
         with open(temp_file_path, "wb") as f:
-            content = await file.read()
-            logging.info(f"Размер полученного файла: {len(content)} байт")
             f.write(content)
         logging.info(f"Файл успешно сохранён: {temp_file_path}")
 
@@ -346,39 +558,51 @@ async def process_files(file: UploadFile = File(...), token: str = Depends(authe
                 detail=f"Файл {temp_file_path} не найден после сохранения."
             )
 
-        # Проверяем структуру данных
-        import warnings
-        warnings.simplefilter("ignore", UserWarning)  # Подавляем предупреждения openpyxl
-
-        df = pd.read_excel(temp_file_path, engine="openpyxl")
-        if list(df.columns) != columns_to_check:
+        # Проверяем структуру данных по заголовку, не разбирая весь лист
+        sniff = await asyncio.to_thread(sniff_statement, str(temp_file_path))
+        if sniff["layout"] is None:
             logging.error(f"Структура файла не соответствует требованиям: {temp_file_path}")
             raise HTTPException(
                 status_code=400,
                 detail="Файл не соответствует ожидаемой структуре."
             )
 
-        # Генерируем PDF
-        logging.info(f"Передаём файл в generate_report: {safe_filename}")
-        pdf_path = await generate_report(file_to_prepare=str(safe_filename), api=True)
-
-        if not Path(pdf_path).exists():
+        # Уточняем стоимость по числу строк и ставим файл в очередь, окончательно проверяя нагрузку
+        # в той же транзакции; дальше файлом владеет воркер
+        cost = estimate_cost(len(content), sniff["rows"])
+        job_id, = await enqueue_admitted(username, [(
+            str(temp_file_path), file.filename,
+            {"output_format": output_format, "incremental": incremental, "period": period}, cost
+        )])
+
+        if not wait:
+            return {"message": "Файл поставлен в очередь.", **await asyncio.to_thread(load_job_response, job_id)}
+
+        # Ждем завершения задачи, не блокируя цикл событий запросами к базе очереди
+        deadline = time.monotonic() + get_setting("JOBS", "wait_timeout", 600, int)
+        job = await asyncio.to_thread(get_job, job_id)
+        while job["status"] in (STATUS_QUEUED, STATUS_RUNNING) and time.monotonic() < deadline:
+            await asyncio.sleep(1)
+            if await request.is_disconnected():
+                # Результат некому отдать - не тратим на него браузер
+                logging.info(f"Клиент отключился, отменяем задачу {job_id}")
+                await asyncio.to_thread(request_cancel, job_id)
+                return {"message": "Клиент отключился, задача отменена.", "job_id": job_id}
+            job = await asyncio.to_thread(get_job, job_id)
+
+        if job["status"] == STATUS_FAILED:
             raise HTTPException(
                 status_code=500,
-                detail="Ошибка при генерации отчёта."
+                detail=f"Ошибка при генерации отчёта: {job['error']}"
             )
+        if job["status"] == STATUS_CANCELLED:
+            raise HTTPException(status_code=409, detail="Задача была отменена.")
+        if job["status"] != STATUS_DONE:
+            return {"message": "Файл ещё обрабатывается.", **await asyncio.to_thread(job_response, job)}
 
-        # Возвращаем ссылку на скачивание
-        processed_dir = Path("./processed")
-        processed_dir.mkdir(parents=True, exist_ok=True)
-        processed_file_name = Path(pdf_path).name
-        processed_file_path = processed_dir / processed_file_name
-        Path(pdf_path).rename(processed_file_path)  # Перемещаем PDF
-
-        download_url = f"http://127.0.0.1:8000/download/{processed_file_name}"
         return {
             "message": "Файл успешно обработан.",
-            "download_url": download_url
+            **job_response(job)
         }
 
     except HTTPException as e:
@@ -391,9 +615,439 @@ async def process_files(file: UploadFile = File(...), token: str = Depends(authe
         )
 
     finally:
-        if temp_file_path and temp_file_path.exists():
+        # Файл, попавший в очередь, удалит воркер
+        if job_id is None and temp_file_path and temp_file_path.exists():
             temp_file_path.unlink() 
 
+#RU
+# Функция save_statements
+# На вход: список пар (имя файла, содержимое).
+# Возвращает: принятые файлы (имя, путь, стоимость) и описания отклоненных файлов.
+# Сохраняет каждый файл в downloads/api и проверяет его структуру по заголовку.
+# Нагрузка проверяется при постановке в очередь (см. enqueue_statements).
+
+#ENG
+# Function save_statements
+# Input: a list of (file name, content) pairs.
+# Returns: the accepted files (name, path, cost) and descriptions of the rejected files.
+# Saves each file into downloads/api and validates its structure by the header.
+# The load is checked when the files are enqueued (see enqueue_statements).
+async def save_statements(uploads: list) -> tuple:
+    api_dir = Path("./downloads/api/")
+    api_dir.mkdir(parents=True, exist_ok=True)
+    accepted = []
+    rejected = []
+    try:
+        for file_name, content in uploads:
+            if not file_name.endswith(".xlsx"):
+                rejected.append({"file_name": file_name, "status": "rejected",
+                                 "error": "Ожидается файл с расширением .xlsx"})
+                continue
+            temp_file_path = api_dir / f"{uuid.uuid4().hex[:8]}_{sanitize_filename(file_name)}"
+            with open(temp_file_path, "wb") as f:
+                f.write(content)
+            try:
+                sniff = await asyncio.to_thread(sniff_statement, str(temp_file_path))
+            except Exception:
+                sniff = None
+            if sniff is None or sniff["layout"] is None:
+                temp_file_path.unlink()
+                rejected.append({"file_name": file_name, "status": "rejected",
+                                 "error": "Файл не соответствует ожидаемой структуре."})
+                continue
+            accepted.append((file_name, temp_file_path, estimate_cost(len(content), sniff["rows"])))
+    except BaseException:
+        remove_statements(accepted)
+        raise
+    return accepted, rejected
+
+#RU Удаление сохраненных файлов, которые не попали в очередь
+#ENG Removes saved files that did not make it into the queue
+def remove_statements(accepted: list) -> None:
+    for _, temp_file_path, _ in accepted:
+        if temp_file_path.exists():
+            temp_file_path.unlink()
+
+#RU
+# Функция enqueue_statements
+# На вход: имя пользователя, принятые файлы (см. save_statements), список задач (см. enqueue_admitted)
+# и ID группы задач.
+# Возвращает: список ID созданных задач.
+# Нагрузка проверяется один раз на все задачи вместе с постановкой в очередь; при отказе
+# сохраненные файлы удаляются.
+
+#ENG
+# Function enqueue_statements
+# Input: username, the accepted files (see save_statements), a list of jobs (see enqueue_admitted),
+# and the job group ID.
+# Returns: the list of created job IDs.
+# The load is checked once for all jobs together with the enqueue; on rejection
+# the saved files are removed.
+async def enqueue_statements(username: str, accepted: list, specs: list, group_id: str = None) -> list:
+    try:
+        return await enqueue_admitted(username, specs, group_id)
+    except BaseException:
+        remove_statements(accepted)
+        raise
+
+#RU
+# Функция read_uploads
+# На вход: список загружаемых файлов.
+# Возвращает: список пар (имя файла, содержимое) с распакованными ZIP-архивами.
+# Выбрасывает HTTPException, если архив поврежден или файлов больше max_files (секция [BATCH]).
+
+#ENG
+# Function read_uploads
+# Input: a list of uploaded files.
+# Returns: a list of (file name, content) pairs with ZIP archives unpacked.
+# Raises HTTPException if an archive is broken or there are more than max_files files (the [BATCH] section).
+async def read_uploads(files: list) -> list:
+    try:
+        uploads = unpack_uploads([(file.filename or "", await file.read()) for file in files])
+    except (zipfile.BadZipFile, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Не удалось распаковать архив: {e}")
+    max_files = get_setting("BATCH", "max_files", 100, int)
+    if len(uploads) > max_files:
+        raise HTTPException(status_code=413, detail=f"Слишком много файлов: {len(uploads)} при лимите {max_files}")
+    return uploads
+
+#RU
+# Функция check_output_format
+# На вход: формат результата.
+# Возвращает: формат в нижнем регистре. Выбрасывает HTTPException 400 для неизвестного формата.
+
+#ENG
+# Function check_output_format
+# Input: output format.
+# Returns: the format in lower case. Raises HTTPException 400 for an unknown format.
+def check_output_format(output_format: str) -> str:
+    output_format = output_format.lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неверный формат результата. Допустимые значения: {', '.join(OUTPUT_FORMATS)}"
+        )
+    return output_format
+
+#RU
+# Функция check_period
+# На вход: период (см. scripts/periods.py или коды меню 1-5).
+# Возвращает: период без изменений. Выбрасывает HTTPException 400, если период не разобран.
+
+#ENG
+# Function check_period
+# Input: period (see scripts/periods.py or menu codes 1-5).
+# Returns: the period unchanged. Raises HTTPException 400 if the period cannot be parsed.
+def check_period(period: str) -> str:
+    try:
+        resolve_period(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return period
+
+#RU
+# Маршрут /process/batch (POST)
+# На вход: несколько загружаемых файлов .xlsx и/или ZIP-архивов с ними, формат результата
+# и токен для аутентификации.
+# Возвращает: ID группы задач, статус каждого файла и ссылку на ZIP с результатами.
+# Каждый файл проверяется отдельно: неподходящие файлы отклоняются, остальные ставятся
+# в очередь одной группой и обрабатываются воркерами параллельно.
+
+#ENG
+# Route /process/batch (POST)
+# Input: several uploaded .xlsx files and/or ZIP archives of them, output format,
+# and token for authentication.
+# Returns: the job group ID, the status of each file, and a link to the ZIP with the results.
+# Each file is validated separately: unsuitable files are rejected, the rest are enqueued
+# as one group and processed by the workers in parallel.
+
+
+@app.post("/process/batch")
+async def process_batch(files: List[UploadFile] = File(...), output_format: str = FORMAT_PDF, period: str = "",
+                        token: str = Depends(authenticate)):
+    output_format = check_output_format(output_format)
+    period = check_period(period)
+    username = get_username_by_token(token)
+    uploads = await read_uploads(files)
+    accepted, results = await save_statements(uploads)
+
+    group_id = uuid.uuid4().hex
+    if accepted:
+        job_ids = await enqueue_statements(username, accepted, [
+            (str(temp_file_path), file_name, {"output_format": output_format, "period": period}, cost)
+            for file_name, temp_file_path, cost in accepted
+        ], group_id)
+        for (file_name, _, _), job_id in zip(accepted, job_ids):
+            results.append({"file_name": file_name, **await asyncio.to_thread(load_job_response, job_id)})
+
+    logging.info(f"Пакет {group_id}: принято {len(accepted)} из {len(uploads)} файлов")
+    return {
+        "group_id": group_id,
+        "status_url": f"{BASE_URL}/groups/{group_id}",
+        "download_url": f"{BASE_URL}/groups/{group_id}/download",
+        "files": results,
+    }
+
+#RU
+# Маршрут /process/consolidate (POST)
+# На вход: выписки по нескольким счетам (файлы .xlsx и/или ZIP-архивы), формат результата
+# и токен для аутентификации.
+# Возвращает: ID одной задачи, которая построит сводный отчет, и описания отклоненных файлов.
+# Воркер разбирает выписки параллельно, объединяет их по названию/ИНН контрагента
+# и убирает повторяющиеся операции из пересекающихся выписок.
+
+#ENG
+# Route /process/consolidate (POST)
+# Input: statements for several accounts (.xlsx files and/or ZIP archives), output format,
+# and token for authentication.
+# Returns: the ID of a single job that builds the consolidated report, and descriptions of rejected files.
+# The worker parses the statements in parallel, merges them by counterparty name/INN,
+# and removes repeated operations from overlapping statements.
+
+
+@app.post("/process/consolidate")
+async def process_consolidate(files: List[UploadFile] = File(...), output_format: str = FORMAT_PDF,
+                              period: str = "", token: str = Depends(authenticate)):
+    output_format = check_output_format(output_format)
+    period = check_period(period)
+    username = get_username_by_token(token)
+    uploads = await read_uploads(files)
+    accepted, rejected = await save_statements(uploads)
+    if not accepted:
+        raise HTTPException(status_code=400, detail={"message": "Нет подходящих файлов.", "files": rejected})
+
+    paths = [str(temp_file_path.resolve()) for _, temp_file_path, _ in accepted]
+    job_id, = await enqueue_statements(username, accepted, [(
+        paths[0], f"Сводный отчет ({len(paths)} файлов)",
+        {"output_format": output_format, "files": paths, "period": period},
+        sum(cost for _, _, cost in accepted)
+    )])
+    return {
+        "message": "Файлы поставлены в очередь для сводного отчета.",
+        **await asyncio.to_thread(load_job_response, job_id),
+        "files": [{"file_name": file_name, "status": "accepted"} for file_name, _, _ in accepted] + rejected,
+    }
+
+#RU
+# Маршрут /groups/{group_id} (GET)
+# На вход: ID группы задач и токен для аутентификации.
+# Возвращает: статус каждого файла группы и число завершенных задач.
+
+#ENG
+# Route /groups/{group_id} (GET)
+# Input: job group ID and token for authentication.
+# Returns: the status of each file in the group and the number of finished jobs.
+
+
+@app.get("/groups/{group_id}")
+async def get_group_status(group_id: str, token: str = Depends(authenticate)):
+    jobs = await asyncio.to_thread(group_jobs, group_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Группа задач не найдена")
+    finished = sum(job["status"] not in (STATUS_QUEUED, STATUS_RUNNING) for job in jobs)
+    return {
+        "group_id": group_id,
+        "total": len(jobs),
+        "finished": finished,
+        "download_url": f"{BASE_URL}/groups/{group_id}/download",
+        "files": [{"file_name": job["file_name"], **job_response(job)} for job in jobs],
+    }
+
+#RU
+# Маршрут /groups/{group_id}/download (GET)
+# На вход: ID группы задач и токен для аутентификации.
+# Возвращает: ZIP-архив с отчетами группы. Архив передается потоком: отчеты попадают в него
+# по мере готовности, а ответ завершается, когда обработаны все файлы группы.
+
+#ENG
+# Route /groups/{group_id}/download (GET)
+# Input: job group ID and token for authentication.
+# Returns: a ZIP archive with the group's reports. The archive is streamed: reports go into it
+# as they become ready, and the response ends once every file in the group is processed.
+
+
+@app.get("/groups/{group_id}/download")
+async def download_group(group_id: str, token: str = Depends(authenticate)):
+    if not await asyncio.to_thread(group_jobs, group_id):
+        raise HTTPException(status_code=404, detail="Группа задач не найдена")
+    return StreamingResponse(
+        stream_group_zip(group_id),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="reports_{group_id[:8]}.zip"'}
+    )
+
+#RU
+# Маршрут /preview (POST)
+# На вход: загружаемый файл, число крупнейших плательщиков, период и токен для аутентификации.
+# Возвращает: JSON с итогами по выписке: число строк, период, общая сумма, число контрагентов,
+# крупнейшие плательщики и замечания к качеству данных.
+# Выполняет только разбор и агрегацию, без рендера. Разобранная таблица кэшируется,
+# поэтому последующий /process с тем же файлом не разбирает Excel заново.
+
+#ENG
+# Route /preview (POST)
+# Input: uploaded file, number of top payers, period, and token for authentication.
+# Returns: JSON with statement totals: row count, period, total amount, counterparty count,
+# top payers, and data-quality remarks.
+# Runs only parsing and aggregation, no rendering. The parsed table is cached,
+# so a later /process with the same file does not parse Excel again.
+
+
+@app.post("/preview")
+async def preview_file(file: UploadFile = File(...), top: int = 10, period: str = "",
+                       token: str = Depends(authenticate)):
+    period = check_period(period)
+    if not file.filename or not file.filename.endswith(".xlsx"):
+        raise HTTPException(
+            status_code=400,
+            detail="Неверный формат файла. Ожидается файл с расширением .xlsx"
+        )
+
+    api_dir = Path("./downloads/api/")
+    api_dir.mkdir(parents=True, exist_ok=True)
+    temp_file_path = api_dir / f"preview_{uuid.uuid4().hex[:8]}_{sanitize_filename(file.filename)}"
+    try:
+        content = await file.read()
+        ensure_admitted(get_username_by_token(token), estimate_cost(len(content)))
+        with open(temp_file_path, "wb") as f:
+            f.write(content)
+
+        sniff = await asyncio.to_thread(sniff_statement, str(temp_file_path))
+        if sniff["layout"] is None:
+            raise HTTPException(status_code=400, detail="Файл не соответствует ожидаемой структуре.")
+
+        return await asyncio.to_thread(preview_statement, str(temp_file_path.resolve()), max(1, top), period)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Ошибка предпросмотра {file.filename}: {e}")
+        raise HTTPException(status_code=500, detail=f"Не удалось разобрать файл: {e}")
+    finally:
+        if temp_file_path.exists():
+            temp_file_path.unlink()
+
+#RU
+# Маршрут /diff (POST)
+# На вход: базовая выписка, текущая выписка (необязательно), периоды сторон, формат ответа (json или html)
+# и токен для аутентификации.
+# Возвращает: сравнение плательщиков - новые, пропавшие и изменение сумм (см. scripts/diff.py).
+# Без текущей выписки сравниваются два периода базовой выписки (оба периода обязательны).
+# Выписки разбираются через кэш, как в /preview, поэтому сравнение стоит примерно одной агрегации.
+
+#ENG
+# Route /diff (POST)
+# Input: the base statement, the current statement (optional), the periods of each side, the response format (json or html),
+# and token for authentication.
+# Returns: a payer comparison - new, lost and amount changes (see scripts/diff.py).
+# Without the current statement two periods of the base statement are compared (both periods are required).
+# Statements are parsed through the cache, as in /preview, so a comparison costs about one aggregation.
+
+
+@app.post("/diff")
+async def diff_files(base: UploadFile = File(...), current: UploadFile = File(None), base_period: str = "",
+                     current_period: str = "", output_format: str = "json", token: str = Depends(authenticate)):
+    base_period, current_period = check_period(base_period), check_period(current_period)
+    if output_format not in ("json", "html"):
+        raise HTTPException(status_code=400, detail="Неизвестный формат сравнения. Доступны: json, html")
+    if current is None and not (base_period and current_period):
+        raise HTTPException(status_code=400, detail="Передайте вторую выписку или оба периода для сравнения")
+    uploads = [upload for upload in (base, current) if upload is not None]
+    for upload in uploads:
+        if not upload.filename or not upload.filename.endswith(".xlsx"):
+            raise HTTPException(
+                status_code=400,
+                detail="Неверный формат файла. Ожидается файл с расширением .xlsx"
+            )
+
+    api_dir = Path("./downloads/api/")
+    api_dir.mkdir(parents=True, exist_ok=True)
+    temp_paths = [api_dir / f"diff_{uuid.uuid4().hex[:8]}_{sanitize_filename(upload.filename)}" for upload in uploads]
+    try:
+        contents = [await upload.read() for upload in uploads]
+        ensure_admitted(get_username_by_token(token), sum(estimate_cost(len(content)) for content in contents))
+        for temp_file_path, content in zip(temp_paths, contents):
+            with open(temp_file_path, "wb") as f:
+                f.write(content)
+            sniff = await asyncio.to_thread(sniff_statement, str(temp_file_path))
+            if sniff["layout"] is None:
+                raise HTTPException(status_code=400, detail="Файл не соответствует ожидаемой структуре.")
+
+        files = [str(temp_file_path.resolve()) for temp_file_path in temp_paths]
+        diff = await asyncio.to_thread(diff_statements, files[0], files[-1], base_period, current_period)
+        if output_format == "html":
+            return HTMLResponse(render_diff(diff))
+        return diff
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Ошибка сравнения выписок: {e}")
+        raise HTTPException(status_code=500, detail=f"Не удалось сравнить выписки: {e}")
+    finally:
+        for temp_file_path in temp_paths:
+            if temp_file_path.exists():
+                temp_file_path.unlink()
+
+#RU
+# Маршрут /jobs/{job_id} (GET)
+# На вход: ID задачи и токен для аутентификации.
+# Возвращает: статус задачи, позицию в очереди или ссылку на скачивание.
+
+#ENG
+# Route /jobs/{job_id} (GET)
+# Input: job ID and token for authentication.
+# Returns: job status, queue position, or download link.
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, token: str = Depends(authenticate)):
+    response = await asyncio.to_thread(load_job_response, job_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return response
+
+#RU
+# Маршрут /jobs/{job_id} (DELETE)
+# На вход: ID задачи и токен для аутентификации.
+# Возвращает: статус задачи после запроса отмены.
+# Задача в очереди отменяется сразу, выполняющаяся - прерывается воркером в течение нескольких секунд.
+
+#ENG
+# Route /jobs/{job_id} (DELETE)
+# Input: job ID and token for authentication.
+# Returns: the job status after the cancellation request.
+# A queued job is cancelled right away, a running one is aborted by its worker within a few seconds.
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job_route(job_id: str, token: str = Depends(authenticate)):
+    status = await asyncio.to_thread(request_cancel, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if status in (STATUS_DONE, STATUS_FAILED):
+        raise HTTPException(status_code=409, detail="Задача уже завершена")
+    return await asyncio.to_thread(load_job_response, job_id)
+
+#RU
+# Маршрут /counterparties (GET)
+# На вход: ИНН и/или начало названия контрагента, максимальное число результатов и токен для аутентификации.
+# Возвращает: по всем построенным отчетам - каких клиентов и на какую сумму оплачивал контрагент
+# (см. scripts/counterparties.py). Поиск идет по индексу, без повторного разбора выписок.
+
+#ENG
+# Route /counterparties (GET)
+# Input: an INN and/or the beginning of a counterparty name, the maximum number of results, and token for authentication.
+# Returns: across all built reports - which clients the counterparty paid and how much
+# (see scripts/counterparties.py). The lookup uses the index, statements are not parsed again.
+
+
+@app.get("/counterparties")
+async def get_counterparties(inn: str = "", q: str = "", limit: int = 50, token: str = Depends(authenticate)):
+    if not inn.strip() and not q.strip():
+        raise HTTPException(status_code=400, detail="Укажите ИНН (inn) или название контрагента (q)")
+    results = await asyncio.to_thread(search_counterparties, inn.strip() or None, q.strip() or None,
+                                      min(max(1, limit), 1000))
+    return {"inn": inn.strip() or None, "q": q.strip() or None, "total": len(results), "results": results}
+
 #RU
 # Маршрут /config (GET)
 # На вход: токен для аутентификации.
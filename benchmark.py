@@ -0,0 +1,80 @@
+#RU
+# Этот скрипт сравнивает движки чтения Excel (scripts/excel_reader.py) на синтетических выписках.
+# Для каждого размера создается выписка (scripts/synthetic.py), и каждый движок читает ее
+# так же, как prepare_table (без заголовка) - лучшее время из нескольких повторов.
+
+#ENG
+# This script compares the Excel reader engines (scripts/excel_reader.py) on synthetic statements.
+# A statement is created for each size (scripts/synthetic.py), and every engine reads it
+# the same way as prepare_table (without a header) - the best time out of several repeats.
+
+import argparse
+import os
+import tempfile
+import time
+
+from scripts.excel_reader import READERS, READER_CALAMINE, calamine_available, read_sheet
+from scripts.synthetic import make_statement
+
+#RU
+# Функция time_reader
+# На вход: путь к файлу, движок и число повторов.
+# Возвращает: пару (лучшее время чтения в секундах, форма таблицы).
+
+#ENG
+# Function time_reader
+# Input: file path, engine and number of repeats.
+# Returns: a pair (the best read time in seconds, the table shape).
+def time_reader(file_path: str, reader: str, repeat: int) -> tuple:
+    best = None
+    shape = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = read_sheet(file_path, header=None, reader=reader)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        shape = df.shape
+    return best, shape
+
+#RU
+# Функция main
+# На вход: ничего (аргументы командной строки обрабатываются автоматически).
+# Возвращает: ничего.
+
+#ENG
+# Function main
+# Input: none (command-line arguments are processed automatically).
+# Returns: none.
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение движков чтения Excel на синтетических выписках")
+    parser.add_argument("-r", "--rows", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Размеры выписок в строках")
+    parser.add_argument("-e", "--readers", nargs="*", choices=READERS, default=list(READERS),
+                        help="Какие движки сравнивать (по умолчанию все)")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Сколько раз читать каждый файл")
+    parser.add_argument("-d", "--dir", default=None, help="Папка для синтетических выписок (по умолчанию временная)")
+    args = parser.parse_args()
+
+    readers = [reader for reader in args.readers if reader != READER_CALAMINE or calamine_available()]
+    if len(readers) < len(args.readers):
+        print("python-calamine не установлен, движок calamine пропущен")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        target_dir = args.dir or temp_dir
+        os.makedirs(target_dir, exist_ok=True)
+        print(f"{'строк':>10} {'МБ':>8} " + ' '.join(f'{reader:>16}' for reader in readers))
+        for rows in args.rows:
+            file_path = make_statement(os.path.join(target_dir, f'synthetic_{rows}.xlsx'), rows)
+            size_mb = os.path.getsize(file_path) / 1024 / 1024
+            timings = []
+            shapes = set()
+            for reader in readers:
+                elapsed, shape = time_reader(file_path, reader, max(1, args.repeat))
+                timings.append(elapsed)
+                shapes.add(shape)
+            print(f'{rows:>10} {size_mb:>8.2f} ' + ' '.join(f'{elapsed:>15.3f}s' for elapsed in timings))
+            if len(shapes) > 1:
+                print(f'  Внимание: движки вернули таблицы разной формы: {sorted(shapes)}')
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@
 
 from configparser import ConfigParser
 import logging
+import sys
 
 
 #RU
@@ -127,12 +128,14 @@ def get_config():
 # На вход: строка с API-ключом.
 # Возвращает: ничего.
 # Она инициирует запуск программы, настраивает логирование и проверяет режим работы (Телеграм-бот или ручной режим).
+# В ручном режиме обрабатывается папка выписок из секции [CLI] (см. scripts/cli_batch.py).
 
 #ENG
 # Function report_generator_starter
 # Input: a string with an API key.
 # Returns: none.
 # It initiates program launch, sets up logging, and checks the operating mode (Telegram bot or manual mode).
+# In manual mode the statement folder from the [CLI] section is processed (see scripts/cli_batch.py).
 def report_generator_starter(API_KEY:str):
     try:
         init_logs()
@@ -149,12 +152,22 @@ def report_generator_starter(API_KEY:str):
 
             elif config['PARAMS']['Mode'] == 'mn':
                 logging.info('Выбран способ запуска: Ручной запуск')
-                logging.info('Запускаем ручной код')
+                logging.info('Запускаем пакетную обработку папки из секции [CLI]')
+                from scripts.cli_batch import main as batch_main
+
+                batch_main([])
             else:
                 pass
     except Exception as e:
         logging.error(f'Ошибка при запуске программы: {e}')\
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        # Пакетная обработка из командной строки: python main.py batch <папка или шаблон> -o <папка отчетов>
+        init_logs()
+        logging.getLogger().handlers[-1].setLevel(logging.WARNING)
+        from scripts.cli_batch import main as batch_main
+
+        sys.exit(batch_main(sys.argv[2:]))
     cfg = get_config()
-    report_generator_starter(cfg['KEYS']['bot_api'])
\ No newline at end of file
+    report_generator_starter(cfg['KEYS']['bot_api'])
@@ -1,16 +1,24 @@
 #RU
 # Этот скрипт управляет запуском, остановкой и проверкой статуса фонового процесса.
 # Он создаёт PID-файл для отслеживания процесса и логирует вывод в файлы.
+# В режиме супервизора он следит за API, ботом и воркерами: перезапускает упавшие процессы
+# с нарастающей задержкой и пересоздает процессы, превысившие лимит памяти.
 
 #ENG
 # This script manages starting, stopping, and checking the status of a background process.
 # It creates a PID file to track the process and logs output to files.
+# In supervisor mode it watches the API, the bot and the workers: restarts crashed processes
+# with increasing backoff and recycles processes that exceed the memory limit.
 
+import json
 import os
 import sys
 import signal
 import subprocess
 import platform
+import time
+
+from configparser import ConfigParser
 
 if platform.system() == "Windows":
     import win32process
@@ -19,97 +27,429 @@ if platform.system() == "Windows":
 
 #RU
 # Константы
-# PID_FILE: Имя файла, в котором хранится PID запущенного процесса.
+# PID_FILE: Имя файла, в котором хранятся PID запущенных процессов (строки вида "имя PID").
+# STATE_FILE: Файл, в который супервизор пишет состояние управляемых процессов.
+# SUPERVISED_ENV: Переменная окружения, по которой процессы понимают, что ими управляет супервизор.
 # DEFAULT_PYTHON_COMMAND: Команда для запуска Python, зависящая от операционной системы.
 
 #ENG
 # Constants
-# PID_FILE: The file name storing the PID of the running process.
+# PID_FILE: The file name storing the PIDs of the running processes (lines of the form "name PID").
+# STATE_FILE: The file the supervisor writes the managed processes' state to.
+# SUPERVISED_ENV: Environment variable telling processes they are managed by the supervisor.
 # DEFAULT_PYTHON_COMMAND: The Python launch command, depending on the operating system.
 PID_FILE = "process.pid"
+STATE_FILE = "supervisor.json"
+SUPERVISED_ENV = "REPORTGEN_SUPERVISED"
 DEFAULT_PYTHON_COMMAND = "python3" if platform.system() != "Windows" else "py"
 
 #RU
-# Функция start
-# На вход: команда для запуска процесса (по умолчанию запускает `api.py`).
-# Возвращает: ничего.
-# Она запускает процесс в фоновом режиме и записывает его PID в PID-файл.
-# На Windows запускает процесс без отображения окна, а на Linux — отвязывает процесс от терминала.
+# Функция read_config
+# На вход: ничего.
+# Возвращает: объект ConfigParser с данными из config.ini.
 
 #ENG
-# Function start
-# Input: the command to start the process (defaults to launching `api.py`).
-# Returns: none.
-# It starts the process in the background and writes its PID to the PID file.
-# On Windows, it launches the process without showing a window, and on Linux, it detaches the process from the terminal.
-def start(command=None):
-    if os.path.exists(PID_FILE):
-        print("Процесс уже запущен!")
-        sys.exit(1)
+# Function read_config
+# Input: none.
+# Returns: a ConfigParser object with data from config.ini.
+def read_config() -> ConfigParser:
+    config = ConfigParser()
+    config.read("config.ini")
+    return config
 
-    # Устанавливаем команду по умолчанию
-    if command is None:
-        command = f"{DEFAULT_PYTHON_COMMAND} api.py"
+#RU
+# Функция get_worker_count
+# На вход: ничего.
+# Возвращает: число процессов-воркеров из параметра processes секции [WORKER] в config.ini.
 
+#ENG
+# Function get_worker_count
+# Input: none.
+# Returns: the number of worker processes from the processes parameter of the [WORKER] section in config.ini.
+def get_worker_count() -> int:
+    return read_config().getint("WORKER", "processes", fallback=0)
+
+#RU
+# Функция worker_command
+# На вход: объект конфигурации и номер воркера.
+# Возвращает: команду запуска воркера. Первые interactive_processes воркеров
+# обслуживают только быструю полосу очереди, чтобы небольшие задачи не ждали крупные.
+
+#ENG
+# Function worker_command
+# Input: a configuration object and the worker index.
+# Returns: the worker launch command. The first interactive_processes workers
+# serve only the fast queue lane, so small jobs never wait behind large ones.
+def worker_command(config, index) -> str:
+    command = f"{DEFAULT_PYTHON_COMMAND} worker.py --id {index}"
+    if index < config.getint("WORKER", "interactive_processes", fallback=0):
+        command += " --lanes interactive"
+    return command
+
+#RU
+# Функция spawn
+# На вход: команда для запуска процесса и дополнительные переменные окружения.
+# Возвращает: объект запущенного процесса.
+# На Windows запускает процесс без отображения окна, а на Linux — отвязывает процесс от терминала.
+
+#ENG
+# Function spawn
+# Input: the command to start the process and extra environment variables.
+# Returns: the started process object.
+# On Windows, it launches the process without showing a window, and on Linux, it detaches the process from the terminal.
+def spawn(command, env=None):
     # Открываем лог-файлы
     stdout_log = open("output.log", "a")
     stderr_log = open("error.log", "a")
+    process_env = dict(os.environ, **env) if env else None
 
-    if platform.system() == "Windows":
-        # Windows: запускаем процесс без отображения консольного окна
-        process = subprocess.Popen(
-            command,
-            stdout=stdout_log,
-            stderr=stderr_log,
-            shell=True,
-            creationflags=subprocess.CREATE_NO_WINDOW  # Не показываем окно
-        )
-    else:
+    try:
+        if platform.system() == "Windows":
+            # Windows: запускаем процесс без отображения консольного окна
+            return subprocess.Popen(
+                command,
+                stdout=stdout_log,
+                stderr=stderr_log,
+                shell=True,
+                env=process_env,
+                creationflags=subprocess.CREATE_NO_WINDOW  # Не показываем окно
+            )
         # Linux/Unix: запускаем в фоновом режиме
-        process = subprocess.Popen(
+        return subprocess.Popen(
             command,
             stdout=stdout_log,
             stderr=stderr_log,
             shell=True,
+            env=process_env,
             start_new_session=True  # Отвязка от терминала
         )
+    finally:
+        # Дочерний процесс получил свои копии дескрипторов; копии родителя закрываем,
+        # иначе супервизор терял бы по два дескриптора на каждый перезапуск
+        stdout_log.close()
+        stderr_log.close()
+
+#RU
+# Функция kill_tree
+# На вход: PID процесса и флаг принудительного завершения.
+# Возвращает: ничего.
+# Завершает процесс вместе с дочерними процессами (например, Chromium).
+
+#ENG
+# Function kill_tree
+# Input: process PID and a force flag.
+# Returns: none.
+# Terminates the process together with its children (e.g. Chromium).
+def kill_tree(pid, force=False):
+    if platform.system() == "Windows":
+        os.system(f"taskkill /PID {pid} /T /F")  # Убиваем процесс и дочерние процессы
+    else:
+        os.killpg(os.getpgid(pid), signal.SIGKILL if force else signal.SIGTERM)  # Завершаем группу процессов на Linux
+
+#RU
+# Функция get_rss
+# На вход: PID процесса.
+# Возвращает: объем занятой памяти (RSS) в байтах вместе с дочерними процессами.
+# Использует psutil, а без него на Linux читает /proc (только сам процесс).
+
+#ENG
+# Function get_rss
+# Input: process PID.
+# Returns: resident memory (RSS) in bytes including child processes.
+# Uses psutil, and without it reads /proc on Linux (the process itself only).
+def get_rss(pid) -> int:
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is not None:
+        try:
+            parent = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [parent] + parent.children(recursive=True))
+        except psutil.Error:
+            return 0
+
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+#RU
+# Функция read_pids
+# На вход: ничего.
+# Возвращает: список пар (имя процесса, PID) из PID-файла.
+# Поддерживает и старый формат файла, где записан только один PID.
+
+#ENG
+# Function read_pids
+# Input: none.
+# Returns: a list of (process name, PID) pairs from the PID file.
+# Also supports the old file format holding a single PID.
+def read_pids():
+    pids = []
+    with open(PID_FILE, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 1:
+                pids.append(("main", int(parts[0])))
+            elif len(parts) == 2:
+                pids.append((parts[0], int(parts[1])))
+    return pids
+
+#RU
+# Класс ManagedProcess
+# На вход: имя процесса и команда для его запуска.
+# Хранит состояние процесса под управлением супервизора: время запуска,
+# число перезапусков, задержку до следующего запуска и последний код выхода.
+
+#ENG
+# Class ManagedProcess
+# Input: process name and the command to launch it.
+# Holds the state of a supervised process: start time,
+# restart count, delay until the next start, and the last exit code.
+class ManagedProcess:
+    def __init__(self, name, command):
+        self.name = name
+        self.command = command
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.failures = 0
+        self.next_start = 0
+        self.last_exit = None
+        self.rss = 0
+
+    def start(self):
+        self.process = spawn(self.command, env={SUPERVISED_ENV: "1"})
+        self.started_at = time.time()
+        print(f"Процесс {self.name} запущен с PID {self.process.pid}!", flush=True)
+
+    def stop(self, timeout=10):
+        if self.process is None or self.process.poll() is not None:
+            return
+        try:
+            kill_tree(self.process.pid)
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_tree(self.process.pid, force=True)
+        except ProcessLookupError:
+            pass
+
+    def state(self):
+        alive = self.process is not None and self.process.poll() is None
+        return {
+            "pid": self.process.pid if alive else None,
+            "started_at": self.started_at if alive else None,
+            "restarts": self.restarts,
+            "rss": self.rss if alive else 0,
+            "last_exit": self.last_exit,
+        }
+
+#RU
+# Функция build_managed_processes
+# На вход: объект конфигурации.
+# Возвращает: список процессов под управлением супервизора (API, бот, воркеры).
+
+#ENG
+# Function build_managed_processes
+# Input: a configuration object.
+# Returns: the list of supervised processes (API, bot, workers).
+def build_managed_processes(config):
+    processes = []
+    if config.getboolean("SUPERVISOR", "api", fallback=True):
+        processes.append(ManagedProcess("api", f"{DEFAULT_PYTHON_COMMAND} api.py"))
+    if config.getboolean("SUPERVISOR", "bot", fallback=True):
+        processes.append(ManagedProcess("bot", f"{DEFAULT_PYTHON_COMMAND} main.py"))
+    max_jobs = config.getint("SUPERVISOR", "max_jobs", fallback=0)
+    for index in range(config.getint("WORKER", "processes", fallback=0)):
+        processes.append(ManagedProcess(
+            f"worker-{index}",
+            f"{worker_command(config, index)} --max-jobs {max_jobs}"
+        ))
+    return processes
+
+#RU
+# Функция supervise
+# На вход: ничего.
+# Возвращает: ничего.
+# Запускает управляемые процессы и следит за ними до получения SIGTERM/SIGINT:
+# - упавший процесс перезапускается; если он прожил меньше stable_seconds,
+#   задержка перед запуском удваивается (до backoff_max);
+# - процесс, превысивший max_rss_mb (вместе с дочерними), пересоздается;
+# - воркер сам завершается после max_jobs задач и сразу перезапускается. Это касается только
+#   отдельных воркеров (processes > 0 в секции [WORKER]): воркеры, встроенные в API и бота, не пересоздаются.
+# Состояние процессов пишется в STATE_FILE для команды status.
+
+#ENG
+# Function supervise
+# Input: none.
+# Returns: none.
+# Starts the supervised processes and watches them until SIGTERM/SIGINT is received:
+# - a crashed process is restarted; if it lived less than stable_seconds,
+#   the delay before the restart doubles (up to backoff_max);
+# - a process exceeding max_rss_mb (including its children) is recycled;
+# - a worker exits by itself after max_jobs jobs and is restarted immediately. This only applies
+#   to standalone workers (processes > 0 in the [WORKER] section): workers embedded in the API and the bot are not recycled.
+# The processes' state is written to STATE_FILE for the status command.
+def supervise():
+    config = read_config()
+    interval = config.getfloat("SUPERVISOR", "check_interval", fallback=5)
+    backoff_base = config.getfloat("SUPERVISOR", "backoff_base", fallback=1)
+    backoff_max = config.getfloat("SUPERVISOR", "backoff_max", fallback=60)
+    stable_seconds = config.getfloat("SUPERVISOR", "stable_seconds", fallback=60)
+    max_rss = config.getint("SUPERVISOR", "max_rss_mb", fallback=0) * 1024 * 1024
+
+    processes = build_managed_processes(config)
+    if config.getint("SUPERVISOR", "max_jobs", fallback=0) and not get_worker_count():
+        print("max_jobs действует только на отдельные воркеры: при processes = 0 задачи выполняют API и бот, "
+              "и по числу задач они не пересоздаются.", flush=True)
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    for managed in processes:
+        managed.start()
+
+    while not stopping:
+        now = time.time()
+        for managed in processes:
+            if managed.process is None:
+                if now >= managed.next_start:
+                    managed.start()
+                continue
+
+            exit_code = managed.process.poll()
+            if exit_code is not None:
+                uptime = now - managed.started_at
+                managed.last_exit = exit_code
+                managed.process = None
+                managed.restarts += 1
+                managed.failures = managed.failures + 1 if uptime < stable_seconds else 0
+                delay = min(backoff_max, backoff_base * 2 ** (managed.failures - 1)) if managed.failures else 0
+                managed.next_start = now + delay
+                print(f"Процесс {managed.name} завершился с кодом {exit_code}, перезапуск через {delay:.0f} с.", flush=True)
+                continue
+
+            managed.rss = get_rss(managed.process.pid)
+            if max_rss and managed.rss > max_rss:
+                print(f"Процесс {managed.name} занял {managed.rss // (1024 * 1024)} МБ, пересоздаем.", flush=True)
+                managed.stop()
+
+        write_state(processes)
+        time.sleep(interval)
+
+    for managed in processes:
+        managed.stop()
+    if os.path.exists(STATE_FILE):
+        os.remove(STATE_FILE)
+    print("Супервизор остановлен!", flush=True)
+
+#RU
+# Функция write_state
+# На вход: список управляемых процессов.
+# Возвращает: ничего.
+# Атомарно записывает состояние процессов в STATE_FILE.
+
+#ENG
+# Function write_state
+# Input: a list of supervised processes.
+# Returns: none.
+# Atomically writes the processes' state to STATE_FILE.
+def write_state(processes):
+    state = {
+        "supervisor_pid": os.getpid(),
+        "updated_at": time.time(),
+        "processes": {managed.name: managed.state() for managed in processes},
+    }
+    with open(f"{STATE_FILE}.tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(f"{STATE_FILE}.tmp", STATE_FILE)
+
+#RU
+# Функция format_uptime
+# На вход: время работы в секундах.
+# Возвращает: строку вида 1ч 02м 03с.
+
+#ENG
+# Function format_uptime
+# Input: uptime in seconds.
+# Returns: a string of the form 1h 02m 03s.
+def format_uptime(seconds) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}ч {seconds % 3600 // 60:02d}м {seconds % 60:02d}с"
+
+#RU
+# Функция start
+# На вход: команда для запуска процесса.
+# Возвращает: ничего.
+# Без команды (и при включенном [SUPERVISOR] enabled) запускает в фоне супервизор,
+# который управляет API, ботом и воркерами. С командой запускает ее и заданное
+# в config.ini число воркеров (`worker.py`) без надзора. PID записываются в PID-файл.
+
+#ENG
+# Function start
+# Input: the command to start the process.
+# Returns: none.
+# Without a command (and with [SUPERVISOR] enabled) it starts the supervisor in the background,
+# which manages the API, the bot and the workers. With a command it starts that command and
+# the number of workers (`worker.py`) set in config.ini without supervision. PIDs go to the PID file.
+def start(command=None):
+    if os.path.exists(PID_FILE):
+        print("Процесс уже запущен!")
+        sys.exit(1)
+
+    if command is None and read_config().getboolean("SUPERVISOR", "enabled", fallback=True):
+        processes = [("supervisor", spawn(f"{DEFAULT_PYTHON_COMMAND} runner.py supervise"))]
+    else:
+        # Устанавливаем команду по умолчанию
+        if command is None:
+            command = f"{DEFAULT_PYTHON_COMMAND} api.py"
+
+        processes = [("main", spawn(command))]
+        config = read_config()
+        for index in range(get_worker_count()):
+            processes.append((f"worker-{index}", spawn(worker_command(config, index))))
 
     # Записываем PID
     with open(PID_FILE, "w") as f:
-        f.write(str(process.pid))
+        for name, process in processes:
+            f.write(f"{name} {process.pid}\n")
 
-    print(f"Процесс запущен с PID {process.pid}!")
+    for name, process in processes:
+        print(f"Процесс {name} запущен с PID {process.pid}!")
 
 #RU
 # Функция stop
 # На вход: ничего.
 # Возвращает: ничего.
-# Она завершает процесс, используя его PID, и удаляет PID-файл.
-# На Windows использует `taskkill`, а на Linux — `os.killpg`.
+# Она завершает все процессы из PID-файла и удаляет PID-файл.
+# Супервизор по SIGTERM сам останавливает управляемые им процессы.
 
 #ENG
 # Function stop
 # Input: none.
 # Returns: none.
-# It terminates the process using its PID and removes the PID file.
-# On Windows, it uses `taskkill`, and on Linux, it uses `os.killpg`.
+# It terminates all processes from the PID file and removes the PID file.
+# On SIGTERM the supervisor stops the processes it manages by itself.
 def stop():
     if not os.path.exists(PID_FILE):
         print("Процесс не запущен!")
         sys.exit(1)
 
     # Читаем PID из файла
-    with open(PID_FILE, "r") as f:
-        pid = int(f.read().strip())
-
-    try:
-        if platform.system() == "Windows":
-            os.system(f"taskkill /PID {pid} /T /F")  # Убиваем процесс и дочерние процессы
-        else:
-            os.killpg(os.getpgid(pid), signal.SIGTERM)  # Завершаем группу процессов на Linux
-    except Exception as e:
-        print(f"Ошибка остановки процесса: {e}")
-        sys.exit(1)
+    for name, pid in read_pids():
+        try:
+            kill_tree(pid)
+        except ProcessLookupError:
+            print(f"Процесс {name} (PID {pid}) уже завершен.")
+        except Exception as e:
+            print(f"Ошибка остановки процесса {name}: {e}")
+            sys.exit(1)
 
     # Удаляем PID-файл
     os.remove(PID_FILE)
@@ -119,26 +459,42 @@ def stop():
 # Функция status
 # На вход: ничего.
 # Возвращает: ничего.
-# Она проверяет, запущен ли процесс, проверяя наличие PID-файла,
-# и выводит соответствующее сообщение.
+# Она проверяет, запущены ли процессы, проверяя наличие PID-файла,
+# и выводит соответствующее сообщение для каждого процесса.
+# Для супервизора выводит по каждому процессу время работы, число перезапусков и память.
 
 #ENG
 # Function status
 # Input: none.
 # Returns: none.
-# It checks if the process is running by checking the presence of the PID file,
-# and prints an appropriate message.
+# It checks if the processes are running by checking the presence of the PID file,
+# and prints an appropriate message for each process.
+# For the supervisor it prints each process's uptime, restart count and memory.
 def status():
-    if os.path.exists(PID_FILE):
-        with open(PID_FILE, "r") as f:
-            pid = f.read().strip()
-        print(f"Процесс запущен с PID {pid}.")
-    else:
+    if not os.path.exists(PID_FILE):
         print("Процесс не запущен.")
+        return
+
+    for name, pid in read_pids():
+        print(f"Процесс {name} запущен с PID {pid}.")
+
+    if not os.path.exists(STATE_FILE):
+        return
+    with open(STATE_FILE, "r") as f:
+        state = json.load(f)
+
+    now = time.time()
+    print(f"{'Процесс':<12} {'PID':>8} {'Время работы':>14} {'Перезапуски':>12} {'Память, МБ':>11}")
+    for name, info in state["processes"].items():
+        if info["pid"] is None:
+            print(f"{name:<12} {'-':>8} {'ожидает запуска':>14} {info['restarts']:>12} {'-':>11}")
+            continue
+        print(f"{name:<12} {info['pid']:>8} {format_uptime(now - info['started_at']):>14} "
+              f"{info['restarts']:>12} {info['rss'] / (1024 * 1024):>11.1f}")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Использование: python process_manager.py start|stop|status [команда]")
+        print("Использование: python runner.py start|stop|status|supervise [команда]")
         sys.exit(1)
 
     action = sys.argv[1].lower()
@@ -147,6 +503,8 @@ if __name__ == "__main__":
         # Указываем команду по умолчанию, если не задана
         command = " ".join(sys.argv[2:]) if len(sys.argv) > 2 else None
         start(command)
+    elif action == "supervise":
+        supervise()
     elif action == "stop":
         stop()
     elif action == "status":
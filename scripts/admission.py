@@ -0,0 +1,142 @@
+#RU
+# Этот скрипт реализует контроль приема задач (admission control).
+# Стоимость задачи оценивается по размеру файла или по числу строк из заголовка листа,
+# а прием ограничивается глобальным лимитом и лимитом на пользователя по задачам в работе.
+# Вместо того чтобы замедлять всех, лишние задачи сразу получают отказ с временем повтора.
+
+#ENG
+# This script implements admission control for jobs.
+# Job cost is estimated from the file size or from the row count in the sheet header,
+# and admission is bounded by global and per-user limits on in-flight jobs.
+# Instead of degrading everyone, excess jobs are rejected right away with a retry time.
+import logging
+
+from .commands import get_setting
+from .excel_reader import read_first_row
+from .layouts import detect_layout, header_columns
+from .jobs import enqueue_jobs, inflight_stats
+
+#RU
+# Класс AdmissionDecision
+# На вход: флаг приема, время повтора в секундах и причина отказа.
+# Результат проверки: admitted=False означает, что задачу нужно отклонить.
+
+#ENG
+# Class AdmissionDecision
+# Input: admission flag, retry time in seconds, and rejection reason.
+# The check result: admitted=False means the job must be rejected.
+class AdmissionDecision:
+    def __init__(self, admitted: bool, retry_after: int = 0, reason: str = ''):
+        self.admitted = admitted
+        self.retry_after = retry_after
+        self.reason = reason
+
+#RU
+# Функция sniff_statement
+# На вход: путь к .xlsx файлу.
+# Возвращает: словарь с заголовком листа в том виде, в каком его видит pandas
+# (пустые ячейки - 'Unnamed: N'), числом строк из размерности листа (или None)
+# и названием раскладки выписки (None - структура неизвестна, см. scripts/layouts.py).
+# Читает только первую строку (см. scripts/excel_reader.py), не разбирая весь лист.
+
+#ENG
+# Function sniff_statement
+# Input: path to an .xlsx file.
+# Returns: a dictionary with the sheet header as pandas sees it
+# (empty cells are 'Unnamed: N'), the row count from the sheet dimension (or None)
+# and the statement layout name (None - unknown structure, see scripts/layouts.py).
+# Reads only the first row (see scripts/excel_reader.py), without parsing the whole sheet.
+def sniff_statement(file_path: str) -> dict:
+    first_row, rows = read_first_row(file_path)
+    columns = header_columns(first_row)
+    layout = detect_layout(columns)
+    return {'columns': columns, 'rows': rows, 'layout': layout.name if layout else None}
+
+#RU
+# Функция estimate_cost
+# На вход: размер файла в байтах и число строк (если известно).
+# Возвращает: оценку стоимости задачи в строках выписки.
+
+#ENG
+# Function estimate_cost
+# Input: file size in bytes and the row count (if known).
+# Returns: the estimated job cost in statement rows.
+def estimate_cost(file_size: int, rows: int = None) -> int:
+    if rows:
+        return int(rows)
+    return int(file_size / get_setting('ADMISSION', 'bytes_per_row', 150, float))
+
+#RU
+# Функция admission_decision
+# На вход: ID пользователя, оценка стоимости новой задачи и сводка задач в работе (см. inflight_stats).
+# Возвращает: AdmissionDecision.
+# Сравнивает задачи в очереди и в работе с лимитами из секции [ADMISSION] в config.ini.
+# Время повтора оценивается по объему работы впереди и пропускной способности.
+
+#ENG
+# Function admission_decision
+# Input: user ID, the estimated cost of the new job, and the in-flight jobs summary (see inflight_stats).
+# Returns: AdmissionDecision.
+# Compares queued and running jobs with the limits from the [ADMISSION] section of config.ini.
+# The retry time is estimated from the work ahead and the throughput.
+def admission_decision(user_id, cost: int, stats: dict) -> AdmissionDecision:
+    max_job_cost = get_setting('ADMISSION', 'max_job_rows', 0, int)
+    max_jobs = get_setting('ADMISSION', 'max_jobs', 0, int)
+    max_cost = get_setting('ADMISSION', 'max_rows', 0, int)
+    max_user_jobs = get_setting('ADMISSION', 'max_user_jobs', 0, int)
+    min_retry = get_setting('ADMISSION', 'retry_after', 30, int)
+    rows_per_second = get_setting('ADMISSION', 'rows_per_second', 2000, float)
+
+    if max_job_cost and cost > max_job_cost:
+        return AdmissionDecision(False, 0, f'Файл слишком большой: {cost} строк при лимите {max_job_cost}')
+
+    retry_after = max(min_retry, int(stats['cost'] / rows_per_second))
+
+    if max_user_jobs and stats['user_jobs'] >= max_user_jobs:
+        user_retry = max(min_retry, int(stats['user_cost'] / rows_per_second))
+        decision = AdmissionDecision(False, user_retry, f'У пользователя уже {stats["user_jobs"]} задач в работе')
+    elif max_jobs and stats['jobs'] >= max_jobs:
+        decision = AdmissionDecision(False, retry_after, f'В очереди уже {stats["jobs"]} задач')
+    elif max_cost and stats['jobs'] and stats['cost'] + cost > max_cost:
+        # Одну большую задачу в пустую очередь принимаем всегда
+        decision = AdmissionDecision(False, retry_after, f'В очереди уже {stats["cost"]} строк')
+    else:
+        return AdmissionDecision(True)
+
+    logging.info(f'Задача пользователя {user_id} стоимостью {cost} отклонена: {decision.reason}')
+    return decision
+
+#RU
+# Функция check_admission
+# На вход: ID пользователя и оценка стоимости новой задачи.
+# Возвращает: AdmissionDecision по текущей очереди.
+# Это предварительная проверка (например, по размеру файла до его загрузки): окончательно задача
+# принимается в admit_jobs, в одной транзакции с постановкой в очередь.
+
+#ENG
+# Function check_admission
+# Input: user ID and the estimated cost of the new job.
+# Returns: AdmissionDecision for the current queue.
+# This is a preliminary check (e.g. by the file size before it is downloaded): the job is finally
+# admitted in admit_jobs, within the same transaction that enqueues it.
+def check_admission(user_id, cost: int) -> AdmissionDecision:
+    return admission_decision(user_id, cost, inflight_stats(user_id))
+
+#RU
+# Функция admit_jobs
+# На вход: источник (api/tg), ID пользователя, список задач (путь к файлу, исходное имя файла, параметры, стоимость)
+# и ID группы задач.
+# Возвращает: пару (AdmissionDecision, список ID созданных задач). При отказе задачи не создаются.
+# Проверка лимитов и постановка в очередь идут в одной транзакции (см. enqueue_jobs). Несколько задач
+# (пакет файлов) проверяются вместе по суммарной стоимости и принимаются или отклоняются целиком.
+
+#ENG
+# Function admit_jobs
+# Input: source (api/tg), user ID, a list of jobs (file path, original file name, parameters, cost),
+# and the job group ID.
+# Returns: a pair (AdmissionDecision, list of created job IDs). On rejection no jobs are created.
+# The limit check and the enqueue run in one transaction (see enqueue_jobs). Several jobs
+# (a batch of files) are checked together by their total cost and are admitted or rejected as a whole.
+def admit_jobs(source: str, user_id, specs: list, group_id: str = None) -> tuple:
+    return enqueue_jobs(source, user_id, specs, group_id,
+                        admit=lambda stats, cost: admission_decision(user_id, cost, stats))
@@ -0,0 +1,125 @@
+#RU
+# Этот скрипт реализует пакетную обработку: много выписок в одном запросе.
+# Файлы (или .xlsx из ZIP-архива) ставятся в очередь как группа задач и обрабатываются
+# воркерами параллельно. Результат группы отдается одним ZIP-архивом, который передается
+# потоком: каждый отчет попадает в архив, как только готов, не дожидаясь остальных.
+
+#ENG
+# This script implements batch processing: many statements in one request.
+# Files (or the .xlsx files from a ZIP archive) are enqueued as a job group and processed
+# by the workers in parallel. The group result is served as a single ZIP archive that is
+# streamed: each report goes into the archive as soon as it is ready, without waiting for the rest.
+import asyncio
+import io
+import os
+import time
+import zipfile
+
+from .commands import get_setting
+from .jobs import group_jobs, STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE
+
+#RU
+# Функция unpack_uploads
+# На вход: список пар (имя файла, содержимое).
+# Возвращает: список пар (имя файла, содержимое), где ZIP-архивы заменены вложенными .xlsx.
+# Размер распакованных данных ограничен параметром max_unpacked_mb (секция [BATCH]),
+# вложенные папки в именах отбрасываются.
+
+#ENG
+# Function unpack_uploads
+# Input: a list of (file name, content) pairs.
+# Returns: a list of (file name, content) pairs where ZIP archives are replaced with the .xlsx files inside.
+# The unpacked size is bounded by max_unpacked_mb (the [BATCH] section),
+# nested folders in member names are dropped.
+def unpack_uploads(uploads: list) -> list:
+    max_unpacked = get_setting('BATCH', 'max_unpacked_mb', 500, float) * 1024 * 1024
+    files = []
+    unpacked = 0
+    for file_name, content in uploads:
+        if not file_name.lower().endswith('.zip'):
+            files.append((file_name, content))
+            continue
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            for member in archive.infolist():
+                member_name = os.path.basename(member.filename)
+                if member.is_dir() or not member_name.endswith('.xlsx') or member_name.startswith('~$'):
+                    continue
+                unpacked += member.file_size
+                if unpacked > max_unpacked:
+                    raise ValueError(f'Архив {file_name} слишком большой после распаковки')
+                files.append((member_name, archive.read(member)))
+    return files
+
+#RU
+# Класс ZipStream
+# Буфер для zipfile без поддержки seek: все, что записал архиватор, забирается методом take
+# и сразу отправляется клиенту.
+
+#ENG
+# Class ZipStream
+# A non-seekable buffer for zipfile: everything the archiver has written is taken with take
+# and sent to the client right away.
+class ZipStream:
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+#RU
+# Функция stream_group_zip
+# На вход: ID группы задач и интервал опроса очереди.
+# Возвращает: асинхронный генератор байтов ZIP-архива.
+# Добавляет в архив отчеты по мере готовности. Когда все задачи группы завершены
+# (или истекло wait_timeout из секции [BATCH]), дописывает errors.txt со списком
+# необработанных файлов и закрывает архив.
+
+#ENG
+# Function stream_group_zip
+# Input: job group ID and queue polling interval.
+# Returns: an async generator of ZIP archive bytes.
+# Adds reports to the archive as they become ready. Once every job in the group has finished
+# (or wait_timeout from the [BATCH] section has passed), it appends errors.txt listing
+# the files that were not processed and closes the archive.
+async def stream_group_zip(group_id: str, poll_interval: float = 1):
+    deadline = time.monotonic() + get_setting('BATCH', 'wait_timeout', 3600, float)
+    stream = ZipStream()
+    archive = zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED)
+    sent = set()
+    names = set()
+    while True:
+        jobs = await asyncio.to_thread(group_jobs, group_id)
+        for job in jobs:
+            if job['id'] in sent or job['status'] != STATUS_DONE or not os.path.exists(job['result_path']):
+                continue
+            sent.add(job['id'])
+            arcname = os.path.basename(job['result_path'])
+            if arcname in names:
+                arcname = f"{job['id'][:8]}_{arcname}"
+            names.add(arcname)
+            with open(job['result_path'], 'rb') as source, archive.open(arcname, 'w') as target:
+                for block in iter(lambda: source.read(1024 * 1024), b''):
+                    target.write(block)
+                    yield stream.take()
+            yield stream.take()
+
+        pending = [job for job in jobs if job['status'] in (STATUS_QUEUED, STATUS_RUNNING)]
+        if not pending or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(poll_interval)
+
+    errors = [f"{job['file_name']}: {job['status']} {job['error'] or ''}".strip()
+              for job in jobs if job['id'] not in sent]
+    if errors:
+        archive.writestr('errors.txt', '\n'.join(errors))
+    archive.close()
+    yield stream.take()
@@ -0,0 +1,184 @@
+#RU
+# Этот скрипт управляет пулом запущенных браузеров Chromium (Playwright).
+# Браузеры запускаются один раз и переиспользуются между рендерами,
+# чтобы не платить за запуск Chromium на каждый PDF.
+
+#ENG
+# This script manages a pool of running Chromium browsers (Playwright).
+# Browsers are launched once and reused between renders,
+# so we do not pay for a Chromium launch on every PDF.
+import asyncio
+import logging
+import os
+import platform
+import signal
+
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from .commands import get_setting
+
+#RU
+# Функция get_chrome_path
+# На вход: ничего.
+# Возвращает: путь к исполняемому файлу Chrome для текущей ОС.
+
+#ENG
+# Function get_chrome_path
+# Input: none.
+# Returns: path to the Chrome executable for the current OS.
+def get_chrome_path():
+    system = platform.system()
+    if system == "Windows":
+        return "C:/Program Files/Google/Chrome/Application/chrome.exe"
+    elif system == "Darwin":  # MacOS
+        return "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+    elif system == "Linux":
+        return "/usr/bin/google-chrome"
+    else:
+        raise EnvironmentError("Не удалось найти совместимый браузер для вашей ОС")
+
+#RU
+# Класс BrowserPool
+# На вход: количество браузеров в пуле.
+# Запускает браузеры при первом обращении и выдает их по одному на рендер.
+# Пул привязан к циклу событий, в котором был запущен, и перезапускается в новом цикле.
+# Если во время работы со страницей произошла ошибка, таймаут или отмена, браузер считается
+# зависшим: он закрывается (или убивается по PID, если не закрылся) и заменяется новым.
+
+#ENG
+# Class BrowserPool
+# Input: number of browsers in the pool.
+# Launches browsers on first use and hands them out one per render.
+# The pool is bound to the event loop it was started in and restarts in a new loop.
+# If an error, timeout, or cancellation happens while a page is in use, the browser is
+# considered hung: it is closed (or killed by PID if it does not close) and replaced.
+class BrowserPool:
+    def __init__(self, size: int = 1):
+        self.size = max(1, size)
+        self._playwright = None
+        self._browsers = []
+        self._pids = {}
+        self._idle = None
+        self._loop = None
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None and self._loop is asyncio.get_running_loop()
+
+    async def _launch(self):
+        browser = await self._playwright.chromium.launch(
+            headless=True,
+            executable_path=get_chrome_path(),
+            args=["--no-sandbox", "--disable-gpu"]
+        )
+        self._browsers.append(browser)
+        # PID процесса Chromium нужен, чтобы убить браузер, если он не закрывается сам
+        try:
+            session = await browser.new_browser_cdp_session()
+            info = await session.send('SystemInfo.getProcessInfo')
+            self._pids[browser] = next(p['id'] for p in info['processInfo'] if p['type'] == 'browser')
+            await session.detach()
+        except Exception as e:
+            logging.warning(f'Не удалось получить PID браузера: {e}')
+        return browser
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        # Новый цикл событий (например, после asyncio.run) - старые объекты уже недействительны
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        self._browsers = []
+        self._pids = {}
+        self._playwright = await async_playwright().start()
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._launch())
+        logging.info(f'Запущено браузеров в пуле: {self.size}')
+
+    async def close(self) -> None:
+        if not self.started:
+            return
+        for browser in list(self._browsers):
+            await self._discard(browser)
+        await self._playwright.stop()
+        self._loop = None
+
+    #RU Закрывает браузер, а если он не отвечает - убивает его процесс
+    #ENG Closes the browser, and if it does not respond, kills its process
+    async def _discard(self, browser) -> None:
+        if browser in self._browsers:
+            self._browsers.remove(browser)
+        pid = self._pids.pop(browser, None)
+        try:
+            await asyncio.wait_for(browser.close(), get_setting('RENDER', 'close_timeout', 5, float))
+        except Exception as e:
+            logging.error(f'Браузер не закрылся ({e}), завершаем процесс {pid}')
+            if pid:
+                try:
+                    os.kill(pid, signal.SIGKILL if hasattr(signal, 'SIGKILL') else signal.SIGTERM)
+                except OSError:
+                    pass
+
+    #RU Выдает свободную страницу и возвращает браузер в пул после рендера
+    #ENG Hands out a fresh page and returns the browser to the pool after the render
+    @asynccontextmanager
+    async def page(self):
+        if not self.started:
+            await self.start()
+        browser = await self._idle.get()
+        page = None
+        healthy = True
+        try:
+            if browser is None:
+                # Слот, браузер которого не удалось перезапустить раньше
+                browser = await self._launch()
+            page = await asyncio.wait_for(browser.new_page(), get_setting('RENDER', 'new_page_timeout', 15, float))
+            yield page
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            if healthy and page is not None:
+                try:
+                    await asyncio.wait_for(page.close(), get_setting('RENDER', 'close_timeout', 5, float))
+                except Exception as e:
+                    logging.error(f'Ошибка при закрытии страницы: {e}')
+                    healthy = False
+            if healthy:
+                self._idle.put_nowait(browser)
+            else:
+                await self._replace(browser)
+
+    #RU Заменяет зависший браузер новым. Если запуск не удался, слот остается пустым до следующего рендера
+    #ENG Replaces a hung browser with a new one. If the launch fails, the slot stays empty until the next render
+    async def _replace(self, browser) -> None:
+        logging.warning('Перезапускаем браузер после ошибки рендера')
+        replacement = None
+        try:
+            if browser is not None:
+                await self._discard(browser)
+            replacement = await self._launch()
+        except Exception as e:
+            logging.error(f'Не удалось перезапустить браузер: {e}')
+        finally:
+            self._idle.put_nowait(replacement)
+
+
+_pool = None
+
+#RU
+# Функция get_browser_pool
+# На вход: ничего.
+# Возвращает: общий для процесса пул браузеров, размер берется из config.ini.
+
+#ENG
+# Function get_browser_pool
+# Input: none.
+# Returns: the process-wide browser pool, sized from config.ini.
+def get_browser_pool() -> BrowserPool:
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool(get_setting('RENDER', 'browser_pool_size', 1, int))
+    return _pool
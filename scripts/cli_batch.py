@@ -0,0 +1,257 @@
+#RU
+# Этот скрипт реализует пакетную обработку папки выписок из командной строки (ручной режим).
+# На вход - папки и/или шаблоны путей (glob) с файлами .xlsx. Разбор и агрегация выписок идут
+# параллельно в пуле процессов (упираются в процессор), а рендер - в основном процессе на пуле
+# браузеров, не больше одного отчета на браузер. Готовые отчеты складываются в выходную папку.
+# В выходной папке ведется манифест (manifest.json): хеш содержимого выписки, параметры и хеш отчета.
+# Повторный запуск пропускает выписки, для которых отчет уже есть и совпадают оба хеша,
+# поэтому прерванную обработку можно просто запустить снова.
+
+#ENG
+# This script implements command-line batch processing of a statement folder (manual mode).
+# The input is folders and/or path patterns (glob) with .xlsx files. Statement parsing and aggregation
+# run in parallel in a process pool (they are CPU-bound), while rendering runs in the main process on the
+# browser pool, at most one report per browser. Finished reports go into the output folder.
+# The output folder keeps a manifest (manifest.json): the statement content hash, the parameters and the report hash.
+# A repeated run skips statements whose report already exists and both hashes match,
+# so an interrupted run can simply be started again.
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .commands import get_setting
+from .exports import OUTPUT_FORMATS, FORMAT_PDF
+from .frame_cache import file_digest
+
+MANIFEST_FILE = 'manifest.json'
+
+#RU
+# Функция collect_inputs
+# На вход: список папок, файлов и шаблонов путей (glob).
+# Возвращает: отсортированный список абсолютных путей к выпискам .xlsx без повторов.
+# Из папок берутся файлы верхнего уровня; временные файлы Excel (~$...) и промежуточные prepared_... пропускаются.
+
+#ENG
+# Function collect_inputs
+# Input: a list of folders, files and path patterns (glob).
+# Returns: a sorted list of absolute paths to .xlsx statements without repeats.
+# Top-level files are taken from folders; Excel temporary files (~$...) and intermediate prepared_... files are skipped.
+def collect_inputs(sources: list) -> list:
+    paths = set()
+    for source in sources:
+        matches = [os.path.join(source, '*.xlsx')] if os.path.isdir(source) else [source]
+        for pattern in matches:
+            for path in glob.glob(pattern, recursive=True):
+                name = os.path.basename(path)
+                if os.path.isfile(path) and name.endswith('.xlsx') and not name.startswith(('~$', 'prepared_')):
+                    paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+#RU
+# Функция load_manifest
+# На вход: выходная папка.
+# Возвращает: манифест {путь к выписке: запись} или пустой словарь, если манифеста нет или он поврежден.
+
+#ENG
+# Function load_manifest
+# Input: the output folder.
+# Returns: the {statement path: record} manifest or an empty dictionary if there is none or it is damaged.
+def load_manifest(output_dir: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+#RU
+# Функция save_manifest
+# На вход: выходная папка и манифест.
+# Возвращает: ничего. Файл заменяется атомарно, чтобы прерванный запуск не оставил его недописанным.
+
+#ENG
+# Function save_manifest
+# Input: the output folder and the manifest.
+# Returns: none. The file is replaced atomically so an interrupted run does not leave it half-written.
+def save_manifest(output_dir: str, manifest: dict) -> None:
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(f'{manifest_path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+#RU
+# Функция is_done
+# На вход: запись манифеста, хеш выписки, параметры запуска и выходная папка.
+# Возвращает: True, если отчет по этой выписке с этими параметрами уже есть и не изменен.
+
+#ENG
+# Function is_done
+# Input: the manifest record, the statement hash, the run parameters and the output folder.
+# Returns: True if the report for this statement with these parameters already exists and is unchanged.
+def is_done(record: dict, digest: str, params: dict, output_dir: str) -> bool:
+    if not record or record.get('digest') != digest or record.get('params') != params:
+        return False
+    output_path = os.path.join(output_dir, record.get('output', ''))
+    return os.path.isfile(output_path) and file_digest(output_path) == record.get('output_digest')
+
+#RU
+# Функция aggregate_input
+# На вход: путь к выписке и период.
+# Возвращает: данные отчета (см. aggregate_frame) или None, если нет строк с ненулевым дебетом.
+# Выполняется в процессе пула: разбор, агрегация и запись в индекс контрагентов.
+
+#ENG
+# Function aggregate_input
+# Input: statement path and period.
+# Returns: the report data (see aggregate_frame) or None if there are no rows with a non-zero debit.
+# Runs in a pool process: parsing, aggregation and the counterparty index update.
+def aggregate_input(file_path: str, period: str = ''):
+    from .process import aggregate_statement, index_report
+
+    data = aggregate_statement(file_path, False, period)
+    if data is not None and get_setting('COUNTERPARTIES', 'enabled', True, bool):
+        index_report(data, [file_path], False, period)
+    return data
+
+#RU Имя отчета в выходной папке: имя выписки, при совпадении имен - с началом хеша
+#ENG The report name in the output folder: the statement name, with a hash prefix if names collide
+def _output_name(file_path: str, digest: str, output_format: str, taken: set) -> str:
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    name = f'{stem}.{output_format}'
+    if name in taken:
+        name = f'{stem}_{digest[:8]}.{output_format}'
+    taken.add(name)
+    return name
+
+#RU
+# Функция run_batch
+# На вход: список папок/шаблонов путей, выходная папка, период, формат результата, число процессов
+# (0 - из секции [CLI] или по числу ядер) и флаг принудительной обработки.
+# Возвращает: сводку запуска {total, done, skipped, empty, failed, seconds, files_per_second, mb_per_second}.
+# Ход обработки печатается построчно: [номер/всего] файл: результат.
+
+#ENG
+# Function run_batch
+# Input: a list of folders/path patterns, the output folder, period, output format, the number of processes
+# (0 - from the [CLI] section or by the number of cores) and the force flag.
+# Returns: the run summary {total, done, skipped, empty, failed, seconds, files_per_second, mb_per_second}.
+# Progress is printed line by line: [number/total] file: result.
+async def run_batch(sources: list, output_dir: str, period: str = '', output_format: str = FORMAT_PDF,
+                    processes: int = 0, force: bool = False) -> dict:
+    from .browser import get_browser_pool
+    from .process import render_report, resolve_period
+
+    started = time.perf_counter()
+    period = resolve_period(period)
+    os.makedirs(output_dir, exist_ok=True)
+    inputs = collect_inputs(sources)
+    manifest = load_manifest(output_dir)
+    params = {'period': period, 'output_format': output_format}
+    summary = {'total': len(inputs), 'done': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
+    processed_bytes = 0
+    finished = 0
+    taken = {record['output'] for record in manifest.values() if record.get('output')}
+
+    def report(file_path: str, status: str) -> None:
+        nonlocal finished
+        finished += 1
+        print(f'[{finished}/{len(inputs)}] {os.path.basename(file_path)}: {status}', flush=True)
+
+    pending = []
+    for file_path in inputs:
+        digest = await asyncio.to_thread(file_digest, file_path)
+        if not force and is_done(manifest.get(file_path), digest, params, output_dir):
+            summary['skipped'] += 1
+            report(file_path, 'пропущен, отчет уже есть')
+            continue
+        record = manifest.get(file_path) or {}
+        taken.discard(record.get('output'))
+        pending.append((file_path, digest))
+
+    browser_pool = get_browser_pool()
+    if pending and output_format == FORMAT_PDF:
+        await browser_pool.start()
+    max_workers = processes or get_setting('CLI', 'processes', 0, int) or os.cpu_count() or 1
+    # Рендер PDF ограничен числом браузеров, табличные форматы - числом процессов
+    render_slots = asyncio.Semaphore(browser_pool.size if output_format == FORMAT_PDF else max_workers)
+    loop = asyncio.get_running_loop()
+
+    async def handle(pool, file_path: str, digest: str) -> None:
+        nonlocal processed_bytes
+        file_started = time.perf_counter()
+        try:
+            data = await loop.run_in_executor(pool, aggregate_input, file_path, period)
+            if data is None:
+                summary['empty'] += 1
+                report(file_path, 'нет строк с ненулевым дебетом')
+                return
+            async with render_slots:
+                report_path = await render_report(data, output_format)
+            if not report_path or not os.path.exists(report_path):
+                raise RuntimeError('Отчет не был сгенерирован')
+            output_name = _output_name(file_path, digest, output_format, taken)
+            output_path = os.path.join(output_dir, output_name)
+            await asyncio.to_thread(shutil.move, report_path, output_path)
+            manifest[file_path] = {
+                'digest': digest,
+                'params': params,
+                'output': output_name,
+                'output_digest': await asyncio.to_thread(file_digest, output_path),
+                'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            # Манифест сохраняется после каждого отчета: прерванный запуск продолжится с того же места
+            save_manifest(output_dir, manifest)
+            summary['done'] += 1
+            processed_bytes += os.path.getsize(file_path)
+            report(file_path, f'{output_name} ({time.perf_counter() - file_started:.1f} с)')
+        except Exception as e:
+            logging.error(f'Ошибка обработки {file_path}: {e}')
+            summary['failed'] += 1
+            report(file_path, f'ошибка: {e}')
+
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, min(max_workers, len(pending) or 1))) as pool:
+            await asyncio.gather(*(handle(pool, file_path, digest) for file_path, digest in pending))
+    finally:
+        await browser_pool.close()
+
+    seconds = time.perf_counter() - started
+    summary.update({
+        'seconds': round(seconds, 2),
+        'files_per_second': round(summary['done'] / seconds, 2) if seconds else 0,
+        'mb_per_second': round(processed_bytes / 1024 / 1024 / seconds, 2) if seconds else 0,
+    })
+    return summary
+
+#RU
+# Функция main
+# На вход: аргументы командной строки (None - из sys.argv).
+# Возвращает: код завершения (0 - без ошибок, 1 - были выписки с ошибками).
+
+#ENG
+# Function main
+# Input: command-line arguments (None - from sys.argv).
+# Returns: the exit code (0 - no errors, 1 - some statements failed).
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='main.py batch', description='Пакетная обработка папки выписок')
+    parser.add_argument('inputs', nargs='*', help='Папки, файлы или шаблоны путей (glob) с выписками .xlsx')
+    parser.add_argument('-o', '--output', default=None, help='Папка для отчетов (по умолчанию output из секции [CLI])')
+    parser.add_argument('-p', '--period', default='', help='Период отчета (формат как в API)')
+    parser.add_argument('-f', '--format', default=FORMAT_PDF, choices=OUTPUT_FORMATS, help='Формат результата')
+    parser.add_argument('-j', '--processes', type=int, default=0,
+                        help='Число процессов разбора (по умолчанию из секции [CLI] или по числу ядер)')
+    parser.add_argument('--force', action='store_true', help='Обработать заново и уже готовые выписки')
+    args = parser.parse_args(argv)
+
+    inputs = args.inputs or [get_setting('CLI', 'input', 'downloads')]
+    output_dir = args.output or get_setting('CLI', 'output', 'batch_reports')
+    summary = asyncio.run(run_batch(inputs, output_dir, args.period, args.format, args.processes, args.force))
+    print(f"Готово: {summary['done']} из {summary['total']}, пропущено {summary['skipped']}, "
+          f"без данных {summary['empty']}, с ошибками {summary['failed']}. "
+          f"Время {summary['seconds']} с, {summary['files_per_second']} файлов/с, {summary['mb_per_second']} МБ/с")
+    return 1 if summary['failed'] else 0
@@ -0,0 +1,185 @@
+#RU
+# Этот скрипт хранит накопленное состояние агрегации по каждому клиенту (SQLite).
+# Клиенты присылают нарастающие выписки (январь, затем январь-февраль, ...). Чтобы не
+# пересчитывать все заново, для клиента хранятся суммы, первые даты и назначения платежей
+# по каждой паре (название, ИНН) контрагента и индекс отпечатков уже учтенных операций.
+# Суммы хранятся в целых копейках, поэтому накопление не дает ошибок округления.
+# В состояние добавляются только новые операции, а отчет строится из обновленного состояния.
+
+#ENG
+# This script stores the accumulated aggregation state of each client (SQLite).
+# Clients send cumulative statements (January, then January-February, ...). To avoid
+# recomputing everything, each client keeps the sums, first dates and payment descriptions
+# per counterparty (name, INN) pair, plus an index of fingerprints of the operations already counted.
+# Sums are stored in integer kopecks, so accumulation introduces no rounding error.
+# Only new operations are folded into the state, and the report is built from the updated state.
+import logging
+import sqlite3
+
+from .commands import get_file, get_setting
+from .compact import from_kopecks
+
+DEFAULT_STATE_DB = 'state.db'
+
+#RU
+# Функция connect
+# На вход: ничего.
+# Возвращает: соединение с базой состояния (параметр db в секции [INCREMENTAL]) в режиме WAL.
+# При первом подключении создает таблицы и переводит суммы старой базы (debit REAL) в копейки.
+
+#ENG
+# Function connect
+# Input: none.
+# Returns: a connection to the state database (the db parameter in the [INCREMENTAL] section) in WAL mode.
+# Creates the tables on first connection and converts the sums of an old database (debit REAL) to kopecks.
+def connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(get_file(get_setting('INCREMENTAL', 'db', DEFAULT_STATE_DB)), timeout=30,
+                           isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS aggregates (
+        client TEXT NOT NULL,
+        name TEXT NOT NULL,
+        inn TEXT NOT NULL,
+        kopecks INTEGER NOT NULL,
+        first_date TEXT,
+        descriptions TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (client, name, inn)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS fingerprints (
+        client TEXT NOT NULL,
+        fingerprint INTEGER NOT NULL,
+        occurrence INTEGER NOT NULL,
+        PRIMARY KEY (client, fingerprint, occurrence)
+    ) WITHOUT ROWID
+    """)
+    _migrate_debit(conn)
+    return conn
+
+#RU Перевод сумм базы предыдущей версии (столбец debit REAL в рублях) в столбец kopecks INTEGER
+#ENG Converts the sums of a previous version database (a debit REAL column in rubles) to a kopecks INTEGER column
+def _migrate_debit(conn: sqlite3.Connection) -> None:
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(aggregates)")}
+    if 'debit' not in columns:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("ALTER TABLE aggregates ADD COLUMN kopecks INTEGER NOT NULL DEFAULT 0")
+        conn.execute("UPDATE aggregates SET kopecks = CAST(round(debit * 100) AS INTEGER)")
+        conn.execute("ALTER TABLE aggregates DROP COLUMN debit")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+#RU
+# Функция fold_statement
+# На вход: ID клиента, таблица выписки с колонками _hash и _occurrence (отпечатки операций)
+# и функция агрегации (aggregate_frame из scripts/process.py).
+# Возвращает: пару (данные агрегации новых строк или None, число новых строк).
+# В одной транзакции отбирает строки, отпечатков которых еще нет в индексе, агрегирует только их,
+# добавляет суммы и назначения к состоянию клиента и запоминает отпечатки.
+# Отпечатки выписки кладутся во временную таблицу, и новые строки находятся анти-соединением в SQLite
+# по первичному ключу индекса, без загрузки всей истории клиента в память.
+
+#ENG
+# Function fold_statement
+# Input: client ID, the statement table with _hash and _occurrence columns (operation fingerprints),
+# and the aggregation function (aggregate_frame from scripts/process.py).
+# Returns: a pair (aggregated data of the new rows or None, number of new rows).
+# Within one transaction it selects the rows whose fingerprints are not in the index yet, aggregates
+# only those, adds the sums and descriptions to the client state, and records the fingerprints.
+# The statement fingerprints go into a temporary table, and the new rows are found by an anti-join in SQLite
+# on the index primary key, without loading the client's whole history into memory.
+def fold_statement(client: str, df, aggregate) -> tuple:
+    conn = connect()
+    try:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming ("
+                     "position INTEGER PRIMARY KEY, fingerprint INTEGER NOT NULL, occurrence INTEGER NOT NULL)")
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM incoming")
+        conn.executemany(
+            "INSERT INTO incoming (position, fingerprint, occurrence) VALUES (?, ?, ?)",
+            ((position, int(h), int(o)) for position, (h, o) in enumerate(zip(df['_hash'], df['_occurrence'])))
+        )
+        positions = [row['position'] for row in conn.execute(
+            "SELECT position FROM incoming i WHERE NOT EXISTS ("
+            "SELECT 1 FROM fingerprints f "
+            "WHERE f.client = ? AND f.fingerprint = i.fingerprint AND f.occurrence = i.occurrence"
+            ") ORDER BY position",
+            (client,)
+        )]
+        new_rows = df.iloc[positions]
+        data = aggregate(new_rows.drop(columns=['_hash', '_occurrence'])) if not new_rows.empty else None
+
+        conn.execute(
+            "INSERT OR IGNORE INTO fingerprints (client, fingerprint, occurrence) "
+            "SELECT ?, fingerprint, occurrence FROM incoming",
+            (client,)
+        )
+        if data is not None:
+            # Суммы aggregate_frame получены из копеек делением на 100, обратный перевод точен
+            conn.executemany(
+                "INSERT INTO aggregates (client, name, inn, kopecks, first_date, descriptions) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (client, name, inn) DO UPDATE SET "
+                "kopecks = kopecks + excluded.kopecks, "
+                "first_date = COALESCE(first_date, excluded.first_date), "
+                "descriptions = descriptions || '<br><br>' || excluded.descriptions",
+                ((client, item['column1'], str(item['company_inn']), round(float(item['debit']) * 100), item['date'],
+                  item['payment_description']) for item in data['column2'])
+            )
+        conn.execute("DELETE FROM incoming")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    logging.info(f'Состояние клиента {client}: новых строк {len(new_rows)} из {len(df)}')
+    return data, len(new_rows)
+
+#RU
+# Функция load_client_report
+# На вход: ID клиента.
+# Возвращает: список транзакций в формате column2 (как у aggregate_frame), отсортированный
+# по названию и ИНН, как после groupby.
+
+#ENG
+# Function load_client_report
+# Input: client ID.
+# Returns: a list of transactions in the column2 format (as from aggregate_frame), sorted
+# by name and INN, as after groupby.
+def load_client_report(client: str) -> list:
+    conn = connect()
+    rows = conn.execute(
+        "SELECT name, inn, kopecks, first_date, descriptions FROM aggregates WHERE client = ? ORDER BY name, inn",
+        (client,)
+    ).fetchall()
+    conn.close()
+    return [{
+        'date': row['first_date'],
+        'column1': row['name'],
+        'company_inn': row['inn'],
+        'debit': from_kopecks(row['kopecks']),
+        'payment_description': row['descriptions'],
+    } for row in rows]
+
+#RU
+# Функция reset_client
+# На вход: ID клиента.
+# Возвращает: ничего.
+# Удаляет накопленное состояние клиента, следующий отчет будет построен с нуля.
+
+#ENG
+# Function reset_client
+# Input: client ID.
+# Returns: none.
+# Deletes the client's accumulated state, the next report will be built from scratch.
+def reset_client(client: str) -> None:
+    conn = connect()
+    conn.execute("DELETE FROM aggregates WHERE client = ?", (client,))
+    conn.execute("DELETE FROM fingerprints WHERE client = ?", (client,))
+    conn.close()
@@ -8,6 +8,8 @@
 
 import os
 
+from configparser import ConfigParser
+
 #RU
 # Функция get_file
 # На вход: имя файла (строка).
@@ -84,3 +86,49 @@ def get_downloaded_file_api(filename: str) -> str:
     return file_path
 
 
+
+_config = {'mtime': None, 'parser': None}
+
+#RU
+# Функция load_config_cached
+# На вход: ничего.
+# Возвращает: разобранный `config.ini` (ConfigParser). Файл перечитывается только при изменении
+# времени его модификации, иначе возвращается разобранный ранее объект.
+
+#ENG
+# Function load_config_cached
+# Input: none.
+# Returns: the parsed `config.ini` (ConfigParser). The file is re-read only when its modification
+# time changes, otherwise the previously parsed object is returned.
+def load_config_cached() -> ConfigParser:
+    config_file = get_file('config.ini')
+    mtime = os.path.getmtime(config_file) if os.path.exists(config_file) else None
+    if _config['parser'] is not None and _config['mtime'] == mtime:
+        return _config['parser']
+
+    config = ConfigParser()
+    config.read(config_file)
+    _config.update(mtime=mtime, parser=config)
+    return config
+
+#RU
+# Функция get_setting
+# На вход: секция, ключ, значение по умолчанию и тип значения.
+# Возвращает: значение параметра из `config.ini`, приведенное к нужному типу.
+# Если секции или ключа нет, возвращает значение по умолчанию.
+
+#ENG
+# Function get_setting
+# Input: section, key, fallback value, and value type.
+# Returns: the parameter value from `config.ini`, cast to the requested type.
+# If the section or key is missing, returns the fallback value.
+def get_setting(section: str, key: str, fallback=None, cast=str):
+    value = load_config_cached().get(section, key, fallback=None)
+    if value is None or value == '':
+        return fallback
+    try:
+        if cast is bool:
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        return cast(value)
+    except ValueError:
+        return fallback
@@ -0,0 +1,92 @@
+#RU
+# Этот скрипт реализует компактное представление таблицы выписки для агрегации.
+# Названия контрагентов и ИНН хранятся как категории (коды + словарь уникальных значений),
+# а суммы - целыми копейками (int64). Группировка по категориям идет по кодам, а сумма копеек
+# точная: округлений и накопленной ошибки float нет. ИНН приводятся к строке один раз
+# на каждое уникальное значение, а не построчно.
+
+#ENG
+# This script implements a compact statement table representation for aggregation.
+# Counterparty names and INNs are stored as categories (codes + a dictionary of unique values),
+# and amounts as integer kopecks (int64). Grouping by categories works on the codes, and the kopeck
+# sum is exact: no rounding and no accumulated float error. INNs are converted to strings once
+# per unique value rather than row by row. The table is compacted once in load_statement,
+# and the cache and memory hold the compact table.
+import numpy as np
+import pandas as pd
+
+#RU
+# Функция to_kopecks
+# На вход: колонка сумм в рублях.
+# Возвращает: колонку int64 с суммами в копейках (пустые и нечисловые значения - 0).
+
+#ENG
+# Function to_kopecks
+# Input: a column of amounts in rubles.
+# Returns: an int64 column of amounts in kopecks (empty and non-numeric values are 0).
+def to_kopecks(amounts: pd.Series) -> pd.Series:
+    return (pd.to_numeric(amounts, errors='coerce').fillna(0) * 100).round().astype('int64')
+
+#RU
+# Функция string_categories
+# На вход: колонка значений любого типа.
+# Возвращает: категориальную колонку строк - те же значения, что дал бы astype(str) (пустые - 'nan'),
+# с отсортированным словарем категорий. Строки строятся только для уникальных значений.
+
+#ENG
+# Function string_categories
+# Input: a column of values of any type.
+# Returns: a categorical column of strings - the same values astype(str) would give (empty ones are 'nan'),
+# with a sorted category dictionary. Strings are built for unique values only.
+def string_categories(values: pd.Series) -> pd.Series:
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    labels, inverse = np.unique(np.asarray(uniques, dtype=object).astype(str), return_inverse=True)
+    return pd.Series(pd.Categorical.from_codes(inverse.reshape(-1)[codes], categories=labels), index=values.index)
+
+#RU
+# Функция is_compact
+# На вход: таблица выписки.
+# Возвращает: True, если таблица уже в компактном виде (названия - категории, суммы - копейки int64).
+
+#ENG
+# Function is_compact
+# Input: a statement table.
+# Returns: True if the table is already compact (names are categories, amounts are int64 kopecks).
+def is_compact(df: pd.DataFrame) -> bool:
+    return isinstance(df['COLUMN1.1'].dtype, pd.CategoricalDtype) and df['COLUMN3'].dtype == np.int64
+
+#RU
+# Функция compact_frame
+# На вход: подготовленная таблица выписки.
+# Возвращает: новую таблицу только со столбцами, нужными для агрегации: COLUMN1.1 (название) и COLUMN2 (ИНН)
+# - категории, COLUMN3 - сумма в копейках (int64). Исходная таблица не меняется, уже компактная возвращается как есть.
+
+#ENG
+# Function compact_frame
+# Input: the prepared statement table.
+# Returns: a new table with only the columns needed for aggregation: COLUMN1.1 (name) and COLUMN2 (INN)
+# are categories, COLUMN3 is the amount in kopecks (int64). The source table is left unchanged, an already compact one
+# is returned as is.
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    if is_compact(df):
+        return df
+    return pd.DataFrame({
+        'COLUMN1': df['COLUMN1'],
+        'COLUMN1.1': df['COLUMN1.1'].astype('category'),
+        'COLUMN2': string_categories(df['COLUMN2']),
+        'COLUMN3': to_kopecks(df['COLUMN3']),
+        'COLUMN4': df['COLUMN4'],
+        'COLUMN5': df['COLUMN5'],
+    }, index=df.index)
+
+#RU
+# Функция from_kopecks
+# На вход: сумма в копейках.
+# Возвращает: сумму в рублях (float с двумя знаками после запятой).
+
+#ENG
+# Function from_kopecks
+# Input: an amount in kopecks.
+# Returns: the amount in rubles (a float with two decimal places).
+def from_kopecks(kopecks) -> float:
+    return int(kopecks) / 100
@@ -0,0 +1,188 @@
+#RU
+# Этот скрипт реализует сквозной индекс контрагентов по всем построенным отчетам (SQLite).
+# После агрегации строки отчета (клиент, контрагент, ИНН, сумма, первая дата) сохраняются в базу
+# с индексами по ИНН и по нормализованному названию. Это отвечает на вопрос "кто из наших клиентов
+# платил ИНН X и сколько" без повторной генерации отчетов: поиск - один запрос по индексу.
+# Строки отчета хранятся под ключом отчета (хеш выписок и периода), поэтому повторная обработка
+# той же выписки с другим шаблоном или форматом заменяет строки, а не удваивает суммы.
+
+#ENG
+# This script implements a cross-report counterparty index over all built reports (SQLite).
+# After aggregation, the report rows (client, counterparty, INN, amount, first date) are stored
+# with indexes on INN and on the normalized name. This answers "which of our clients paid INN X
+# and how much" without regenerating reports: a lookup is a single indexed query.
+# Report rows are stored under a report key (a hash of the statements and the period), so reprocessing
+# the same statement with another template or format replaces the rows instead of doubling the sums.
+import hashlib
+import re
+import sqlite3
+import time
+
+from .commands import get_file, get_setting
+
+DEFAULT_COUNTERPARTIES_DB = 'counterparties.db'
+
+#RU
+# Константы организационно-правовых форм, которые не учитываются при поиске по названию
+#ENG
+# Legal form constants ignored in name search
+LEGAL_FORMS = ('ооо', 'оао', 'зао', 'пао', 'ао', 'ип', 'нко', 'ано', 'гуп', 'муп', 'фгуп')
+
+#RU
+# Функция connect
+# На вход: ничего.
+# Возвращает: соединение с базой индекса (параметр db в секции [COUNTERPARTIES]) в режиме WAL.
+# При первом подключении создает таблицу и индексы.
+
+#ENG
+# Function connect
+# Input: none.
+# Returns: a connection to the index database (the db parameter in the [COUNTERPARTIES] section) in WAL mode.
+# Creates the table and indexes on first connection.
+def connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(get_file(get_setting('COUNTERPARTIES', 'db', DEFAULT_COUNTERPARTIES_DB)), timeout=30,
+                           isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS report_rows (
+        report_key TEXT NOT NULL,
+        client TEXT NOT NULL,
+        name TEXT NOT NULL,
+        name_norm TEXT NOT NULL,
+        inn TEXT NOT NULL,
+        debit REAL NOT NULL,
+        first_date TEXT,
+        recorded_at REAL NOT NULL,
+        PRIMARY KEY (report_key, name, inn)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS report_rows_inn ON report_rows (inn)")
+    conn.execute("CREATE INDEX IF NOT EXISTS report_rows_name ON report_rows (name_norm)")
+    return conn
+
+#RU
+# Функция normalize_name
+# На вход: название контрагента.
+# Возвращает: название для поиска: нижний регистр, без кавычек и знаков препинания,
+# без организационно-правовой формы в начале и с одиночными пробелами.
+
+#ENG
+# Function normalize_name
+# Input: a counterparty name.
+# Returns: the search form of the name: lower case, no quotes or punctuation,
+# no leading legal form, and single spaces.
+def normalize_name(name) -> str:
+    words = re.sub(r'[^\w]+', ' ', str(name or '').casefold().replace('ё', 'е')).split()
+    while len(words) > 1 and words[0] in LEGAL_FORMS:
+        words = words[1:]
+    return ' '.join(words)
+
+#RU
+# Функция normalize_inn
+# На вход: ИНН (строка или число).
+# Возвращает: ИНН в виде строки без пробелов по краям и без хвоста '.0' (как в classify_inns),
+# чтобы ИНН из числовой колонки Excel находился по обычному запросу.
+
+#ENG
+# Function normalize_inn
+# Input: an INN (a string or a number).
+# Returns: the INN as a string without surrounding spaces and without a trailing '.0' (as in classify_inns),
+# so an INN from a numeric Excel column is found by a regular lookup.
+def normalize_inn(inn) -> str:
+    return re.sub(r'\.0$', '', str(inn).strip())
+
+#RU
+# Функция report_key
+# На вход: хеши содержимого выписок, период и флаг инкрементального отчета с ID клиента.
+# Возвращает: ключ отчета для индекса. Инкрементальный отчет клиента всегда имеет один ключ,
+# так как его состояние накопительное.
+
+#ENG
+# Function report_key
+# Input: content hashes of the statements, the period, and the incremental flag with the client ID.
+# Returns: the report key for the index. A client's incremental report always has the same key,
+# since its state is cumulative.
+def report_key(digests: list, period: str = '', incremental: bool = False, client: str = '') -> str:
+    source = f'incremental|{client}' if incremental else f"{'|'.join(sorted(digests))}|{period}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+#RU
+# Функция record_report
+# На вход: ключ отчета и данные отчета (см. aggregate_frame).
+# Возвращает: число сохраненных строк.
+# В одной транзакции заменяет строки отчета с этим ключом.
+
+#ENG
+# Function record_report
+# Input: the report key and the report data (see aggregate_frame).
+# Returns: the number of stored rows.
+# Replaces the rows of the report with this key within one transaction.
+def record_report(key: str, data: dict) -> int:
+    client = str(data['column1'])
+    now = time.time()
+    rows = [(key, client, str(item['column1']), normalize_name(item['column1']), normalize_inn(item['company_inn']),
+             float(item['debit']), item['date'], now) for item in data['column2']]
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM report_rows WHERE report_key = ?", (key,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO report_rows (report_key, client, name, name_norm, inn, debit, first_date, recorded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return len(rows)
+
+#RU
+# Функция search_counterparties
+# На вход: ИНН (точное совпадение) и/или начало названия контрагента, максимальное число результатов.
+# Возвращает: список записей {client, name, inn, debit, reports, first_date, last_seen},
+# сгруппированных по клиенту, контрагенту и ИНН, по убыванию суммы.
+# Название ищется по префиксу нормализованного названия через диапазон индекса (без LIKE).
+
+#ENG
+# Function search_counterparties
+# Input: an INN (exact match) and/or the beginning of a counterparty name, the maximum number of results.
+# Returns: a list of {client, name, inn, debit, reports, first_date, last_seen} records
+# grouped by client, counterparty and INN, by descending amount.
+# The name is searched by a prefix of the normalized name via an index range (no LIKE).
+def search_counterparties(inn: str = None, q: str = None, limit: int = 50) -> list:
+    conditions = []
+    params = []
+    if inn:
+        conditions.append("inn = ?")
+        params.append(normalize_inn(inn))
+    if q:
+        prefix = normalize_name(q)
+        conditions.append("name_norm >= ? AND name_norm < ?")
+        params += [prefix, prefix + '\U0010ffff']
+    if not conditions:
+        return []
+
+    conn = connect()
+    try:
+        rows = conn.execute(
+            "SELECT client, name, inn, round(SUM(debit), 2) AS debit, COUNT(*) AS reports, "
+            "MIN(first_date) AS first_date, MAX(recorded_at) AS last_seen "
+            f"FROM report_rows WHERE {' AND '.join(conditions)} "
+            "GROUP BY client, name, inn ORDER BY debit DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{
+        'client': row['client'],
+        'name': row['name'],
+        'inn': row['inn'],
+        'debit': row['debit'],
+        'reports': row['reports'],
+        'first_date': row['first_date'],
+        'last_seen': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['last_seen'])),
+    } for row in rows]
@@ -0,0 +1,181 @@
+#RU
+# Этот скрипт реализует куб выписки: суммы и число платежей по паре (контрагент, день).
+# Куб считается один раз за проход агрегации (aggregate_frame или потоковый разбор) и хранится
+# в данных отчета в колоночном виде: словари названий и дней плюс четыре списка одинаковой длины
+# (индекс названия, индекс дня, сумма в копейках, число платежей). Все графики отчета (доли, топ
+# контрагентов, помесячная динамика, суммы по дням) строятся из куба сверткой через numpy.bincount,
+# поэтому новый график стоит O(размер куба), а не еще один проход по операциям.
+
+#ENG
+# This script implements the statement cube: payment sums and counts per (counterparty, day) pair.
+# The cube is computed once during the aggregation pass (aggregate_frame or streaming parsing) and kept
+# in the report data in a columnar form: name and day dictionaries plus four lists of equal length
+# (name index, day index, sum in kopecks, payment count). All report charts (shares, top
+# counterparties, monthly dynamics, daily sums) are built from the cube by numpy.bincount roll-ups,
+# so a new chart costs O(cube size) rather than another pass over the operations.
+import numpy as np
+import pandas as pd
+
+from .commands import get_setting
+from .compact import from_kopecks
+from .graphs import create_pie_chart, create_bar_chart, create_timeseries_chart
+
+#RU Пустой куб (нет строк с ненулевым дебетом)
+#ENG An empty cube (no rows with a non-zero debit)
+def _empty_cube() -> dict:
+    return {'names': [], 'days': [], 'name': [], 'day': [], 'kopecks': [], 'count': []}
+
+#RU
+# Функция frame_cube
+# На вход: компактная таблица выписки (см. scripts/compact.py), уже отфильтрованная по периоду и дебету.
+# Возвращает: куб выписки. Операции без даты учитываются в итогах по контрагентам (индекс дня -1),
+# но не попадают в графики по дням и месяцам.
+
+#ENG
+# Function frame_cube
+# Input: the compact statement table (see scripts/compact.py), already filtered by period and debit.
+# Returns: the statement cube. Operations without a date count towards the counterparty totals (day index -1)
+# but do not appear in the daily and monthly charts.
+def frame_cube(df: pd.DataFrame) -> dict:
+    name_codes, names = pd.factorize(df['COLUMN1.1'], sort=True)
+    days = pd.to_datetime(df['COLUMN5'], errors='coerce').dt.normalize()
+    day_codes, day_values = pd.factorize(days, sort=True)
+    cells = pd.DataFrame({'name': name_codes, 'day': day_codes, 'kopecks': df['COLUMN3'].to_numpy(dtype=np.int64)})
+    # groupby отбрасывает строки без названия контрагента, как и в aggregate_frame
+    cells = cells[cells['name'] >= 0].groupby(['name', 'day']).agg(
+        kopecks=('kopecks', 'sum'),
+        count=('kopecks', 'size'),
+    ).reset_index()
+    return {
+        'names': [str(name) for name in names],
+        'days': list(pd.DatetimeIndex(day_values).strftime('%Y-%m-%d')),
+        'name': cells['name'].tolist(),
+        'day': cells['day'].tolist(),
+        'kopecks': cells['kopecks'].tolist(),
+        'count': cells['count'].tolist(),
+    }
+
+#RU
+# Функция cells_cube
+# На вход: словарь {(название, день или None): [сумма в копейках, число платежей]} (потоковый разбор).
+# Возвращает: куб выписки в том же виде, что и frame_cube.
+
+#ENG
+# Function cells_cube
+# Input: a {(name, day or None): [sum in kopecks, payment count]} dictionary (streaming parsing).
+# Returns: the statement cube in the same shape as frame_cube.
+def cells_cube(cells: dict) -> dict:
+    if not cells:
+        return _empty_cube()
+    names = sorted({name for name, _ in cells})
+    days = sorted({str(day) for _, day in cells if day is not None})
+    name_index = {name: index for index, name in enumerate(names)}
+    day_index = {day: index for index, day in enumerate(days)}
+    cube = {'names': names, 'days': days, 'name': [], 'day': [], 'kopecks': [], 'count': []}
+    for (name, day), (kopecks, count) in sorted(cells.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        cube['name'].append(name_index[name])
+        cube['day'].append(day_index[str(day)] if day is not None else -1)
+        cube['kopecks'].append(int(kopecks))
+        cube['count'].append(int(count))
+    return cube
+
+#RU
+# Функция counterparty_totals
+# На вход: куб выписки.
+# Возвращает: список (название, сумма в копейках, число платежей) по убыванию суммы.
+
+#ENG
+# Function counterparty_totals
+# Input: the statement cube.
+# Returns: a list of (name, sum in kopecks, payment count) by descending sum.
+def counterparty_totals(cube: dict) -> list:
+    size = len(cube['names'])
+    kopecks = np.bincount(cube['name'], weights=cube['kopecks'], minlength=size).astype(np.int64)
+    counts = np.bincount(cube['name'], weights=cube['count'], minlength=size).astype(np.int64)
+    order = np.argsort(-kopecks, kind='stable')
+    return [(cube['names'][index], int(kopecks[index]), int(counts[index])) for index in order]
+
+#RU
+# Функция time_totals
+# На вход: куб выписки и шаг ('day' - по дням, 'month' - по месяцам).
+# Возвращает: пару (подписи периодов по возрастанию, суммы в копейках).
+
+#ENG
+# Function time_totals
+# Input: the statement cube and the step ('day' - daily, 'month' - monthly).
+# Returns: a (period labels in ascending order, sums in kopecks) pair.
+def time_totals(cube: dict, step: str = 'day'):
+    labels, codes = _time_codes(cube, step)
+    dated = codes >= 0
+    kopecks = np.bincount(codes[dated], weights=np.asarray(cube['kopecks'])[dated], minlength=len(labels))
+    return labels, kopecks.astype(np.int64)
+
+#RU
+# Функция monthly_trends
+# На вход: куб выписки и список названий контрагентов.
+# Возвращает: пару (подписи месяцев, {название: суммы в копейках по месяцам}).
+
+#ENG
+# Function monthly_trends
+# Input: the statement cube and a list of counterparty names.
+# Returns: a (month labels, {name: sums in kopecks per month}) pair.
+def monthly_trends(cube: dict, names: list):
+    labels, codes = _time_codes(cube, 'month')
+    name_codes = np.asarray(cube['name'], dtype=np.int64)
+    kopecks = np.asarray(cube['kopecks'], dtype=np.int64)
+    trends = {}
+    for name in names:
+        mask = (name_codes == cube['names'].index(name)) & (codes >= 0)
+        trends[name] = np.bincount(codes[mask], weights=kopecks[mask], minlength=len(labels)).astype(np.int64)
+    return labels, trends
+
+#RU Подписи периодов и индекс периода для каждой ячейки куба (-1 - операция без даты)
+#ENG Period labels and the period index of each cube cell (-1 - an operation without a date)
+def _time_codes(cube: dict, step: str):
+    days = np.asarray(cube['day'], dtype=np.int64)
+    if step == 'day':
+        return list(cube['days']), days
+    months = sorted({day[:7] for day in cube['days']})
+    month_index = {month: index for index, month in enumerate(months)}
+    # Последний элемент -1: индекс дня -1 (операция без даты) попадает на него
+    month_of_day = np.array([month_index[day[:7]] for day in cube['days']] + [-1], dtype=np.int64)
+    return months, month_of_day[days]
+
+#RU Рубли из массива копеек для подписей графиков
+#ENG Rubles from a kopeck array for chart values
+def _rubles(kopecks) -> list:
+    return [from_kopecks(value) for value in kopecks]
+
+#RU
+# Функция cube_charts
+# На вход: куб выписки (None - куба нет, например у инкрементального отчета).
+# Возвращает: словарь графиков Plotly для graph.html: pie - доли контрагентов, top - топ контрагентов
+# (параметр top в секции [CHARTS]), monthly - суммы по месяцам, trends - динамика топ-5 по месяцам,
+# daily - суммы по дням. Пустой словарь, если куба нет.
+
+#ENG
+# Function cube_charts
+# Input: the statement cube (None - there is no cube, e.g. for an incremental report).
+# Returns: a dictionary of Plotly charts for graph.html: pie - counterparty shares, top - top counterparties
+# (the top parameter in the [CHARTS] section), monthly - monthly sums, trends - monthly dynamics of the top 5,
+# daily - daily sums. An empty dictionary if there is no cube.
+def cube_charts(cube: dict) -> dict:
+    if not cube or not cube['names']:
+        return {}
+    top = max(1, get_setting('CHARTS', 'top', 10, int))
+    totals = counterparty_totals(cube)
+    charts = {
+        'pie': create_pie_chart([{'column1': name, 'debit': from_kopecks(kopecks)} for name, kopecks, _ in totals]),
+        'top': create_bar_chart([name for name, _, _ in totals[:top]],
+                                _rubles(kopecks for _, kopecks, _ in totals[:top]),
+                                f'Крупнейшие контрагенты (топ-{top})', horizontal=True),
+    }
+    if cube['days']:
+        months, monthly = time_totals(cube, 'month')
+        charts['monthly'] = create_bar_chart(months, _rubles(monthly), 'Поступления по месяцам')
+        _, trends = monthly_trends(cube, [name for name, _, _ in totals[:5]])
+        charts['trends'] = create_timeseries_chart(months, {name: _rubles(values) for name, values in trends.items()},
+                                                   'Динамика крупнейших контрагентов по месяцам')
+        days, daily = time_totals(cube, 'day')
+        charts['daily'] = create_timeseries_chart(days, {'Сумма за день': _rubles(daily)}, 'Поступления по дням')
+    return charts
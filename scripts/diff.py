@@ -0,0 +1,165 @@
+#RU
+# Этот скрипт реализует сравнение двух выписок (или двух периодов одной выписки) по плательщикам:
+# новые плательщики, пропавшие плательщики и изменение сумм.
+# Каждая сторона сводится к итогам по ИНН (сумма в копейках, число платежей) на компактной таблице
+# (см. scripts/compact.py), после чего итоги соединяются по ИНН хеш-соединением (pd.merge, how='outer').
+# Таблицы берутся через load_statement, то есть из кэша разобранных таблиц: сравнение двух периодов
+# одной выписки разбирает Excel один раз, а сравнение уже обработанных выписок не разбирает его вовсе.
+
+#ENG
+# This script implements a comparison of two statements (or two periods of one statement) by payer:
+# new payers, lost payers and amount changes.
+# Each side is reduced to per-INN totals (the amount in kopecks, the payment count) on a compact table
+# (see scripts/compact.py), and the totals are joined on INN with a hash join (pd.merge, how='outer').
+# Tables come from load_statement, i.e. from the parsed table cache: comparing two periods of one
+# statement parses Excel once, and comparing already processed statements does not parse it at all.
+import numpy as np
+import pandas as pd
+
+from .compact import compact_frame, from_kopecks
+from .periods import period_mask
+
+#RU
+# Константы статусов плательщика в сравнении
+#ENG
+# Payer status constants in a comparison
+DIFF_NEW = 'new'
+DIFF_LOST = 'lost'
+DIFF_CHANGED = 'changed'
+DIFF_UNCHANGED = 'unchanged'
+DIFF_STATUSES = (DIFF_NEW, DIFF_LOST, DIFF_CHANGED, DIFF_UNCHANGED)
+DIFF_LABELS = {
+    DIFF_NEW: 'Новый плательщик',
+    DIFF_LOST: 'Пропавший плательщик',
+    DIFF_CHANGED: 'Сумма изменилась',
+    DIFF_UNCHANGED: 'Без изменений',
+}
+
+#RU
+# Функция payer_totals
+# На вход: подготовленная таблица выписки и период (пустая строка - вся выписка).
+# Возвращает: пару (название компании или None, таблица с индексом ИНН и столбцами name, kopecks, payments)
+# по строкам с ненулевым дебетом.
+
+#ENG
+# Function payer_totals
+# Input: the prepared statement table and the period (an empty string means the whole statement).
+# Returns: a (company name or None, table indexed by INN with name, kopecks, payments columns) pair
+# over the rows with a non-zero debit.
+def payer_totals(df: pd.DataFrame, period: str = ''):
+    if period:
+        df = df[period_mask(df['COLUMN5'], period)]
+    compact = compact_frame(df)
+    compact = compact[(compact['COLUMN3'] > 0) & compact['COLUMN1.1'].notna()]
+    company = compact['COLUMN1'].iloc[0] if not compact.empty else None
+    totals = compact.groupby('COLUMN2', observed=True).agg(
+        name=('COLUMN1.1', 'first'),
+        kopecks=('COLUMN3', 'sum'),
+        payments=('COLUMN3', 'size'),
+    )
+    # Словари категорий двух выписок разные, соединение идет по самим строкам ИНН
+    totals.index = totals.index.astype(str)
+    totals['name'] = totals['name'].astype(str)
+    return company, totals
+
+#RU
+# Функция diff_totals
+# На вход: итоги по ИНН базовой и текущей стороны (см. payer_totals).
+# Возвращает: список плательщиков {inn, name, status, base, current, delta, base_payments, current_payments}
+# по убыванию модуля изменения суммы.
+
+#ENG
+# Function diff_totals
+# Input: per-INN totals of the base and the current side (see payer_totals).
+# Returns: a list of payers {inn, name, status, base, current, delta, base_payments, current_payments}
+# by descending absolute amount change.
+def diff_totals(base: pd.DataFrame, current: pd.DataFrame) -> list:
+    joined = base.merge(current, how='outer', left_index=True, right_index=True,
+                        suffixes=('_base', '_current'), indicator=True)
+    base_kopecks = joined['kopecks_base'].fillna(0).astype('int64')
+    current_kopecks = joined['kopecks_current'].fillna(0).astype('int64')
+    delta = current_kopecks - base_kopecks
+    status = pd.Series(DIFF_CHANGED, index=joined.index)
+    status[delta == 0] = DIFF_UNCHANGED
+    status[joined['_merge'] == 'right_only'] = DIFF_NEW
+    status[joined['_merge'] == 'left_only'] = DIFF_LOST
+
+    # Все столбцы заполняются один раз, записи собираются за один проход в порядке убывания |delta|
+    result = pd.DataFrame({
+        'inn': joined.index,
+        'name': joined['name_current'].fillna(joined['name_base']).to_numpy(),
+        'status': status.to_numpy(),
+        'base': base_kopecks.to_numpy(),
+        'current': current_kopecks.to_numpy(),
+        'delta': delta.to_numpy(),
+        'base_payments': joined['payments_base'].fillna(0).astype('int64').to_numpy(),
+        'current_payments': joined['payments_current'].fillna(0).astype('int64').to_numpy(),
+    })
+    result = result.iloc[np.argsort(-np.abs(result['delta'].to_numpy()), kind='stable')]
+    records = result.to_dict('records')
+    for record in records:
+        for column in ('base', 'current', 'delta'):
+            record[column] = from_kopecks(record[column])
+        record['base_payments'] = int(record['base_payments'])
+        record['current_payments'] = int(record['current_payments'])
+    return records
+
+#RU
+# Функция diff_frames
+# На вход: таблицы базовой и текущей выписки (может быть одна и та же таблица) и периоды сторон.
+# Возвращает: словарь сравнения {company, base, current, delta, summary, payers}:
+# base/current - {period, total, payers}, summary - число плательщиков каждого статуса.
+
+#ENG
+# Function diff_frames
+# Input: the base and the current statement tables (may be the same table) and the periods of each side.
+# Returns: a comparison dictionary {company, base, current, delta, summary, payers}:
+# base/current are {period, total, payers}, summary is the payer count of each status.
+def diff_frames(base_df: pd.DataFrame, current_df: pd.DataFrame, base_period: str = '',
+                current_period: str = '') -> dict:
+    base_company, base = payer_totals(base_df, base_period)
+    current_company, current = payer_totals(current_df, current_period)
+    payers = diff_totals(base, current)
+    base_total, current_total = int(base['kopecks'].sum()), int(current['kopecks'].sum())
+    return {
+        'company': current_company if current_company is not None else base_company,
+        'base': {'period': base_period or None, 'total': from_kopecks(base_total), 'payers': len(base)},
+        'current': {'period': current_period or None, 'total': from_kopecks(current_total), 'payers': len(current)},
+        'delta': from_kopecks(current_total - base_total),
+        'summary': {status: sum(item['status'] == status for item in payers) for status in DIFF_STATUSES},
+        'payers': payers,
+    }
+
+#RU
+# Функция diff_statements
+# На вход: путь к базовой выписке, путь к текущей выписке (None - та же выписка), периоды сторон и флаг API.
+# Возвращает: словарь сравнения (см. diff_frames).
+# Выписки загружаются через кэш разобранных таблиц (см. load_statement), одна и та же выписка - один раз.
+
+#ENG
+# Function diff_statements
+# Input: the base statement path, the current statement path (None - the same statement), the periods of each side, and API flag.
+# Returns: the comparison dictionary (see diff_frames).
+# Statements are loaded through the parsed table cache (see load_statement), the same statement only once.
+def diff_statements(base_file: str, current_file: str = None, base_period: str = '', current_period: str = '',
+                    api=False) -> dict:
+    from .process import load_statement, resolve_period
+
+    base_period, current_period = resolve_period(base_period), resolve_period(current_period)
+    base_df = load_statement(base_file, api)
+    current_df = base_df if not current_file or current_file == base_file else load_statement(current_file, api)
+    return diff_frames(base_df, current_df, base_period, current_period)
+
+#RU
+# Функция render_diff
+# На вход: словарь сравнения.
+# Возвращает: компактный HTML-отчет сравнения (шаблон diff.html).
+
+#ENG
+# Function render_diff
+# Input: the comparison dictionary.
+# Returns: a compact HTML comparison report (the diff.html template).
+def render_diff(diff: dict) -> str:
+    from .process import get_template_env
+
+    return get_template_env().get_template('diff.html').render(diff=diff, labels=DIFF_LABELS)
@@ -0,0 +1,184 @@
+#RU
+# Этот скрипт реализует чтение Excel с выбором движка.
+# Движки:
+#   openpyxl - pd.read_excel с openpyxl, самый совместимый и самый медленный;
+#   openpyxl_stream - потоковое чтение openpyxl в режиме read-only: значения строк берутся
+#       напрямую (values_only), без объектов ячеек и поячеечного преобразования pandas;
+#   calamine - pd.read_excel с движком calamine (Rust, пакет python-calamine), самый быстрый.
+# В режиме auto движок выбирается по размеру файла (секция [EXCEL] в config.ini).
+# Все движки возвращают таблицу в том же виде, что и pd.read_excel.
+
+#ENG
+# This script implements Excel reading with a selectable engine.
+# Engines:
+#   openpyxl - pd.read_excel with openpyxl, the most compatible and the slowest;
+#   openpyxl_stream - streaming openpyxl read in read-only mode: row values are taken
+#       directly (values_only), without cell objects and pandas per-cell conversion;
+#   calamine - pd.read_excel with the calamine engine (Rust, the python-calamine package), the fastest.
+# In auto mode the engine is chosen by file size (the [EXCEL] section in config.ini).
+# All engines return the table in the same shape as pd.read_excel.
+import logging
+import os
+import warnings
+
+from .commands import get_setting
+
+#RU
+# Константы движков чтения
+#ENG
+# Reader engine constants
+READER_AUTO = 'auto'
+READER_OPENPYXL = 'openpyxl'
+READER_STREAM = 'openpyxl_stream'
+READER_CALAMINE = 'calamine'
+READERS = (READER_OPENPYXL, READER_STREAM, READER_CALAMINE)
+
+#RU
+# Функция calamine_available
+# На вход: ничего.
+# Возвращает: True, если установлен пакет python-calamine.
+
+#ENG
+# Function calamine_available
+# Input: none.
+# Returns: True if the python-calamine package is installed.
+def calamine_available() -> bool:
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+#RU
+# Функция choose_reader
+# На вход: путь к файлу и движок (None - параметр reader из секции [EXCEL]).
+# Возвращает: имя движка из READERS.
+# В режиме auto файлы меньше fast_min_mb читаются через openpyxl, крупные - через calamine,
+# а если он не установлен - потоково через openpyxl. Выбрасывает ValueError для неизвестного движка.
+
+#ENG
+# Function choose_reader
+# Input: file path and engine (None - the reader parameter from the [EXCEL] section).
+# Returns: an engine name from READERS.
+# In auto mode files smaller than fast_min_mb are read with openpyxl, larger ones with calamine,
+# or with streaming openpyxl if it is not installed. Raises ValueError for an unknown engine.
+def choose_reader(file_path: str, reader: str = None) -> str:
+    reader = (reader or get_setting('EXCEL', 'reader', READER_AUTO)).strip().lower()
+    if reader == READER_AUTO:
+        size_mb = os.path.getsize(file_path) / 1024 / 1024
+        if size_mb < get_setting('EXCEL', 'fast_min_mb', 2, float):
+            return READER_OPENPYXL
+        reader = READER_CALAMINE
+    if reader not in READERS:
+        raise ValueError(f'Неизвестный движок чтения Excel: {reader}')
+    if reader == READER_CALAMINE and not calamine_available():
+        logging.warning('Пакет python-calamine не установлен, используется потоковое чтение openpyxl')
+        return READER_STREAM
+    return reader
+
+#RU Значение ячейки openpyxl в том виде, в каком его отдает pandas (пустая ячейка - '', целые float - int)
+#ENG An openpyxl cell value as pandas produces it (empty cell - '', integral floats - int)
+def _convert_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+#RU
+# Функция iter_sheet_rows
+# На вход: путь к .xlsx файлу.
+# Возвращает: генератор строк первого листа (кортежи значений, пустые ячейки - None).
+# Лист читается в режиме read-only, в памяти держится только текущая строка.
+
+#ENG
+# Function iter_sheet_rows
+# Input: path to an .xlsx file.
+# Returns: a generator of the first sheet rows (tuples of values, empty cells are None).
+# The sheet is read in read-only mode, only the current row is kept in memory.
+def iter_sheet_rows(file_path: str):
+    import openpyxl
+
+    warnings.simplefilter("ignore", UserWarning)  # Подавляем предупреждения openpyxl
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+#RU Потоковое чтение openpyxl с разбором строк тем же TextParser, что и в pd.read_excel
+#ENG Streaming openpyxl read, rows are parsed with the same TextParser as in pd.read_excel
+def _read_stream(file_path: str, header, dtype=None):
+    import pandas as pd
+    from pandas.io.parsers import TextParser
+
+    data = []
+    last_row = 0
+    for row in iter_sheet_rows(file_path):
+        values = [_convert_cell(value) for value in row]
+        while values and values[-1] == '':
+            values.pop()
+        data.append(values)
+        if values:
+            last_row = len(data)
+    # Как и pandas, отбрасываем пустые строки в конце листа и выравниваем ширину строк
+    data = data[:last_row]
+    width = max((len(values) for values in data), default=0)
+    for values in data:
+        values.extend([''] * (width - len(values)))
+    if not data:
+        return pd.DataFrame()
+    return TextParser(data, header=header, skip_blank_lines=False, dtype=dtype).read()
+
+#RU
+# Функция read_sheet
+# На вход: путь к .xlsx файлу, номер строки заголовка (None - без заголовка, как в pd.read_excel),
+# движок (None - выбрать автоматически, см. choose_reader) и типы столбцов (dtype, как в pd.read_excel).
+# Возвращает: первый лист в виде DataFrame.
+
+#ENG
+# Function read_sheet
+# Input: path to an .xlsx file, header row number (None - no header, as in pd.read_excel),
+# engine (None - choose automatically, see choose_reader), and column types (dtype, as in pd.read_excel).
+# Returns: the first sheet as a DataFrame.
+def read_sheet(file_path: str, header=0, reader: str = None, dtype=None):
+    import pandas as pd
+
+    reader = choose_reader(file_path, reader)
+    logging.info(f'Читаем {file_path} движком {reader}')
+    warnings.simplefilter("ignore", UserWarning)
+    if reader == READER_STREAM:
+        return _read_stream(file_path, header, dtype)
+    return pd.read_excel(file_path, header=header, engine=reader, dtype=dtype)
+
+#RU
+# Функция read_first_row
+# На вход: путь к .xlsx файлу и движок (None - выбрать автоматически).
+# Возвращает: пару (значения первой строки листа с пустыми ячейками None, число строк листа или None).
+# Разбирается только первая строка, весь лист не читается.
+
+#ENG
+# Function read_first_row
+# Input: path to an .xlsx file and engine (None - choose automatically).
+# Returns: a pair (the first sheet row values with empty cells as None, the sheet row count or None).
+# Only the first row is parsed, the whole sheet is not read.
+def read_first_row(file_path: str, reader: str = None) -> tuple:
+    if choose_reader(file_path, reader) == READER_CALAMINE:
+        from python_calamine import CalamineWorkbook
+
+        sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+        rows = sheet.to_python(skip_empty_area=False, nrows=1)
+        first_row = tuple(value if value != '' else None for value in rows[0]) if rows else ()
+        return first_row, sheet.height or None
+
+    import openpyxl
+
+    warnings.simplefilter("ignore", UserWarning)
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[0]
+        first_row = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        rows = sheet.max_row
+    finally:
+        workbook.close()
+    return first_row, rows
@@ -0,0 +1,159 @@
+#RU
+# Этот скрипт выгружает агрегированные данные отчета в табличные форматы: CSV, XLSX, JSON и HTML.
+# Интеграциям, которым нужны только суммы по контрагентам, не нужно ждать рендера PDF в Chromium:
+# выгрузка строится из тех же данных, что generate_report передает в шаблоны.
+
+#ENG
+# This script exports the aggregated report data to tabular formats: CSV, XLSX, JSON and HTML.
+# Integrations that only need per-counterparty totals do not have to wait for a Chromium PDF render:
+# the export is built from the same data that generate_report passes to the templates.
+import csv
+import json
+import os
+
+from .graphs import create_pie_chart
+
+#RU
+# Константы
+# Поддерживаемые форматы результата и их MIME-типы.
+
+#ENG
+# Constants
+# Supported output formats and their MIME types.
+FORMAT_PDF = 'pdf'
+FORMAT_CSV = 'csv'
+FORMAT_XLSX = 'xlsx'
+FORMAT_JSON = 'json'
+FORMAT_HTML = 'html'
+
+OUTPUT_FORMATS = (FORMAT_PDF, FORMAT_CSV, FORMAT_XLSX, FORMAT_JSON, FORMAT_HTML)
+
+MEDIA_TYPES = {
+    FORMAT_PDF: 'application/pdf',
+    FORMAT_CSV: 'text/csv',
+    FORMAT_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    FORMAT_JSON: 'application/json',
+    FORMAT_HTML: 'text/html',
+}
+
+EXPORT_HEADER = ['Дата', 'Контрагент', 'ИНН', 'Сумма', 'Назначение платежа']
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#RU
+# Функция get_media_type
+# На вход: путь к файлу результата.
+# Возвращает: MIME-тип по расширению файла.
+
+#ENG
+# Function get_media_type
+# Input: path to the result file.
+# Returns: the MIME type based on the file extension.
+def get_media_type(file_path: str) -> str:
+    extension = os.path.splitext(str(file_path))[1].lstrip('.').lower()
+    return MEDIA_TYPES.get(extension, 'application/octet-stream')
+
+#RU
+# Функция export_rows
+# На вход: сгруппированные транзакции (column2 из generate_report).
+# Возвращает: генератор строк выгрузки. Назначения платежей разделяются переводом строки вместо <br>.
+
+#ENG
+# Function export_rows
+# Input: grouped transactions (column2 from generate_report).
+# Returns: a generator of export rows. Payment descriptions are separated by newlines instead of <br>.
+def export_rows(column2: list):
+    for item in column2:
+        yield [
+            item['date'],
+            item['column1'],
+            item['company_inn'],
+            item['debit'],
+            str(item['payment_description']).replace('<br><br>', '\n'),
+        ]
+
+#RU
+# Функция pie_summary
+# На вход: сгруппированные транзакции.
+# Возвращает: подписи и значения кругового графика (как на странице с графиком в PDF).
+
+#ENG
+# Function pie_summary
+# Input: grouped transactions.
+# Returns: pie chart labels and values (same as the chart page of the PDF).
+def pie_summary(column2: list) -> dict:
+    pie = create_pie_chart(column2)['data'][0]
+    return {'labels': list(pie['labels']), 'values': list(pie['values'])}
+
+def _write_csv(data: dict, output_path: str) -> None:
+    # utf-8-sig, чтобы Excel открыл кириллицу без вопросов
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(EXPORT_HEADER)
+        writer.writerows(export_rows(data['column2']))
+
+def _write_xlsx(data: dict, output_path: str) -> None:
+    import openpyxl
+
+    # Режим write_only пишет строки потоком, не держа весь лист в памяти
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Отчет')
+    sheet.append(EXPORT_HEADER)
+    for row in export_rows(data['column2']):
+        sheet.append(row)
+    workbook.save(output_path)
+
+def _write_json(data: dict, output_path: str) -> None:
+    payload = {
+        'company': data['column1'],
+        'total': round(sum(item['debit'] for item in data['column2']), 2),
+        'counterparties': data['column3'],
+        'transactions': [dict(zip(('date', 'name', 'inn', 'debit', 'payment_description'), row))
+                         for row in export_rows(data['column2'])],
+        'pie': pie_summary(data['column2']),
+        'quality': data.get('quality'),
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, default=str)
+
+def _write_html(data: dict, output_path: str) -> None:
+    import plotly.graph_objs as go
+    from .process import get_template_env
+
+    # plotly.js встраивается в страницу, чтобы она открывалась без доступа к CDN
+    chart_html = go.Figure(create_pie_chart(data['column2'])).to_html(full_html=False, include_plotlyjs=True)
+    rows = [dict(zip(('date', 'name', 'inn', 'debit', 'lines'), row[:4] + [row[4].split('\n')]))
+            for row in export_rows(data['column2'])]
+    html = get_template_env().get_template('report.html').render(
+        column1=data['column1'],
+        rows=rows,
+        total=round(sum(item['debit'] for item in data['column2']), 2),
+        chart_html=chart_html
+    )
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+WRITERS = {
+    FORMAT_CSV: _write_csv,
+    FORMAT_XLSX: _write_xlsx,
+    FORMAT_JSON: _write_json,
+    FORMAT_HTML: _write_html,
+}
+
+#RU
+# Функция export_report
+# На вход: данные отчета (column1, column2, column3), формат результата и имя выходного файла без расширения.
+# Возвращает: путь к файлу выгрузки в папке reports.
+
+#ENG
+# Function export_report
+# Input: report data (column1, column2, column3), output format, and output file name without extension.
+# Returns: path to the export file in the reports folder.
+def export_report(data: dict, output_format: str, output_file_name: str) -> str:
+    if output_format not in WRITERS:
+        raise ValueError(f'Неизвестный формат результата: {output_format}')
+    reports_path = os.path.join(BASE_DIR, '../reports')
+    os.makedirs(reports_path, exist_ok=True)
+    output_path = os.path.join(reports_path, f'{output_file_name}.{output_format}')
+    WRITERS[output_format](data, output_path)
+    return output_path
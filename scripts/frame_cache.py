@@ -0,0 +1,203 @@
+#RU
+# Этот скрипт реализует кэш разобранных выписок на диске.
+# Разбор Excel - самая дорогая часть обработки, поэтому подготовленная таблица сохраняется
+# под хешем содержимого исходного файла. Если тот же файл пришел снова (например, сначала
+# /preview, затем /process), таблица читается из кэша, а Excel не разбирается повторно.
+# Кэш общий для всех процессов (API, бот, воркеры), так как хранится в папке на диске.
+# Ключ записи - хеш файла вместе с версией раскладки и замен названий (см. cache_key), поэтому после
+# изменения layouts.json или замен таблица разбирается заново, а не берется устаревшая.
+# Таблицы хранятся в колоночном формате Arrow IPC (без сжатия) и читаются без разбора, столбец за столбцом;
+# таблицы, которые Arrow сохранить не может (столбцы смешанных типов), и установки без pyarrow используют pickle. Размер кэша ограничен бюджетом на диске с вытеснением LRU.
+
+#ENG
+# This script implements an on-disk cache of parsed statements.
+# Parsing Excel is the most expensive part of processing, so the prepared table is stored
+# under the content hash of the source file. If the same file comes again (e.g. /preview
+# first and then /process), the table is read from the cache and Excel is not parsed again.
+# The cache is shared by all processes (API, bot, workers) since it lives in a folder on disk.
+# The entry key is the file hash together with the layout and name replacement versions (see cache_key), so after
+# layouts.json or the replacements change the table is parsed again instead of serving a stale one.
+# Tables are stored in the columnar Arrow IPC format (uncompressed) and are read column by column without parsing;
+# tables Arrow cannot store (mixed-type columns) and installs without pyarrow fall back to pickle. The cache size is bounded by a disk budget with LRU eviction.
+import hashlib
+import logging
+import os
+import time
+
+from .commands import get_file, get_setting
+
+#RU
+# Функция get_cache_dir
+# На вход: ничего.
+# Возвращает: путь к папке кэша (параметр dir в секции [CACHE]), создает ее при необходимости.
+
+#ENG
+# Function get_cache_dir
+# Input: none.
+# Returns: path to the cache folder (the dir parameter in the [CACHE] section), creating it if needed.
+def get_cache_dir() -> str:
+    cache_dir = get_file(get_setting('CACHE', 'dir', 'cache'))
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+#RU
+# Функция file_digest
+# На вход: путь к файлу.
+# Возвращает: SHA-256 содержимого файла (читается блоками, без загрузки целиком в память).
+
+#ENG
+# Function file_digest
+# Input: file path.
+# Returns: SHA-256 of the file contents (read in blocks, without loading it all into memory).
+def file_digest(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+#RU
+# Функция cache_key
+# На вход: хеш исходного файла и версии всего, от чего зависит подготовленная таблица (раскладка, замены).
+# Возвращает: ключ записи кэша. Изменение любой версии дает новый ключ, и старая таблица не используется.
+
+#ENG
+# Function cache_key
+# Input: hash of the source file and versions of everything the prepared table depends on (layout, replacements).
+# Returns: the cache entry key. Changing any version gives a new key, so the stale table is not used.
+def cache_key(digest: str, *versions: str) -> str:
+    return hashlib.sha256('\x1f'.join((digest,) + versions).encode('utf-8')).hexdigest()
+
+#RU Константы расширений записей кэша: Arrow IPC и запасной pickle
+#ENG Cache entry extension constants: Arrow IPC and the pickle fallback
+ARROW_EXTENSION = '.arrow'
+PICKLE_EXTENSION = '.pkl'
+
+def _cache_path(digest: str, extension: str) -> str:
+    return os.path.join(get_cache_dir(), f'{digest}{extension}')
+
+#RU
+# Функция load_cached_frame
+# На вход: ключ записи (см. cache_key).
+# Возвращает: подготовленную таблицу (DataFrame) или None, если ее нет в кэше или кэш выключен.
+
+#ENG
+# Function load_cached_frame
+# Input: the entry key (see cache_key).
+# Returns: the prepared table (DataFrame) or None if it is not cached or the cache is disabled.
+def load_cached_frame(digest: str):
+    if not get_setting('CACHE', 'enabled', True, bool):
+        return None
+    for extension in (ARROW_EXTENSION, PICKLE_EXTENSION):
+        path = _cache_path(digest, extension)
+        if not os.path.exists(path):
+            continue
+        try:
+            if extension == ARROW_EXTENSION:
+                from pyarrow import feather
+
+                df = feather.read_table(path).to_pandas()
+            else:
+                import pandas as pd
+
+                df = pd.read_pickle(path)
+        except Exception as e:
+            logging.warning(f'Не удалось прочитать кэш {path}: {e}')
+            continue
+        # Время доступа обновляется: по нему вытесняются давно не используемые записи (LRU)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return df
+    return None
+
+#RU Запись таблицы в Arrow IPC без сжатия; False - если pyarrow не установлен или не смог сохранить таблицу
+#ENG Writes the table as uncompressed Arrow IPC; False if pyarrow is not installed or cannot store the table
+def _write_arrow(df, path: str) -> bool:
+    try:
+        from pyarrow import feather
+    except ImportError:
+        return False
+    try:
+        feather.write_feather(df, path, compression='uncompressed')
+    except (TypeError, ValueError, NotImplementedError) as e:
+        # ArrowTypeError/ArrowInvalid/ArrowNotImplementedError - столбцы смешанных типов
+        logging.info(f'Таблица не сохраняется в Arrow ({e}), используется pickle')
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    return True
+
+#RU
+# Функция store_cached_frame
+# На вход: ключ записи (см. cache_key) и подготовленная таблица.
+# Возвращает: ничего.
+# Запись идет во временный файл с атомарной заменой, чтобы параллельные процессы не прочитали
+# недописанный кэш. Заодно кэш ужимается до бюджета на диске (см. cleanup_cache).
+
+#ENG
+# Function store_cached_frame
+# Input: the entry key (see cache_key) and the prepared table.
+# Returns: none.
+# Writes to a temporary file with an atomic rename so concurrent processes never read
+# a partially written entry. The cache is trimmed to its disk budget along the way (see cleanup_cache).
+def store_cached_frame(digest: str, df) -> None:
+    if not get_setting('CACHE', 'enabled', True, bool):
+        return
+    path = _cache_path(digest, ARROW_EXTENSION)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    if not _write_arrow(df, temp_path):
+        path = _cache_path(digest, PICKLE_EXTENSION)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        df.to_pickle(temp_path)
+    os.replace(temp_path, path)
+    cleanup_cache()
+
+#RU
+# Функция cleanup_cache
+# На вход: ничего.
+# Возвращает: количество удаленных записей.
+# Удаляет записи, к которым не обращались дольше ttl_seconds (секция [CACHE], 0 - без ограничения),
+# затем, если кэш больше max_mb мегабайт, удаляет записи по давности последнего обращения (LRU),
+# пока он не уложится в бюджет.
+
+#ENG
+# Function cleanup_cache
+# Input: none.
+# Returns: the number of removed entries.
+# Removes entries that have not been accessed for longer than ttl_seconds (the [CACHE] section, 0 - no limit),
+# then, if the cache is larger than max_mb megabytes, removes entries by last access time (LRU)
+# until it fits the budget.
+def cleanup_cache() -> int:
+    ttl = get_setting('CACHE', 'ttl_seconds', 3600, float)
+    budget = get_setting('CACHE', 'max_mb', 1024, float) * 1024 * 1024
+    now = time.time()
+    removed = 0
+    entries = []
+    for entry in os.scandir(get_cache_dir()):
+        try:
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            stat = entry.stat()
+            if ttl > 0 and now - stat.st_mtime > ttl:
+                os.remove(entry.path)
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            # Запись уже удалил другой процесс
+            pass
+
+    total = sum(size for _, size, _ in entries)
+    if budget > 0 and total > budget:
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+    return removed
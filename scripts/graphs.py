@@ -2,11 +2,15 @@
 # Этот скрипт реализует создание пирогового графика с использованием библиотеки Plotly.
 # Основная задача — визуализировать данные о транзакциях компаний,
 # группируя малозначительные компании в категорию "Остальные компании".
+# Столбчатые и линейные графики (топ контрагентов, динамика по месяцам и дням) строятся из куба выписки
+# (см. scripts/cube.py).
 
 #ENG
 # This script implements pie chart creation using the Plotly library.
 # The main task is to visualize company transaction data,
 # grouping insignificant column1 into the "Other column1" category.
+# Bar and line charts (top counterparties, monthly and daily dynamics) are built from the statement cube
+# (see scripts/cube.py).
 import plotly.graph_objs as go
 import logging
 
@@ -30,7 +34,7 @@ def create_pie_chart(all_info: list, threshold: float = 0.01) -> dict:
     # Собираем данные о компаниях и транзакциях
     for i in all_info:
         column3.append(i['column1'])
-        column4.append(i['column2'])
+        column4.append(i['debit'])
 
     # Обработка ошибок в данных транзакций
     if not column4 or any(t is None or not isinstance(t, (int, float)) for t in column4):
@@ -86,3 +90,48 @@ def create_pie_chart(all_info: list, threshold: float = 0.01) -> dict:
     )
 
     return pie.to_dict()
+
+#RU
+# Функция create_bar_chart
+# На вход: подписи столбцов, значения, заголовок и флаг горизонтального графика.
+# Возвращает: словарь с данными столбчатого графика.
+
+#ENG
+# Function create_bar_chart
+# Input: bar labels, values, title, and the horizontal chart flag.
+# Returns: a dictionary with the bar chart data.
+def create_bar_chart(labels: list, values: list, title: str, horizontal: bool = False) -> dict:
+    if horizontal:
+        # Крупнейшее значение - сверху
+        bar = go.Bar(x=values[::-1], y=labels[::-1], orientation='h')
+    else:
+        bar = go.Bar(x=labels, y=values)
+    chart = go.Figure(data=[bar])
+    chart.update_layout(
+        title_text=title,
+        title_font_size=18,
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)"
+    )
+    return chart.to_dict()
+
+#RU
+# Функция create_timeseries_chart
+# На вход: подписи оси X (даты или месяцы), словарь {название ряда: значения} и заголовок.
+# Возвращает: словарь с данными линейного графика, по одной линии на ряд.
+
+#ENG
+# Function create_timeseries_chart
+# Input: X axis labels (dates or months), a {series name: values} dictionary, and the title.
+# Returns: a dictionary with the line chart data, one line per series.
+def create_timeseries_chart(x: list, series: dict, title: str) -> dict:
+    chart = go.Figure(data=[go.Scatter(x=x, y=values, mode='lines+markers', name=name)
+                            for name, values in series.items()])
+    chart.update_layout(
+        title_text=title,
+        title_font_size=18,
+        showlegend=len(series) > 1,
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)"
+    )
+    return chart.to_dict()
@@ -0,0 +1,674 @@
+#RU
+# Этот скрипт реализует постоянную очередь задач на SQLite (режим WAL).
+# В очередь пишут API и Телеграм-бот, забирают задачи воркеры.
+# Задача выдается воркеру под аренду (lease): если воркер умер и не продлил аренду,
+# задача возвращается в очередь и будет обработана заново.
+
+#ENG
+# This script implements a persistent SQLite-backed job queue (WAL mode).
+# The API and the Telegram bot enqueue jobs, workers claim them.
+# A job is handed to a worker under a lease: if the worker dies and does not renew it,
+# the job returns to the queue and is processed again.
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+from .commands import get_file, get_setting
+
+#RU
+# Константы
+# Статусы задач и значения по умолчанию для config.ini.
+
+#ENG
+# Constants
+# Job statuses and defaults for config.ini.
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+
+DEFAULT_JOBS_DB = 'jobs.db'
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+
+#RU Колонки, добавленные после первой версии схемы: init_jobs_db досоздает их в старых базах
+#ENG Columns added after the first schema version: init_jobs_db adds them to older databases
+ADDED_COLUMNS = {
+    'cost': 'INTEGER NOT NULL DEFAULT 0',
+    'lane': "TEXT NOT NULL DEFAULT 'batch'",
+    'priority_at': 'REAL',
+    'cancel_requested': 'INTEGER NOT NULL DEFAULT 0',
+    'group_id': 'TEXT',
+}
+
+#RU
+# Полосы очереди: быстрая для небольших интерактивных задач и общая для крупных
+#ENG
+# Queue lanes: a fast one for small interactive jobs and a general one for large jobs
+LANE_INTERACTIVE = 'interactive'
+LANE_BATCH = 'batch'
+
+#RU
+# Функция get_jobs_db_path
+# На вход: ничего.
+# Возвращает: абсолютный путь к базе очереди (параметр db в секции [JOBS]).
+
+#ENG
+# Function get_jobs_db_path
+# Input: none.
+# Returns: absolute path to the queue database (the db parameter in the [JOBS] section).
+def get_jobs_db_path() -> str:
+    return get_file(get_setting('JOBS', 'db', DEFAULT_JOBS_DB))
+
+#RU
+# Функция connect
+# На вход: ничего.
+# Возвращает: соединение с базой очереди в режиме WAL и autocommit.
+# Транзакции открываются явно через BEGIN IMMEDIATE там, где нужна атомарность.
+
+#ENG
+# Function connect
+# Input: none.
+# Returns: a connection to the queue database in WAL and autocommit mode.
+# Transactions are opened explicitly with BEGIN IMMEDIATE where atomicity is required.
+def connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(get_jobs_db_path(), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+#RU
+# Функция init_jobs_db
+# На вход: ничего.
+# Возвращает: ничего.
+# Создает таблицу задач и индексы, если их еще нет.
+
+#ENG
+# Function init_jobs_db
+# Input: none.
+# Returns: none.
+# Creates the jobs table and indexes if they do not exist yet.
+def init_jobs_db() -> None:
+    conn = connect()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        user_id TEXT,
+        file_path TEXT NOT NULL,
+        file_name TEXT,
+        params TEXT NOT NULL DEFAULT '{}',
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_expires REAL,
+        result_path TEXT,
+        error TEXT,
+        meta TEXT,
+        delivered INTEGER NOT NULL DEFAULT 0,
+        notified_position INTEGER,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """)
+    existing = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column, definition in ADDED_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+    conn.execute("UPDATE jobs SET priority_at = created_at WHERE priority_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_priority ON jobs (status, lane, priority_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_source_delivered ON jobs (source, delivered, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_user_status ON jobs (user_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_group ON jobs (group_id, created_at)")
+    conn.close()
+
+#RU
+# Функция row_to_job
+# На вход: строка sqlite3.Row.
+# Возвращает: словарь задачи с разобранными params и meta.
+
+#ENG
+# Function row_to_job
+# Input: a sqlite3.Row.
+# Returns: a job dictionary with params and meta decoded.
+def row_to_job(row) -> dict:
+    job = dict(row)
+    job['params'] = json.loads(job['params'] or '{}')
+    job['meta'] = json.loads(job['meta']) if job.get('meta') else None
+    return job
+
+#RU
+# Функция assign_lane
+# На вход: оценка стоимости задачи в строках и параметры задачи.
+# Возвращает: полосу очереди и сдвиг приоритета в секундах.
+# Стоимость умножается на вес шаблона/формата (параметры weight.<имя> в секции [SCHEDULER]).
+# Дешевые задачи идут в быструю полосу. Крупные получают сдвиг aging_seconds:
+# они пропускают вперед небольшие задачи, пришедшие не позже чем через aging_seconds,
+# поэтому крупная задача никогда не ждет бесконечно.
+
+#ENG
+# Function assign_lane
+# Input: the estimated job cost in rows and the job parameters.
+# Returns: the queue lane and the priority offset in seconds.
+# The cost is multiplied by the template/format weight (weight.<name> parameters in the [SCHEDULER] section).
+# Cheap jobs go to the fast lane. Large jobs get an aging_seconds offset:
+# they let small jobs that arrive up to aging_seconds later go first,
+# so a large job never waits forever.
+def assign_lane(cost: int, params: dict = None) -> tuple:
+    params = params or {}
+    weight = 1.0
+    for name in (params.get('template'), params.get('output_format')):
+        if name:
+            weight *= get_setting('SCHEDULER', f'weight.{name}', 1.0, float)
+    if cost * weight <= get_setting('SCHEDULER', 'interactive_max_cost', 5000, float):
+        return LANE_INTERACTIVE, 0
+    return LANE_BATCH, get_setting('SCHEDULER', 'aging_seconds', 120, float)
+
+#RU
+# Функция job_input_files
+# На вход: словарь задачи.
+# Возвращает: список входных файлов задачи. У сводной задачи, кроме file_path,
+# есть дополнительные выписки в params['files'].
+
+#ENG
+# Function job_input_files
+# Input: a job dictionary.
+# Returns: the list of the job's input files. A consolidated job has additional
+# statements in params['files'] besides file_path.
+def job_input_files(job: dict) -> list:
+    files = [job['file_path']]
+    for file_path in job['params'].get('files', []):
+        if file_path not in files:
+            files.append(file_path)
+    return files
+
+#RU
+# Функция enqueue_job
+# На вход: источник (api/tg), ID пользователя, путь к файлу, исходное имя файла, параметры,
+# оценка стоимости задачи (см. scripts/admission.py) и ID группы задач (для пакетной обработки).
+# Возвращает: ID созданной задачи.
+# Задача ставится без контроля приема; прием с проверкой лимитов - см. enqueue_jobs и scripts/admission.py.
+
+#ENG
+# Function enqueue_job
+# Input: source (api/tg), user ID, file path, original file name, parameters,
+# the estimated job cost (see scripts/admission.py), and the job group ID (for batch processing).
+# Returns: the ID of the created job.
+# The job is added without admission control; admission with limit checks is in enqueue_jobs and scripts/admission.py.
+def enqueue_job(source: str, user_id, file_path: str, file_name: str = None, params: dict = None,
+                cost: int = 0, group_id: str = None) -> str:
+    _, job_ids = enqueue_jobs(source, user_id, [(file_path, file_name, params, cost)], group_id)
+    return job_ids[0]
+
+#RU
+# Функция enqueue_jobs
+# На вход: источник (api/tg), ID пользователя, список задач (путь к файлу, исходное имя файла, параметры, стоимость),
+# ID группы задач и функция приема admit(stats, cost) -> решение с атрибутом admitted (см. scripts/admission.py).
+# Возвращает: пару (решение admit или None, список ID созданных задач). При отказе задачи не создаются.
+# Подсчет задач в работе (inflight_stats), решение и вставка идут в одной транзакции BEGIN IMMEDIATE,
+# поэтому одновременные загрузки не могут вместе превысить лимиты, каждая пройдя проверку по отдельности.
+
+#ENG
+# Function enqueue_jobs
+# Input: source (api/tg), user ID, a list of jobs (file path, original file name, parameters, cost),
+# the job group ID, and the admission function admit(stats, cost) -> a decision with an admitted attribute (see scripts/admission.py).
+# Returns: a pair (the admit decision or None, list of created job IDs). On rejection no jobs are created.
+# Counting the in-flight jobs (inflight_stats), the decision and the insert run in one BEGIN IMMEDIATE transaction,
+# so concurrent uploads cannot exceed the limits together after each passing the check on its own.
+def enqueue_jobs(source: str, user_id, specs: list, group_id: str = None, admit=None) -> tuple:
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        decision = None
+        if admit is not None:
+            decision = admit(inflight_stats(user_id, conn), sum(cost for *_, cost in specs))
+            if not decision.admitted:
+                conn.execute("ROLLBACK")
+                return decision, []
+        now = time.time()
+        job_ids = []
+        for file_path, file_name, params, cost in specs:
+            job_id = uuid.uuid4().hex
+            lane, delay = assign_lane(cost, params)
+            conn.execute(
+                "INSERT INTO jobs (id, source, user_id, file_path, file_name, params, status, cost, lane, priority_at, "
+                "group_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, source, str(user_id), os.path.abspath(file_path), file_name,
+                 json.dumps(params or {}, ensure_ascii=False), STATUS_QUEUED, cost, lane, now + delay, group_id, now, now)
+            )
+            job_ids.append(job_id)
+            logging.info(f'Задача {job_id} от {source}:{user_id} поставлена в очередь {lane} ({file_name})')
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return decision, job_ids
+
+#RU
+# Функция requeue_expired
+# На вход: открытое соединение.
+# Возвращает: ничего.
+# Возвращает в очередь задачи с истекшей арендой. Задачи, исчерпавшие попытки, помечаются failed,
+# а задачи, которые пользователь успел отменить, - cancelled.
+
+#ENG
+# Function requeue_expired
+# Input: an open connection.
+# Returns: none.
+# Puts jobs with an expired lease back into the queue. Jobs out of attempts are marked failed,
+# and jobs the user has cancelled are marked cancelled.
+def requeue_expired(conn: sqlite3.Connection) -> None:
+    now = time.time()
+    max_attempts = get_setting('JOBS', 'max_attempts', DEFAULT_MAX_ATTEMPTS, int)
+    conn.execute(
+        "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+        "WHERE status = ? AND lease_expires < ? AND cancel_requested = 1",
+        (STATUS_CANCELLED, now, STATUS_RUNNING, now)
+    )
+    conn.execute(
+        "UPDATE jobs SET status = ?, error = 'Превышено число попыток', lease_owner = NULL, updated_at = ? "
+        "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+        (STATUS_FAILED, now, STATUS_RUNNING, now, max_attempts)
+    )
+    conn.execute(
+        "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+        "WHERE status = ? AND lease_expires < ?",
+        (STATUS_QUEUED, now, STATUS_RUNNING, now)
+    )
+
+#RU Доля общей полосы исчерпана: крупные задачи занимают не меньше max_batch_share выполняемых задач с учетом новой
+#ENG The batch lane share is used up: large jobs hold at least max_batch_share of the running jobs, counting the new one
+def batch_share_exhausted(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT COUNT(*) AS running, COALESCE(SUM(lane = ?), 0) AS batch FROM jobs WHERE status = ?",
+        (LANE_BATCH, STATUS_RUNNING)
+    ).fetchone()
+    return row['batch'] >= get_setting('SCHEDULER', 'max_batch_share', 0.5, float) * (row['running'] + 1)
+
+#RU
+# Функция claim_job
+# На вход: ID воркера, длительность аренды в секундах и полосы, которые обслуживает воркер (по умолчанию все).
+# Возвращает: словарь задачи или None, если очередь пуста.
+# Атомарно (BEGIN IMMEDIATE) забирает задачу с самым ранним приоритетом,
+# поэтому одну задачу никогда не получат два воркера.
+# Если воркер обслуживает обе полосы, а крупные задачи уже занимают не меньше max_batch_share
+# выполняемых задач (секция [SCHEDULER]), сначала берется задача быстрой полосы: иначе пачка
+# давно ждущих крупных задач заняла бы все общие воркеры.
+
+#ENG
+# Function claim_job
+# Input: worker ID, lease duration in seconds, and the lanes the worker serves (all by default).
+# Returns: a job dictionary or None if the queue is empty.
+# Atomically (BEGIN IMMEDIATE) claims the queued job with the earliest priority,
+# so two workers never receive the same job.
+# If the worker serves both lanes and large jobs already hold at least max_batch_share
+# of the running jobs ([SCHEDULER] section), a fast-lane job is taken first: otherwise a burst
+# of long-waiting large jobs would occupy all shared workers.
+def claim_job(worker_id: str, lease_seconds: float = None, lanes: list = None):
+    if lease_seconds is None:
+        lease_seconds = get_setting('JOBS', 'lease_seconds', DEFAULT_LEASE_SECONDS, int)
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        requeue_expired(conn)
+        query = "SELECT id FROM jobs WHERE status = ?"
+        args = [STATUS_QUEUED]
+        if lanes:
+            query += f" AND lane IN ({', '.join('?' * len(lanes))})"
+            args.extend(lanes)
+        row = None
+        if (not lanes or set(lanes) >= {LANE_INTERACTIVE, LANE_BATCH}) and batch_share_exhausted(conn):
+            row = conn.execute(query + " AND lane = ? ORDER BY priority_at, rowid LIMIT 1",
+                               args + [LANE_INTERACTIVE]).fetchone()
+        if row is None:
+            row = conn.execute(query + " ORDER BY priority_at, rowid LIMIT 1", args).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = ?",
+            (STATUS_RUNNING, worker_id, now + lease_seconds, now, row['id'])
+        )
+        job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        conn.execute("COMMIT")
+        return row_to_job(job)
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+#RU
+# Функция renew_lease
+# На вход: ID задачи, ID воркера и длительность аренды.
+# Возвращает: True, если аренда продлена (воркер все еще владеет задачей).
+
+#ENG
+# Function renew_lease
+# Input: job ID, worker ID, and lease duration.
+# Returns: True if the lease was renewed (the worker still owns the job).
+def renew_lease(job_id: str, worker_id: str, lease_seconds: float = None) -> bool:
+    if lease_seconds is None:
+        lease_seconds = get_setting('JOBS', 'lease_seconds', DEFAULT_LEASE_SECONDS, int)
+    now = time.time()
+    conn = connect()
+    cursor = conn.execute(
+        "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+        (now + lease_seconds, now, job_id, worker_id, STATUS_RUNNING)
+    )
+    conn.close()
+    return cursor.rowcount == 1
+
+#RU
+# Функция complete_job
+# На вход: ID задачи, ID воркера, путь к результату и метаданные.
+# Возвращает: ничего.
+
+#ENG
+# Function complete_job
+# Input: job ID, worker ID, result path, and metadata.
+# Returns: none.
+def complete_job(job_id: str, worker_id: str, result_path: str, meta: dict = None) -> None:
+    conn = connect()
+    conn.execute(
+        "UPDATE jobs SET status = ?, result_path = ?, meta = ?, error = NULL, lease_owner = NULL, "
+        "lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+        (STATUS_DONE, result_path, json.dumps(meta, ensure_ascii=False, default=str) if meta else None,
+         time.time(), job_id, worker_id)
+    )
+    conn.close()
+
+#RU
+# Функция fail_job
+# На вход: ID задачи, ID воркера, текст ошибки и флаг повтора.
+# Возвращает: True, если задача возвращена в очередь, False - если помечена failed,
+# None - если воркер уже не владеет задачей (аренда истекла, задача возвращена в очередь или отдана другому воркеру).
+
+#ENG
+# Function fail_job
+# Input: job ID, worker ID, error text, and retry flag.
+# Returns: True if the job was put back into the queue, False if it was marked failed,
+# None if the worker no longer owns the job (the lease expired and the job was requeued or claimed by another worker).
+def fail_job(job_id: str, worker_id: str, error: str, retry: bool = False):
+    max_attempts = get_setting('JOBS', 'max_attempts', DEFAULT_MAX_ATTEMPTS, int)
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        requeue = retry and row is not None and row['attempts'] < max_attempts
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ? AND status = ?",
+            (STATUS_QUEUED if requeue else STATUS_FAILED, error, time.time(), job_id, worker_id, STATUS_RUNNING)
+        )
+        conn.execute("COMMIT")
+        if cursor.rowcount == 0:
+            logging.warning(f'Воркер {worker_id} больше не владеет задачей {job_id}, ошибка попытки не записана')
+            return None
+        return requeue
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+#RU
+# Функция cancel_job
+# На вход: ID задачи.
+# Возвращает: статус задачи после запроса отмены или None, если задачи нет.
+# Задача в очереди отменяется сразу. У выполняющейся задачи выставляется флаг cancel_requested,
+# воркер замечает его и прерывает рендер (см. scripts/worker.py). Завершенные задачи не меняются.
+
+#ENG
+# Function cancel_job
+# Input: job ID.
+# Returns: the job status after the cancellation request, or None if there is no such job.
+# A queued job is cancelled right away. A running job gets the cancel_requested flag,
+# the worker notices it and aborts the render (see scripts/worker.py). Finished jobs are left as is.
+def cancel_job(job_id: str):
+    now = time.time()
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_CANCELLED, now, job_id, STATUS_QUEUED)
+        )
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = ?",
+            (now, job_id, STATUS_RUNNING)
+        )
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    logging.info(f'Запрошена отмена задачи {job_id} (статус: {row["status"]})')
+    return row['status']
+
+#RU
+# Функция is_cancel_requested
+# На вход: ID задачи.
+# Возвращает: True, если пользователь запросил отмену задачи.
+
+#ENG
+# Function is_cancel_requested
+# Input: job ID.
+# Returns: True if the user has requested the job to be cancelled.
+def is_cancel_requested(job_id: str) -> bool:
+    conn = connect()
+    row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    return bool(row and row['cancel_requested'])
+
+#RU
+# Функция mark_cancelled
+# На вход: ID задачи и ID воркера.
+# Возвращает: ничего.
+# Вызывается воркером, когда он прервал выполняющуюся задачу.
+
+#ENG
+# Function mark_cancelled
+# Input: job ID and worker ID.
+# Returns: none.
+# Called by the worker once it has aborted a running job.
+def mark_cancelled(job_id: str, worker_id: str) -> None:
+    conn = connect()
+    conn.execute(
+        "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+        "WHERE id = ? AND lease_owner = ?",
+        (STATUS_CANCELLED, time.time(), job_id, worker_id)
+    )
+    conn.close()
+
+#RU
+# Функция get_job
+# На вход: ID задачи.
+# Возвращает: словарь задачи или None.
+
+#ENG
+# Function get_job
+# Input: job ID.
+# Returns: a job dictionary or None.
+def get_job(job_id: str):
+    conn = connect()
+    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    return row_to_job(row) if row else None
+
+#RU
+# Функция group_jobs
+# На вход: ID группы задач.
+# Возвращает: задачи группы в порядке постановки в очередь.
+
+#ENG
+# Function group_jobs
+# Input: job group ID.
+# Returns: the group's jobs in the order they were enqueued.
+def group_jobs(group_id: str) -> list:
+    conn = connect()
+    rows = conn.execute("SELECT * FROM jobs WHERE group_id = ? ORDER BY created_at, rowid", (group_id,)).fetchall()
+    conn.close()
+    return [row_to_job(row) for row in rows]
+
+#RU
+# Функция queue_position
+# На вход: ID задачи.
+# Возвращает: позицию задачи в очереди своей полосы (с 1) с учетом приоритетов
+# или 0, если задача уже не в очереди.
+
+#ENG
+# Function queue_position
+# Input: job ID.
+# Returns: the job's position in its own lane's queue (1-based) taking priorities into account,
+# or 0 if it is no longer queued.
+def queue_position(job_id: str) -> int:
+    conn = connect()
+    row = conn.execute(
+        "SELECT COUNT(*) AS position FROM jobs AS other, jobs AS me "
+        "WHERE me.id = ? AND me.status = ? AND other.status = ? AND other.lane = me.lane "
+        "AND (other.priority_at < me.priority_at OR (other.priority_at = me.priority_at AND other.rowid <= me.rowid))",
+        (job_id, STATUS_QUEUED, STATUS_QUEUED)
+    ).fetchone()
+    conn.close()
+    return row['position']
+
+#RU
+# Функция queued_jobs
+# На вход: источник задач (необязательно).
+# Возвращает: список задач в очереди в порядке приоритета.
+
+#ENG
+# Function queued_jobs
+# Input: job source (optional).
+# Returns: a list of queued jobs in priority order.
+def queued_jobs(source: str = None) -> list:
+    conn = connect()
+    query = "SELECT * FROM jobs WHERE status = ?"
+    args = [STATUS_QUEUED]
+    if source:
+        query += " AND source = ?"
+        args.append(source)
+    rows = conn.execute(query + " ORDER BY priority_at, rowid", args).fetchall()
+    conn.close()
+    return [row_to_job(row) for row in rows]
+
+#RU
+# Функция set_notified_position
+# На вход: ID задачи и позиция, о которой уже сообщили пользователю.
+# Возвращает: ничего.
+
+#ENG
+# Function set_notified_position
+# Input: job ID and the position the user has already been told about.
+# Returns: none.
+def set_notified_position(job_id: str, position: int) -> None:
+    conn = connect()
+    conn.execute("UPDATE jobs SET notified_position = ? WHERE id = ?", (position, job_id))
+    conn.close()
+
+#RU
+# Функция undelivered_jobs
+# На вход: источник задач.
+# Возвращает: завершенные (done/failed/cancelled) задачи, результат которых еще не отправлен пользователю.
+
+#ENG
+# Function undelivered_jobs
+# Input: job source.
+# Returns: finished (done/failed/cancelled) jobs whose result has not been sent to the user yet.
+def undelivered_jobs(source: str) -> list:
+    conn = connect()
+    rows = conn.execute(
+        "SELECT * FROM jobs WHERE source = ? AND delivered = 0 AND status IN (?, ?, ?) ORDER BY updated_at",
+        (source, STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+    ).fetchall()
+    conn.close()
+    return [row_to_job(row) for row in rows]
+
+#RU
+# Функция mark_delivered
+# На вход: ID задачи.
+# Возвращает: ничего.
+
+#ENG
+# Function mark_delivered
+# Input: job ID.
+# Returns: none.
+def mark_delivered(job_id: str) -> None:
+    conn = connect()
+    conn.execute("UPDATE jobs SET delivered = 1 WHERE id = ?", (job_id,))
+    conn.close()
+
+#RU
+# Функция active_jobs
+# На вход: источник задач и ID пользователя.
+# Возвращает: задачи пользователя, которые еще в очереди или в работе.
+
+#ENG
+# Function active_jobs
+# Input: job source and user ID.
+# Returns: the user's jobs that are still queued or running.
+def active_jobs(source: str, user_id) -> list:
+    conn = connect()
+    rows = conn.execute(
+        "SELECT * FROM jobs WHERE source = ? AND user_id = ? AND status IN (?, ?) ORDER BY created_at",
+        (source, str(user_id), STATUS_QUEUED, STATUS_RUNNING)
+    ).fetchall()
+    conn.close()
+    return [row_to_job(row) for row in rows]
+
+#RU
+# Функция active_input_files
+# На вход: ничего.
+# Возвращает: множество путей к входным файлам задач, которые еще в очереди или в работе.
+
+#ENG
+# Function active_input_files
+# Input: none.
+# Returns: the set of input file paths of jobs that are still queued or running.
+def active_input_files() -> set:
+    conn = connect()
+    rows = conn.execute(
+        "SELECT file_path, params FROM jobs WHERE status IN (?, ?)", (STATUS_QUEUED, STATUS_RUNNING)
+    ).fetchall()
+    conn.close()
+    return {file_path for row in rows for file_path in job_input_files(row_to_job(row))}
+
+#RU
+# Функция inflight_stats
+# На вход: ID пользователя и открытое соединение (None - открыть свое).
+# Возвращает: словарь с числом и суммарной стоимостью задач в очереди и в работе -
+# всего и у этого пользователя.
+
+#ENG
+# Function inflight_stats
+# Input: user ID and an open connection (None - opens its own).
+# Returns: a dictionary with the count and total cost of queued and running jobs -
+# overall and for this user.
+def inflight_stats(user_id, conn: sqlite3.Connection = None) -> dict:
+    own_conn = conn is None
+    if own_conn:
+        conn = connect()
+    row = conn.execute(
+        "SELECT COUNT(*) AS jobs, COALESCE(SUM(cost), 0) AS cost, "
+        "COALESCE(SUM(user_id = ?), 0) AS user_jobs, COALESCE(SUM(CASE WHEN user_id = ? THEN cost END), 0) AS user_cost "
+        "FROM jobs WHERE status IN (?, ?)",
+        (str(user_id), str(user_id), STATUS_QUEUED, STATUS_RUNNING)
+    ).fetchone()
+    if own_conn:
+        conn.close()
+    return dict(row)
@@ -0,0 +1,181 @@
+#RU
+# Этот скрипт реализует реестр раскладок выписок разных банков.
+# Раскладка описывает, где в листе начинается таблица операций (строка шапки, сдвиг столбцов,
+# служебные строки и лишние столбцы), и как ее столбцы называются в отчете (COLUMN1 ... COLUMN5).
+# Раскладка определяется по отпечатку первой строки листа - хешу в том виде, в каком ее видит pandas
+# (пустые ячейки - 'Unnamed: N'), поиск в словаре за O(1) без пробных разборов файла.
+# Встроенные раскладки задаются в DEFAULT_LAYOUTS, новые банки добавляются в JSON-файл
+# (параметр file в секции [LAYOUTS]) без изменения кода; файл перечитывается при изменении.
+
+#ENG
+# This script implements a registry of statement layouts of different banks.
+# A layout describes where the operations table starts in the sheet (header row, column offset,
+# service rows and extra columns), and how its columns are named in the report (COLUMN1 ... COLUMN5).
+# The layout is detected by the fingerprint of the first sheet row - a hash of it as pandas sees it
+# (empty cells are 'Unnamed: N'), an O(1) dictionary lookup without trial parses of the file.
+# Built-in layouts are defined in DEFAULT_LAYOUTS, new banks are added to a JSON file
+# (the file parameter in the [LAYOUTS] section) without code changes; the file is reloaded when it changes.
+import hashlib
+import json
+import logging
+import os
+
+from .commands import get_file, get_setting
+from .excel_reader import read_first_row
+
+#RU
+# Константы встроенных раскладок.
+# header - первая строка листа (недостающие до width ячейки считаются пустыми), header_row - номер строки
+# шапки таблицы, skip_rows - служебные строки под шапкой, column_offset - сколько столбцов пропустить слева,
+# drop_columns - позиции лишних столбцов таблицы, columns - соответствие {столбец отчета: столбец шапки}
+# (пустое - столбцы шапки уже называются как в отчете). Номера строк и столбцов считаются с нуля.
+#ENG
+# Built-in layout constants.
+# header - the first sheet row (cells missing up to width are empty), header_row - the table header
+# row number, skip_rows - service rows below the header, column_offset - how many columns to skip on the left,
+# drop_columns - positions of extra table columns, columns - the {report column: header column} mapping
+# (empty - the header columns are already named as in the report). Row and column numbers are zero-based.
+DEFAULT_LAYOUTS = [
+    {
+        'name': 'default',
+        'header': ['Операции на счетах'],
+        'width': 36,
+        'header_row': 10,
+        'skip_rows': [12, 13],
+        'column_offset': 11,
+        'drop_columns': [8, 9],
+        'columns': {},
+    },
+    {
+        # Та же выписка, выгруженная без заголовка в первой ячейке
+        'name': 'default_untitled',
+        'header': [],
+        'width': 36,
+        'header_row': 10,
+        'skip_rows': [12, 13],
+        'column_offset': 11,
+        'drop_columns': [8, 9],
+        'columns': {},
+    },
+]
+
+#RU
+# Класс Layout
+# На вход: описание раскладки (словарь в формате DEFAULT_LAYOUTS).
+# Раскладка выписки: геометрия таблицы операций и соответствие столбцов.
+
+#ENG
+# Class Layout
+# Input: a layout description (a dictionary in the DEFAULT_LAYOUTS format).
+# A statement layout: the operations table geometry and the column mapping.
+class Layout:
+    def __init__(self, spec: dict):
+        self.name = spec['name']
+        self.header = header_columns(spec.get('header', []), spec.get('width', 0))
+        self.header_row = int(spec['header_row'])
+        self.skip_rows = [int(row) for row in spec.get('skip_rows', [])]
+        self.column_offset = int(spec.get('column_offset', 0))
+        self.drop_columns = [int(column) for column in spec.get('drop_columns', [])]
+        self.columns = dict(spec.get('columns', {}))
+        self.fingerprint = header_fingerprint(self.header)
+        # Версия раскладки входит в ключ кэша разобранных таблиц: изменение раскладки сбрасывает кэш
+        self.version = hashlib.sha1(json.dumps(spec, sort_keys=True, ensure_ascii=False, default=str)
+                                    .encode('utf-8')).hexdigest()
+
+    #RU Переименование {столбец шапки: столбец отчета} для DataFrame.rename
+    #ENG The {header column: report column} renaming for DataFrame.rename
+    def renames(self) -> dict:
+        return {source: target for target, source in self.columns.items()}
+
+#RU
+# Функция header_columns
+# На вход: значения первой строки листа и ширина листа (0 - по числу значений).
+# Возвращает: список названий столбцов в том виде, в каком их видит pandas (пустые ячейки - 'Unnamed: N').
+
+#ENG
+# Function header_columns
+# Input: the first sheet row values and the sheet width (0 - by the number of values).
+# Returns: a list of column names as pandas sees them (empty cells are 'Unnamed: N').
+def header_columns(values, width: int = 0) -> list:
+    values = list(values) + [None] * max(0, width - len(values))
+    return [str(value) if value not in (None, '') else f'Unnamed: {index}' for index, value in enumerate(values)]
+
+#RU
+# Функция header_fingerprint
+# На вход: список названий столбцов первой строки.
+# Возвращает: SHA-1 названий (ключ реестра раскладок).
+
+#ENG
+# Function header_fingerprint
+# Input: a list of first-row column names.
+# Returns: SHA-1 of the names (the layout registry key).
+def header_fingerprint(columns: list) -> str:
+    return hashlib.sha1('\x1f'.join(columns).encode('utf-8')).hexdigest()
+
+_registry = {'mtime': None, 'layouts': {}}
+
+#RU
+# Функция get_registry
+# На вход: ничего.
+# Возвращает: словарь {отпечаток первой строки: Layout} из встроенных раскладок и JSON-файла
+# (параметр file в секции [LAYOUTS]). Раскладки из файла заменяют встроенные с тем же отпечатком.
+
+#ENG
+# Function get_registry
+# Input: none.
+# Returns: a {first-row fingerprint: Layout} dictionary from the built-in layouts and the JSON file
+# (the file parameter in the [LAYOUTS] section). Layouts from the file replace built-in ones with the same fingerprint.
+def get_registry() -> dict:
+    layouts_file = get_file(get_setting('LAYOUTS', 'file', 'layouts.json'))
+    mtime = os.path.getmtime(layouts_file) if os.path.exists(layouts_file) else None
+    if _registry['layouts'] and _registry['mtime'] == mtime:
+        return _registry['layouts']
+
+    specs = list(DEFAULT_LAYOUTS)
+    if mtime is not None:
+        try:
+            with open(layouts_file, encoding='utf-8') as f:
+                specs += json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f'Не удалось прочитать раскладки из {layouts_file}: {e}')
+
+    layouts = {}
+    for spec in specs:
+        try:
+            layout = Layout(spec)
+        except (KeyError, TypeError, ValueError) as e:
+            logging.error(f'Некорректная раскладка {spec.get("name") if isinstance(spec, dict) else spec}: {e}')
+            continue
+        layouts[layout.fingerprint] = layout
+    _registry.update(mtime=mtime, layouts=layouts)
+    return layouts
+
+#RU
+# Функция detect_layout
+# На вход: список названий столбцов первой строки листа.
+# Возвращает: Layout или None, если раскладка неизвестна.
+
+#ENG
+# Function detect_layout
+# Input: a list of the first sheet row column names.
+# Returns: a Layout or None if the layout is unknown.
+def detect_layout(columns: list):
+    return get_registry().get(header_fingerprint(columns))
+
+#RU
+# Функция file_layout
+# На вход: путь к .xlsx файлу.
+# Возвращает: Layout выписки. Читается только первая строка листа.
+# Выбрасывает ValueError, если раскладка неизвестна.
+
+#ENG
+# Function file_layout
+# Input: path to an .xlsx file.
+# Returns: the statement Layout. Only the first sheet row is read.
+# Raises ValueError if the layout is unknown.
+def file_layout(file_path: str) -> Layout:
+    first_row, _ = read_first_row(file_path)
+    layout = detect_layout(header_columns(first_row))
+    if layout is None:
+        raise ValueError(f'Неизвестная структура выписки: {file_path}')
+    return layout
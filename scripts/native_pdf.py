@@ -0,0 +1,193 @@
+#RU
+# Этот скрипт реализует встроенный движок PDF на reportlab, без браузера.
+# Таблица транзакций и список компаний - обычные таблицы, и для них не нужен Chromium:
+# reportlab верстает их прямо из того же контекста column1/column2/column3, что и templates_handler.
+# Движок выбирается для каждого шаблона в секции [ENGINES] config.ini.
+
+#ENG
+# This script implements a built-in reportlab PDF engine that needs no browser.
+# The transaction table and the company list are plain tables and do not need Chromium:
+# reportlab lays them out straight from the same column1/column2/column3 context as templates_handler.
+# The engine is selected per template in the [ENGINES] section of config.ini.
+import os
+import platform
+
+from xml.sax.saxutils import escape
+
+from .commands import get_setting
+
+ENGINE_CHROMIUM = 'chromium'
+ENGINE_NATIVE = 'native'
+
+FONT_NAME = 'ReportFont'
+
+_font_registered = False
+
+#RU
+# Функция get_font_path
+# На вход: ничего.
+# Возвращает: путь к TTF-шрифту с кириллицей (параметр font в [ENGINES] или системный шрифт).
+# Встроенные шрифты reportlab не содержат кириллицу, поэтому нужен TTF.
+
+#ENG
+# Function get_font_path
+# Input: none.
+# Returns: path to a TTF font with Cyrillic glyphs (the font parameter in [ENGINES] or a system font).
+# The reportlab built-in fonts have no Cyrillic, so a TTF is required.
+def get_font_path() -> str:
+    font = get_setting('ENGINES', 'font', '')
+    if font:
+        return font
+    system = platform.system()
+    if system == "Windows":
+        candidates = ["C:/Windows/Fonts/arial.ttf"]
+    elif system == "Darwin":  # MacOS
+        candidates = ["/Library/Fonts/Arial.ttf", "/System/Library/Fonts/Supplemental/Arial.ttf"]
+    else:
+        candidates = ["/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans.ttf"]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    raise EnvironmentError("Не найден TTF-шрифт с кириллицей, укажите параметр font в секции [ENGINES]")
+
+#RU
+# Функция get_engine
+# На вход: имя шаблона.
+# Возвращает: движок рендера шаблона (chromium или native).
+# Встроенный движок есть только для таблиц; для остальных шаблонов всегда используется Chromium.
+
+#ENG
+# Function get_engine
+# Input: template name.
+# Returns: the render engine for the template (chromium or native).
+# The built-in engine exists only for tables; all other templates always use Chromium.
+def get_engine(template_type: str) -> str:
+    engine = get_setting('ENGINES', template_type, ENGINE_CHROMIUM).strip().lower()
+    if engine == ENGINE_NATIVE and template_type in NATIVE_RENDERERS:
+        return ENGINE_NATIVE
+    return ENGINE_CHROMIUM
+
+#RU Регистрирует TTF-шрифт один раз за время жизни процесса
+#ENG Registers the TTF font once per process lifetime
+def _register_font() -> None:
+    global _font_registered
+    if _font_registered:
+        return
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdfmetrics.registerFont(TTFont(FONT_NAME, get_font_path()))
+    _font_registered = True
+
+#RU Стили текста: заголовок отчета, шапка таблицы и ячейки
+#ENG Text styles: report title, table header, and cells
+def _styles() -> dict:
+    from reportlab.lib.styles import ParagraphStyle
+
+    return {
+        'title': ParagraphStyle('title', fontName=FONT_NAME, fontSize=16, leading=20, spaceAfter=12),
+        'header': ParagraphStyle('header', fontName=FONT_NAME, fontSize=9, leading=11),
+        'cell': ParagraphStyle('cell', fontName=FONT_NAME, fontSize=8, leading=10),
+    }
+
+#RU Оформление таблицы: сетка и фон шапки
+#ENG Table look: grid and header background
+def _table_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    return TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e6e6e6')),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+
+#RU Верстает документ A4 альбомной ориентации, как у Chromium
+#ENG Lays out a landscape A4 document, same as Chromium
+def _build(output_pdf_path: str, story: list) -> None:
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate
+
+    doc = SimpleDocTemplate(output_pdf_path, pagesize=landscape(A4), leftMargin=10 * mm, rightMargin=10 * mm,
+                            topMargin=10 * mm, bottomMargin=10 * mm)
+    doc.build(story)
+
+#RU
+# Функция format_amount
+# На вход: сумма.
+# Возвращает: сумму с разделителями разрядов и двумя знаками после запятой.
+
+#ENG
+# Function format_amount
+# Input: an amount.
+# Returns: the amount with thousands separators and two decimal places.
+def format_amount(amount) -> str:
+    return f'{amount:,.2f}'.replace(',', ' ')
+
+#RU
+# Функция render_table_pdf
+# На вход: название компании, транзакции, список компаний и путь к PDF.
+# Возвращает: ничего.
+# Рисует таблицу транзакций (аналог template_2.html). Шапка таблицы повторяется на каждой странице.
+
+#ENG
+# Function render_table_pdf
+# Input: company name, column2, list of companies, and PDF path.
+# Returns: none.
+# Draws the transaction table (the template_2.html counterpart). The table header repeats on every page.
+def render_table_pdf(column1: str, column2: list, column3: list, output_pdf_path: str) -> None:
+    from reportlab.lib.units import mm
+    from reportlab.platypus import LongTable, Paragraph
+
+    _register_font()
+    styles = _styles()
+    header = ['№', 'Дата', 'Контрагент', 'ИНН', 'Сумма', 'Назначение платежа']
+    rows = [[Paragraph(title, styles['header']) for title in header]]
+    for index, item in enumerate(column2, start=1):
+        description = '<br/><br/>'.join(escape(str(part)) for part in str(item['payment_description']).split('<br><br>'))
+        rows.append([
+            str(index),
+            item['date'],
+            Paragraph(escape(str(item['column1'])), styles['cell']),
+            str(item['company_inn']),
+            format_amount(item['debit']),
+            Paragraph(description, styles['cell']),
+        ])
+
+    table = LongTable(rows, repeatRows=1, colWidths=[12 * mm, 22 * mm, 65 * mm, 28 * mm, 30 * mm, 120 * mm])
+    table.setStyle(_table_style())
+    _build(output_pdf_path, [Paragraph(escape(str(column1)), styles['title']), table])
+
+#RU
+# Функция render_companies_pdf
+# На вход: название компании, транзакции (не используются), список компаний и путь к PDF.
+# Возвращает: ничего.
+# Рисует список компаний-контрагентов (аналог test.html).
+
+#ENG
+# Function render_companies_pdf
+# Input: company name, column2 (unused), list of companies, and PDF path.
+# Returns: none.
+# Draws the list of counterparty companies (the test.html counterpart).
+def render_companies_pdf(column1: str, column2: list, column3: list, output_pdf_path: str) -> None:
+    from reportlab.lib.units import mm
+    from reportlab.platypus import LongTable, Paragraph
+
+    _register_font()
+    styles = _styles()
+    rows = [[Paragraph('№', styles['header']), Paragraph('Компания', styles['header'])]]
+    for index, company in enumerate(column3, start=1):
+        rows.append([str(index), Paragraph(escape(str(company)), styles['cell'])])
+
+    table = LongTable(rows, repeatRows=1, colWidths=[12 * mm, 265 * mm])
+    table.setStyle(_table_style())
+    _build(output_pdf_path, [Paragraph(escape(str(column1)), styles['title']), table])
+
+#RU Шаблоны, для которых есть встроенный движок
+#ENG Templates that have a built-in renderer
+NATIVE_RENDERERS = {
+    'template_2.html': render_table_pdf,
+    'test.html': render_companies_pdf,
+}
@@ -8,12 +8,15 @@
 # and interacting with HTML templates. It uses asynchronous programming to work
 # with the Playwright browser and PDF generation.
 import os
+import atexit
 import asyncio
+import hashlib
 import secrets
 import string
 import warnings
-import platform
 import logging
+import threading
+import multiprocessing
 
 import pandas as pd
 import requests as re
@@ -21,18 +24,52 @@ import requests as re
 import re as r
 
 from datetime import datetime
-from jinja2 import Environment, FileSystemLoader
-from concurrent.futures import ThreadPoolExecutor
-from playwright.async_api import async_playwright
-from PyPDF2 import PdfMerger
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PyPDF2 import PdfMerger, PdfReader
 
 
 
 from .graphs import create_pie_chart
-from .commands import get_downloaded_file, get_local_file, get_downloaded_file_api
+from .commands import get_downloaded_file, get_local_file, get_downloaded_file_api, get_setting
+from .browser import get_browser_pool, get_chrome_path
+from .native_pdf import get_engine, NATIVE_RENDERERS, ENGINE_NATIVE
+from .exports import export_report, FORMAT_PDF
+from .frame_cache import file_digest, cache_key, load_cached_frame, store_cached_frame
+from .client_state import fold_statement, load_client_report
+from .periods import period_mask, parse_period
+from .excel_reader import read_sheet
+from .layouts import file_layout
+from .compact import compact_frame, from_kopecks
+from .quality import frame_quality, quality_warnings, QUALITY_LABELS
+from .streaming import stream_aggregate, stream_statement, use_streaming
+from .counterparties import record_report, report_key
+from .cube import frame_cube, cube_charts
 
-#PS Заглушка
+#RU
+# Функция current_time
+# На вход: ничего.
+# Возвращает: словарь с текущими днем, месяцем и годом в виде строк ('DD', 'MM', 'YYYY').
+# Используется period_lcs для относительных периодов (текущий месяц, квартал, год).
+
+#ENG
+# Function current_time
+# Input: none.
+# Returns: a dictionary with the current day, month and year as strings ('DD', 'MM', 'YYYY').
+# Used by period_lcs for relative periods (current month, quarter, year).
 def current_time():
+    now = datetime.now()
+    return {'day': now.strftime('%d'), 'month': now.strftime('%m'), 'year': now.strftime('%Y')}
+
+#RU
+# Класс RenderError
+# Ошибка рендера шаблона или печати PDF (в том числе по таймауту).
+
+#ENG
+# Class RenderError
+# Template render or PDF print failure (including timeouts).
+class RenderError(RuntimeError):
     pass
 
 #RU
@@ -92,12 +129,12 @@ def process_inputs(file_responce , template_responce, period_responce ):
         if ',' in period_responce:
             args = period_responce.split(' ')
             for arg in args:
-                period_to_work += f'{period_lcs(arg)}?'
+                period_to_work += f'{period_lcs(arg)},'
             period_to_work = period_to_work[:-1] # ?????? ??? ?? ? ?? ? ? ? ?
         elif ' ' in period_responce:
             args = period_responce.split(' ')
             for arg in args:
-                period_to_work += f'{period_lcs(arg)}?'
+                period_to_work += f'{period_lcs(arg)},'
             period_to_work = period_to_work[:-1]
 
     return file_to_work , template_to_work , period_to_work
@@ -165,20 +202,27 @@ def period_lcs(period_responce):
             return str(current_time()['year'])
         
 #RU
-# Функция generate_report
-# На вход: путь к файлу, шаблон, период и флаг API.
-# Возвращает: путь к сгенерированному PDF-отчету.
-# Выполняет обработку данных, фильтрацию, создание графиков и генерацию PDF-файлов.
-
+# Константы замен для приведения названий компаний к единому виду
 #ENG
-# Function generate_report
-# Input: file path, template, period, and API flag.
-# Returns: path to the generated PDF report.
-# Performs data processing, filtering, graph creation, and PDF generation.
-async def generate_report(file_to_prepare: str, template=1, period='', api=False):
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+# Replacement constants for normalizing company names
+NAME_REPLACEMENTS = {
+    '''
+    Replacements
+    '''
+}
 
+#RU
+# Функция statement_path
+# На вход: путь к файлу и флаг API.
+# Возвращает: полный путь к скачанной выписке.
+# Выбрасывает FileNotFoundError, если файла нет.
+
+#ENG
+# Function statement_path
+# Input: file path and API flag.
+# Returns: the full path to the downloaded statement.
+# Raises FileNotFoundError if the file does not exist.
+def statement_path(file_to_prepare: str, api=False) -> str:
     if api:
         # Формируем путь для API вызова
         file_to_prepare = get_downloaded_file_api(file_to_prepare)
@@ -190,11 +234,61 @@ async def generate_report(file_to_prepare: str, template=1, period='', api=False
 
     if not os.path.exists(file_to_prepare):
         raise FileNotFoundError(f"Файл не найден: {file_to_prepare}")
+    return file_to_prepare
+
+#RU
+# Константа формата кэшированной таблицы (меняется вместе с ее столбцами)
+#ENG
+# Cached table format constant (changes together with its columns)
+FRAME_FORMAT = 'compact-2'
+
+#RU
+# Функция replacements_version
+# На вход: ничего.
+# Возвращает: хеш замен названий NAME_REPLACEMENTS (не зависит от порядка элементов и от процесса).
+
+#ENG
+# Function replacements_version
+# Input: none.
+# Returns: a hash of the NAME_REPLACEMENTS name replacements (independent of element order and of the process).
+def replacements_version() -> str:
+    items = NAME_REPLACEMENTS.items() if isinstance(NAME_REPLACEMENTS, dict) else NAME_REPLACEMENTS
+    return hashlib.sha1(repr(sorted(map(repr, items))).encode('utf-8')).hexdigest()
+
+#RU
+# Функция load_statement
+# На вход: путь к файлу и флаг API.
+# Возвращает: подготовленную компактную таблицу выписки (см. scripts/compact.py) с приведенными названиями и датами.
+# Таблица кэшируется по хешу содержимого файла, версии раскладки и замен названий (см. scripts/frame_cache.py),
+# поэтому повторный запрос по тому же файлу не разбирает Excel заново.
+
+#ENG
+# Function load_statement
+# Input: file path and API flag.
+# Returns: the prepared compact statement table (see scripts/compact.py) with normalized names and dates.
+# The table is cached by the file content hash, the layout version and the name replacements version
+# (see scripts/frame_cache.py), so a repeated request for the same file does not parse Excel again.
+def load_statement(file_to_prepare: str, api=False) -> pd.DataFrame:
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+    file_to_prepare = statement_path(file_to_prepare, api)
+    # Таблица зависит не только от файла, но и от раскладки (layouts.json) и замен названий
+    layout = file_layout(file_to_prepare)
+    digest = cache_key(file_digest(file_to_prepare), layout.version, replacements_version(), FRAME_FORMAT)
+    df = load_cached_frame(digest)
+    if df is not None:
+        logging.info(f'Таблица {file_to_prepare} взята из кэша')
+        return df
 
-    file_name = prepare_table(file_to_prepare, api=api)
+    file_name = prepare_table(file_to_prepare, api=api, layout=layout)
 
-    # Загружаем данные из Excel файла
-    df = pd.read_excel(file_name, engine='openpyxl')
+    # Загружаем данные из Excel файла и приводим столбцы к названиям отчета.
+    # ИНН читается как текст: иначе pandas превращает столбец из одних цифр в числа и теряет ведущие нули
+    inn_column = layout.columns.get('COLUMN2', 'COLUMN2')
+    df = read_sheet(file_name, dtype={inn_column: str})
+    if layout.columns:
+        df = df.rename(columns=layout.renames())
 
     if len(df.columns) != 0:
         logging.info(f'Открыли полученный файл {file_name}')
@@ -203,80 +297,65 @@ async def generate_report(file_to_prepare: str, template=1, period='', api=False
         raise FileNotFoundError(f"Файл пустой или повреждён: {file_name}")
 
     # Приводим названия к единому виду в столбцах COLUMN1 и COLUMN1.1
-    replacements = {
-        '''
-        Replacements
-        '''
-    }
-
-    df['COLUMN1'] = df['COLUMN1'].replace(replacements, regex=True)
-    df['COLUMN1.1'] = df['COLUMN1.1.1'].replace(replacements, regex=True)
+    df['COLUMN1'] = df['COLUMN1'].replace(NAME_REPLACEMENTS, regex=True)
+    df['COLUMN1.1'] = df['COLUMN1.1.1'].replace(NAME_REPLACEMENTS, regex=True)
 
     # Преобразование столбца с датой операции к типу datetime
     df['COLUMN5'] = pd.to_datetime(df['COLUMN5'], errors='coerce')
 
-    # Фильтрация данных по периоду
-    filtered_df = df.copy()
-
-    # Period handler // Не используется
-    # if '?' in period:
-    #     periods = period.split('?')
-    #     for p in periods:
-    #         if len(p) == 2:  # Проверяем только по месяцу
-    #             target_month = int(p)
-    #             filtered_df = pd.concat([filtered_df, df[df['COLUMN5'].dt.month == target_month]])
-    #         elif len(p) == 8:  # Проверяем по кварталу (перечень месяцев)
-    #             target_months = [int(m) for m in p.split()]
-    #             filtered_df = pd.concat([filtered_df, df[df['COLUMN5'].dt.month.isin(target_months)]])
-    #         elif len(p) == 4:  # Проверяем по году
-    #             target_year = int(p)
-    #             filtered_df = pd.concat([filtered_df, df[df['COLUMN5'].dt.year == target_year]])
-    #         else:
-    #             print("Неверный формат периода. Ожидается длина 2, 8 или 4.")
-    #             return
-    # else:
-    #     if len(period) == 2:  # Проверяем только по месяцу
-    #         target_month = int(period)
-    #         filtered_df = df[df['COLUMN5'].dt.month == target_month]
-    #     elif len(period) == 8:  # Проверяем по кварталу (перечень месяцев)
-    #         target_months = [int(m) for m in period.split()]
-    #         filtered_df = df[df['COLUMN5'].dt.month.isin(target_months)]
-    #     elif len(period) == 4:  # Проверяем по году
-    #         target_year = int(period)
-    #         filtered_df = df[df['COLUMN5'].dt.year == target_year]
-    #     else:
-    #         print("Неверный формат периода. Ожидается длина 2, 8 или 4.")
-    #         return
-
-    # Проверка на пустой DataFrame после фильтрации
-    # if filtered_df.empty:
-    #     print("Нет данных для заданного периода.")
-    #     os.remove(file_name)
-    #     return
-
-    # Проверка на пустые значения в колонке "COLUMN1.1"
-
-    empty_column = filtered_df[filtered_df['COLUMN1.1'].isna()]
-    if not empty_column.empty:
-        print(f"Есть строки с пустыми наименованиями:\n{empty_column}")
-
-    # Проверка COLUMN2 на длину
-    filtered_df['COLUMN2'] = filtered_df['COLUMN2'].astype(str)
-    incorrect_inn_kpo = filtered_df[~filtered_df['COLUMN2'].str.len().isin([9, 12])]
-    if not incorrect_inn_kpo.empty:
-        print(f"Есть строки с некорректным COLUMN2:\n{incorrect_inn_kpo}")
+    # Ужимаем один раз: в кэше и в памяти остается только компактная таблица (см. scripts/compact.py)
+    df = compact_frame(df)
+
+    os.remove(file_name)
+    store_cached_frame(digest, df)
+    return df
+
+#RU
+# Функция aggregate_frame
+# На вход: подготовленная таблица выписки и период (см. scripts/periods.py, пустая строка - вся выписка).
+# Возвращает: словарь с данными отчета (column1 - название компании, column2 - сгруппированные
+# транзакции, column3 - список контрагентов, warnings - замечания к качеству данных,
+# quality - сводка качества данных, см. scripts/quality.py, cube - куб для графиков, см. scripts/cube.py)
+# или None, если нет строк с ненулевым дебетом (в том числе за выбранный период).
+# Работает на компактной таблице из load_statement (см. scripts/compact.py), копия не создается;
+# другая таблица ужимается перед агрегацией. Исходная таблица не меняется.
+
+#ENG
+# Function aggregate_frame
+# Input: the prepared statement table and the period (see scripts/periods.py, an empty string means the whole statement).
+# Returns: a dictionary with the report data (column1 - company name, column2 - grouped
+# transactions, column3 - list of counterparties, warnings - data-quality remarks,
+# quality - the data-quality summary, see scripts/quality.py, cube - the chart cube, see scripts/cube.py)
+# or None if there are no rows with a non-zero debit (including within the selected period).
+# Works on the compact table from load_statement (see scripts/compact.py) without copying it;
+# any other table is compacted before aggregation. The source table is left unchanged.
+def aggregate_frame(df: pd.DataFrame, period: str = ''):
+    # Фильтрация данных по периоду: одна маска по индексу дат вместо повторных pd.concat
+    if period:
+        filtered_df = compact_frame(df[period_mask(df['COLUMN5'], period)])
+        # Проверка на пустой DataFrame после фильтрации
+        if filtered_df.empty:
+            logging.info("Нет данных для заданного периода.")
+            return None
+    else:
+        filtered_df = compact_frame(df)
+
+    # Проверка качества данных: пустые наименования, формат и контрольные цифры ИНН/КПП (см. scripts/quality.py)
+    quality = frame_quality(filtered_df['COLUMN2'], filtered_df['COLUMN1.1'])
+    warnings_found = quality_warnings(quality)
+    for warning in warnings_found:
+        logging.warning(f"{warning['message']}: {warning['rows']}")
 
     filtered_df = filtered_df[filtered_df['COLUMN3'] > 0]
 
     if filtered_df.empty:
-        print("Нет данных для компаний с ненулевыми дебетами.")
-        os.remove(file_name)
-        return
+        logging.info("Нет данных для компаний с ненулевыми дебетами.")
+        return None
 
-    # Группировка данных и расчет сумм
-    report = filtered_df.groupby(['COLUMN1.1', 'COLUMN2']).agg({
+    # Группировка данных и расчет сумм (COLUMN3 - целые копейки, сумма точная)
+    report = filtered_df.groupby(['COLUMN1.1', 'COLUMN2'], observed=True).agg({
         'COLUMN5': 'first',  # Можно заменить на 'min' для получения первой даты
-        'COLUMN3': lambda x: round(x.sum(), 2),
+        'COLUMN3': 'sum',
         'COLUMN4': '<br><br>'.join
     }).reset_index()
     
@@ -293,38 +372,387 @@ async def generate_report(file_to_prepare: str, template=1, period='', api=False
             'date': row['COLUMN5'].strftime('%Y-%m-%d'),
             'column1': row['COLUMN1.1'],
             'company_inn': row['COLUMN2'],
-            'debit': row['COLUMN3'],
+            'debit': from_kopecks(row['COLUMN3']),
             'payment_description': row['COLUMN4']
         })
 
+    # Куб (контрагент x день) для графиков считается в том же проходе (см. scripts/cube.py)
+    return {'column1': column1, 'column2': column2, 'column3': column3, 'warnings': warnings_found, 'quality': quality,
+            'cube': frame_cube(filtered_df)}
+
+#RU
+# Функция resolve_period
+# На вход: период от пользователя.
+# Возвращает: период в формате scripts/periods.py. Коды меню 1-5 (текущий/прошлый месяц,
+# текущий/прошлый квартал, текущий год) переводятся через period_lcs.
+# Выбрасывает ValueError, если период не разобран.
+
+#ENG
+# Function resolve_period
+# Input: the period from the user.
+# Returns: the period in the scripts/periods.py format. Menu codes 1-5 (current/previous month,
+# current/previous quarter, current year) are translated via period_lcs.
+# Raises ValueError if the period cannot be parsed.
+def resolve_period(period: str) -> str:
+    period = (period or '').strip()
+    if period in ('1', '2', '3', '4', '5'):
+        period = period_lcs(period)
+    parse_period(period)
+    return period
+
+#RU
+# Функция aggregate_statement
+# На вход: путь к файлу, флаг API и период.
+# Возвращает: данные отчета (см. aggregate_frame) или None, если нет строк с ненулевым дебетом.
+# Файлы от stream_min_mb мегабайт (секция [EXCEL]) разбираются потоково (см. scripts/streaming.py):
+# таблица целиком в память не загружается и в кэш не попадает.
+
+#ENG
+# Function aggregate_statement
+# Input: file path, API flag, and period.
+# Returns: the report data (see aggregate_frame) or None if there are no rows with a non-zero debit.
+# Files of at least stream_min_mb (the [EXCEL] section) are parsed in streaming mode (see scripts/streaming.py):
+# the table is not materialized in memory and is not cached.
+def aggregate_statement(file_to_prepare: str, api=False, period: str = ''):
+    file_path = statement_path(file_to_prepare, api)
+    if use_streaming(file_path):
+        return stream_aggregate(file_path, NAME_REPLACEMENTS, period)
+    return aggregate_frame(load_statement(file_to_prepare, api), period)
+
+_statement_pool = None
+_statement_pool_lock = threading.Lock()
+
+#RU
+# Функция get_statement_pool
+# На вход: ничего.
+# Возвращает: общий для процесса пул процессов разбора выписок (processes из секции [CONSOLIDATE]).
+# Пул создается при первом сводном отчете и переиспользуется, процессы запускаются через spawn:
+# fork процесса с потоками (цикл событий, to_thread, браузеры) может унаследовать захваченные блокировки.
+# При выходе пул закрывается (см. shutdown_statement_pool).
+
+#ENG
+# Function get_statement_pool
+# Input: none.
+# Returns: the process-wide statement parsing process pool (processes from the [CONSOLIDATE] section).
+# The pool is created on the first consolidated report and reused; processes are started with spawn:
+# forking a process with threads (event loop, to_thread, browsers) may inherit locks held at fork time.
+# The pool is shut down at exit (see shutdown_statement_pool).
+def get_statement_pool() -> ProcessPoolExecutor:
+    global _statement_pool
+    with _statement_pool_lock:
+        if _statement_pool is None:
+            max_workers = get_setting('CONSOLIDATE', 'processes', os.cpu_count() or 1, int)
+            _statement_pool = ProcessPoolExecutor(max_workers=max(1, max_workers),
+                                                  mp_context=multiprocessing.get_context('spawn'))
+        return _statement_pool
+
+#RU
+# Функция shutdown_statement_pool
+# На вход: пул, который нужно остановить (None - текущий).
+# Возвращает: ничего. Останавливает пул разбора выписок, если он все еще текущий;
+# следующий сводный отчет создаст новый.
+
+#ENG
+# Function shutdown_statement_pool
+# Input: the pool to stop (None - the current one).
+# Returns: none. Stops the statement parsing pool if it is still the current one;
+# the next consolidated report creates a new one.
+def shutdown_statement_pool(pool: ProcessPoolExecutor = None) -> None:
+    global _statement_pool
+    with _statement_pool_lock:
+        if pool is not None and pool is not _statement_pool:
+            return
+        pool, _statement_pool = _statement_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+atexit.register(shutdown_statement_pool)
+
+#RU
+# Функция load_statements
+# На вход: список путей к выпискам и флаг API.
+# Возвращает: список подготовленных таблиц в том же порядке.
+# Выписки разбираются параллельно в общем пуле процессов (см. get_statement_pool),
+# так как разбор Excel упирается в процессор. Кэш разобранных таблиц при этом работает как обычно.
+
+#ENG
+# Function load_statements
+# Input: a list of statement paths and API flag.
+# Returns: a list of prepared tables in the same order.
+# Statements are parsed in parallel in the shared process pool (see get_statement_pool),
+# since Excel parsing is CPU-bound. The parsed table cache works as usual.
+async def load_statements(files: list, api=False) -> list:
+    if len(files) == 1:
+        return [await asyncio.to_thread(load_statement, files[0], api)]
+    loop = asyncio.get_running_loop()
+    pool = get_statement_pool()
+    try:
+        return await asyncio.gather(*(loop.run_in_executor(pool, load_statement, file, api) for file in files))
+    except BrokenProcessPool:
+        # Процесс пула упал (например, по памяти): сломанный пул больше не принимает задачи, заменяем его
+        logging.error('Пул разбора выписок сломан, он будет создан заново')
+        shutdown_statement_pool(pool)
+        raise
+
+#RU
+# Функция add_fingerprints
+# На вход: подготовленная таблица выписки.
+# Возвращает: копию таблицы с колонками _hash (отпечаток операции) и _occurrence (номер вхождения
+# того же отпечатка в этой выписке). Отпечаток - хеш названия, ИНН, суммы, назначения и даты
+# (hash_pandas_object, 64 бита со знаком, чтобы помещаться в INTEGER SQLite).
+
+#ENG
+# Function add_fingerprints
+# Input: the prepared statement table.
+# Returns: a copy of the table with _hash (operation fingerprint) and _occurrence (occurrence number
+# of the same fingerprint within this statement) columns. The fingerprint is a hash of name, INN, amount,
+# description and date (hash_pandas_object, signed 64-bit so it fits into an SQLite INTEGER).
+def add_fingerprints(df: pd.DataFrame) -> pd.DataFrame:
+    key_columns = ['COLUMN1.1', 'COLUMN2', 'COLUMN3', 'COLUMN4', 'COLUMN5']
+    df = df.copy()
+    # Сумма хешируется в рублях, как до перехода на копейки, чтобы отпечатки в state.db не изменились
+    keys = df[key_columns].assign(COLUMN3=df['COLUMN3'] / 100).astype(str)
+    df['_hash'] = pd.util.hash_pandas_object(keys, index=False).values.view('int64')
+    df['_occurrence'] = df.groupby('_hash').cumcount()
+    return df
+
+#RU
+# Функция merge_statements
+# На вход: список подготовленных таблиц.
+# Возвращает: одну таблицу со всеми транзакциями без повторов.
+# Выписки по одному счету за пересекающиеся периоды содержат одни и те же операции. Для каждой строки
+# считается хеш по названию, ИНН, сумме, назначению и дате (hash_pandas_object), и строка отбрасывается,
+# если такая же уже встречалась в другой выписке. Одинаковые операции внутри одной выписки
+# сохраняются: повтор определяется по паре (хеш, номер вхождения в своей выписке).
+
+#ENG
+# Function merge_statements
+# Input: a list of prepared tables.
+# Returns: one table with all transactions and no repeats.
+# Statements for the same account over overlapping periods contain the same operations. Each row gets
+# a hash of name, INN, amount, description and date (hash_pandas_object), and the row is dropped
+# if the same one was already seen in another statement. Identical operations within one statement
+# are kept: a repeat is detected by the (hash, occurrence within its statement) pair.
+def merge_statements(frames: list) -> pd.DataFrame:
+    parts = [add_fingerprints(df) for df in frames]
+    merged = pd.concat(parts, ignore_index=True)
+    before = len(merged)
+    merged = merged.drop_duplicates(subset=['_hash', '_occurrence'])
+    logging.info(f'Сводная выписка: {len(merged)} строк, повторов удалено: {before - len(merged)}')
+    # У выписок разные словари категорий, после concat названия и ИНН снова приводятся к категориям
+    merged = merged.astype({'COLUMN1.1': 'category', 'COLUMN2': 'category'})
+    return merged.drop(columns=['_hash', '_occurrence'])
+
+#RU
+# Функция aggregate_incremental
+# На вход: подготовленная таблица нарастающей выписки.
+# Возвращает: данные отчета, построенные из накопленного состояния клиента (см. scripts/client_state.py),
+# или None, если у клиента нет ни одной строки с ненулевым дебетом.
+# Агрегируются только операции, которых еще нет в индексе отпечатков клиента.
+# Клиент определяется по названию владельца выписки (COLUMN1).
+
+#ENG
+# Function aggregate_incremental
+# Input: the prepared table of a cumulative statement.
+# Returns: the report data built from the client's accumulated state (see scripts/client_state.py),
+# or None if the client has no rows with a non-zero debit.
+# Only operations not yet present in the client's fingerprint index are aggregated.
+# The client is identified by the statement owner's name (COLUMN1).
+def aggregate_incremental(df: pd.DataFrame):
+    client = str(df['COLUMN1'].dropna().iloc[0]) if not df['COLUMN1'].dropna().empty else "Unknown"
+    new_data, _ = fold_statement(client, add_fingerprints(df), aggregate_frame)
+    column2 = load_client_report(client)
+    if not column2:
+        return None
+    return {
+        'column1': client,
+        'column2': column2,
+        'column3': list(dict.fromkeys(item['column1'] for item in column2)),
+        'warnings': new_data['warnings'] if new_data else [],
+        'quality': new_data['quality'] if new_data else None,
+        # В состоянии клиента нет разбивки по дням, графики строятся по column2
+        'cube': None,
+    }
+
+#RU
+# Функция preview_statement
+# На вход: путь к файлу, число крупнейших плательщиков в ответе и период.
+# Возвращает: словарь с итогами по выписке без рендера: число строк, период, общая сумма,
+# число контрагентов, крупнейшие плательщики, замечания и сводка качества данных.
+# Разобранная таблица остается в кэше, и полный отчет по тому же файлу ее переиспользует.
+# Большие файлы (см. aggregate_statement) разбираются потоково и в кэш не попадают.
+
+#ENG
+# Function preview_statement
+# Input: file path, the number of top payers to return, and the period.
+# Returns: a dictionary with statement totals and no rendering: row count, period, total amount,
+# counterparty count, top payers, remarks, and the data-quality summary.
+# The parsed table stays in the cache, and a full report for the same file reuses it.
+# Large files (see aggregate_statement) are parsed in streaming mode and are not cached.
+def preview_statement(file_to_prepare: str, top: int = 10, period: str = '') -> dict:
+    period = resolve_period(period)
+    file_path = statement_path(file_to_prepare)
+    if use_streaming(file_path):
+        accumulator = stream_statement(file_path, NAME_REPLACEMENTS, period)
+        rows, first_date, last_date = accumulator.rows, accumulator.first_date, accumulator.last_date
+        data = accumulator.result()
+    else:
+        df = load_statement(file_to_prepare)
+        if period:
+            df = df[period_mask(df['COLUMN5'], period)]
+        data = aggregate_frame(df)
+        dates = df['COLUMN5'].dropna()
+        rows = len(df)
+        first_date, last_date = (dates.min(), dates.max()) if not dates.empty else (None, None)
+    preview = {
+        'company': None,
+        'rows': rows,
+        'period': {
+            'from': first_date.strftime('%Y-%m-%d') if first_date is not None else None,
+            'to': last_date.strftime('%Y-%m-%d') if last_date is not None else None,
+        },
+        'total': 0,
+        'counterparties': 0,
+        'top_payers': [],
+        'warnings': [],
+        'quality': None,
+    }
+    if data is None:
+        return preview
+
+    payers = sorted(data['column2'], key=lambda item: item['debit'], reverse=True)
+    preview.update({
+        'company': data['column1'],
+        'total': from_kopecks(sum(round(item['debit'] * 100) for item in data['column2'])),
+        'counterparties': len(data['column2']),
+        'top_payers': [{'name': item['column1'], 'inn': item['company_inn'], 'debit': item['debit']}
+                       for item in payers[:top]],
+        'warnings': data['warnings'],
+        'quality': data['quality'],
+    })
+    return preview
+
+#RU
+# Функция index_report
+# На вход: данные отчета, список выписок отчета, флаг API, период и флаг инкрементального отчета.
+# Возвращает: ничего.
+# Сохраняет строки отчета в индекс контрагентов (см. scripts/counterparties.py). Ошибка индекса
+# не прерывает построение отчета, а только записывается в лог.
+
+#ENG
+# Function index_report
+# Input: the report data, the list of report statements, API flag, period, and the incremental report flag.
+# Returns: none.
+# Stores the report rows in the counterparty index (see scripts/counterparties.py). An index error
+# does not interrupt the report, it is only logged.
+def index_report(data: dict, files: list, api=False, period: str = '', incremental=False) -> None:
+    try:
+        digests = [] if incremental else [file_digest(statement_path(file, api)) for file in files]
+        key = report_key(digests, period, incremental, str(data['column1']))
+        rows = record_report(key, data)
+        logging.info(f'В индекс контрагентов записано строк: {rows}')
+    except Exception as e:
+        logging.error(f'Не удалось обновить индекс контрагентов: {e}')
+
+#RU
+# Функция generate_report
+# На вход: путь к файлу, шаблон, период, флаг API, формат результата (pdf, csv, xlsx, json, html)
+# список выписок для сводного отчета, флаг инкрементального обновления и словарь метаданных задачи.
+# Возвращает: путь к сгенерированному отчету. В meta (если передан) записываются замечания и сводка качества данных.
+# Если передан files, выписки разбираются параллельно и объединяются в один отчет (см. merge_statements).
+# При incremental=True в накопленное состояние клиента добавляются только новые операции (см. aggregate_incremental).
+# Сам отчет строит render_report.
+
+#ENG
+# Function generate_report
+# Input: file path, template, period, API flag, output format (pdf, csv, xlsx, json, html),
+# the list of statements for a consolidated report, the incremental update flag, and the job metadata dictionary.
+# Returns: path to the generated report. The remarks and the data-quality summary are written into meta (if given).
+# If files is given, the statements are parsed in parallel and merged into one report (see merge_statements).
+# With incremental=True only new operations are folded into the client's accumulated state (see aggregate_incremental).
+# The report itself is built by render_report.
+async def generate_report(file_to_prepare: str, template=1, period='', api=False, output_format=FORMAT_PDF,
+                          files: list = None, incremental=False, meta: dict = None):
+    period = resolve_period(period)
+    if files and len(files) > 1:
+        merged = await asyncio.to_thread(merge_statements, await load_statements(files, api))
+        data = await asyncio.to_thread(aggregate_frame, merged, period)
+    elif incremental:
+        if period:
+            logging.warning('Инкрементальный отчет строится по всему накопленному состоянию, период не применяется')
+        df = await asyncio.to_thread(load_statement, file_to_prepare, api)
+        data = await asyncio.to_thread(aggregate_incremental, df)
+    else:
+        # Разбор и агрегация упираются в процессор: выполняем их вне цикла событий, чтобы воркер
+        # продолжал продлевать аренду задачи, а встроенный в API воркер не блокировал запросы
+        data = await asyncio.to_thread(aggregate_statement, file_to_prepare, api, period)
+    if data is None:
+        return None
+    if meta is not None:
+        meta['warnings'] = data['warnings']
+        meta['quality'] = data.get('quality')
+    if get_setting('COUNTERPARTIES', 'enabled', True, bool):
+        await asyncio.to_thread(index_report, data, files or [file_to_prepare], api, period, incremental)
+    return await render_report(data, output_format, api)
+
+#RU
+# Функция render_report
+# На вход: данные отчета (см. aggregate_frame), формат результата и флаг API.
+# Возвращает: путь к сгенерированному отчету в папке reports.
+# Для PDF создает графики и рендерит PDF-файлы (страница качества данных - если page = 1 в секции [QUALITY]),
+# для остальных форматов выгружает агрегаты без браузера. Разбор выписки здесь не выполняется,
+# поэтому агрегацию можно вынести в отдельный процесс, а рендер оставить рядом с пулом браузеров.
+
+#ENG
+# Function render_report
+# Input: the report data (see aggregate_frame), output format, and API flag.
+# Returns: path to the generated report in the reports folder.
+# For PDF it creates graphs and renders PDF files (the data-quality page if page = 1 in the [QUALITY] section),
+# other formats export the aggregates without a browser. No statement parsing happens here,
+# so aggregation can run in a separate process while rendering stays next to the browser pool.
+async def render_report(data: dict, output_format=FORMAT_PDF, api=False):
+    column1, column2, column3 = data['column1'], data['column2'], data['column3']
+
     # Сохраняем в новый Excel файл
     today_date = datetime.now().strftime("%Y%m%d")
     output_file_name = sanitize_filename(f'Отчет_{column1}_{today_date}_{create_password()}')
 
+    if output_format != FORMAT_PDF:
+        # Табличным форматам не нужен ни Chromium, ни склейка PDF
+        output_path = await asyncio.to_thread(export_report, data, output_format, output_file_name)
+        logging.info(f"Генерация отчета завершена: {output_path}")
+        return output_path
+
     # Вспомогательная асинхронная функция для генерации PDF
     async def generate_pdfs():
-        pdf_path = await templates_handler('template_2.html', column1, column2, column3, output_file_name)
+        pdf_path = await render_table(column1, column2, column3, output_file_name)
         intermediary_output_file = f'companies_{output_file_name}'
         intermediary_pdf_path = await templates_handler('test.html', column1, [], column3, intermediary_output_file)
         graph_output_file = f'graph_{output_file_name}'
-        graph_pdf_path = await templates_handler('graph.html', column1, column2, column3, graph_output_file)
-        return pdf_path, intermediary_pdf_path, graph_pdf_path
+        graph_pdf_path = await templates_handler('graph.html', column1, column2, column3, graph_output_file,
+                                                 charts=cube_charts(data.get('cube')))
+        quality_pdf_path = None
+        if data.get('quality') and get_setting('QUALITY', 'page', False, bool):
+            quality_pdf_path = await templates_handler('quality.html', column1, [], [], f'quality_{output_file_name}',
+                                                       quality=data['quality'], labels=QUALITY_LABELS)
+        return pdf_path, intermediary_pdf_path, graph_pdf_path, quality_pdf_path
 
     # Запускаем асинхронную функцию и получаем пути к файлам
-    pdf_path, intermediary_pdf_path, graph_pdf_path = await generate_pdfs()
+    pdf_path, intermediary_pdf_path, graph_pdf_path, quality_pdf_path = await generate_pdfs()
 
     if api:
         pdf_path = get_downloaded_file(pdf_path)
         intermediary_pdf_path = get_downloaded_file(intermediary_pdf_path)
         graph_pdf_path = get_downloaded_file(graph_pdf_path)
+        quality_pdf_path = quality_pdf_path and get_downloaded_file(quality_pdf_path)
     else:
         pdf_path = get_local_file(pdf_path)
         intermediary_pdf_path = get_local_file(intermediary_pdf_path)
         graph_pdf_path = get_local_file(graph_pdf_path)
+        quality_pdf_path = quality_pdf_path and get_local_file(quality_pdf_path)
 
-    merge_pdf(pdf_path, intermediary_pdf_path, graph_pdf_path)
+    await asyncio.to_thread(merge_pdf, pdf_path, intermediary_pdf_path, graph_pdf_path, quality_pdf_path)
 
-    os.remove(file_name)
     logging.info(f"Генерация отчета завершена: {pdf_path}")
     return pdf_path
 
@@ -332,25 +760,118 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 executor = ThreadPoolExecutor()
 
+REPORT_TEMPLATES = ('template_2.html', 'test.html', 'graph.html', 'quality.html')
+
+_template_env = None
+_title_page = None
+
+#RU
+# Функция get_template_env
+# На вход: ничего.
+# Возвращает: общее окружение Jinja2. Скомпилированные шаблоны кэшируются внутри него.
+
+#ENG
+# Function get_template_env
+# Input: none.
+# Returns: the shared Jinja2 environment. Compiled templates are cached inside it.
+def get_template_env() -> Environment:
+    global _template_env
+    if _template_env is None:
+        _template_env = Environment(loader=FileSystemLoader(os.path.join(BASE_DIR, './templates')))
+    return _template_env
+
+#RU
+# Функция get_title_page
+# На вход: ничего.
+# Возвращает: разобранный title-page.pdf. Файл читается один раз за время жизни процесса.
+
+#ENG
+# Function get_title_page
+# Input: none.
+# Returns: the parsed title-page.pdf. The file is read once per process lifetime.
+def get_title_page() -> PdfReader:
+    global _title_page
+    if _title_page is None:
+        _title_page = PdfReader(get_local_file('title-page.pdf'))
+    return _title_page
+
+#RU
+# Функция warm_up
+# На вход: ничего.
+# Возвращает: ничего.
+# Прогревает процесс перед приемом запросов: импортирует openpyxl, компилирует шаблоны,
+# читает титульную страницу, запускает пул браузеров и рендерит пробный PDF.
+
+#ENG
+# Function warm_up
+# Input: none.
+# Returns: none.
+# Warms the process up before it takes requests: imports openpyxl, compiles templates,
+# parses the title page, starts the browser pool and renders a dummy PDF.
+async def warm_up() -> None:
+    logging.info('Прогрев: начинаем')
+    import openpyxl  # noqa: F401 - первый pd.read_excel не платит за импорт
+
+    env = get_template_env()
+    for template_name in REPORT_TEMPLATES:
+        try:
+            env.get_template(template_name)
+        except TemplateNotFound:
+            logging.warning(f'Прогрев: шаблон {template_name} не найден')
+
+    try:
+        get_title_page()
+    except FileNotFoundError:
+        logging.warning('Прогрев: title-page.pdf не найден')
+
+    await get_browser_pool().start()
+
+    # Пробный рендер: прогревает страницу Chromium и шрифты
+    dummy = [{'column1': 'warm-up', 'debit': 1}]
+    html = env.get_template('graph.html').render(
+        column1='warm-up', column2=dummy, column3=['warm-up'], graph_data=create_pie_chart(dummy)
+    )
+    reports_path = os.path.join(BASE_DIR, '../reports')
+    os.makedirs(reports_path, exist_ok=True)
+    dummy_pdf_path = os.path.join(reports_path, f'warmup_{create_password()}.pdf')
+    await render_pdf(html, dummy_pdf_path)
+    os.remove(dummy_pdf_path)
+    logging.info('Прогрев: завершен')
+
 
 
 #RU
 # Функция templates_handler
-# На вход: тип шаблона, название компании, транзакции, список компаний и имя выходного файла.
+# На вход: тип шаблона, название компании, транзакции, список компаний, имя выходного файла
+# и дополнительные переменные шаблона (например, row_offset для частей таблицы).
 # Возвращает: путь к сгенерированному PDF-файлу.
 # Рендерит HTML на основе шаблона и преобразует его в PDF.
+# Для шаблонов, которым в секции [ENGINES] назначен движок native, PDF рисует reportlab без браузера.
+# При ошибке выбрасывает RenderError, а не возвращает None.
 
 #ENG
 # Function templates_handler
-# Input: template type, company name, column2, list of companies, and output file name.
+# Input: template type, company name, column2, list of companies, output file name,
+# and extra template variables (e.g. row_offset for table chunks).
 # Returns: path to the generated PDF file.
 # Renders HTML based on a template and converts it to PDF.
-async def templates_handler(template_type: str, column1: str, column2: list, column3: list, output_file_name: str):
+# Templates assigned the native engine in the [ENGINES] section are drawn by reportlab without a browser.
+# Raises RenderError on failure instead of returning None.
+async def templates_handler(template_type: str, column1: str, column2: list, column3: list, output_file_name: str,
+                            **extra):
     try:
+        # Создаем директорию reports с использованием BASE_DIR
+        reports_path = os.path.join(BASE_DIR, '../reports')
+        os.makedirs(reports_path, exist_ok=True)
+        pdf_output_path = os.path.join(reports_path, f"{output_file_name}.pdf")
+
+        if get_engine(template_type) == ENGINE_NATIVE:
+            logging.info(f'Рисуем {template_type} встроенным движком')
+            await asyncio.to_thread(NATIVE_RENDERERS[template_type], column1, column2, column3, pdf_output_path)
+            return pdf_output_path
+
         logging.info(f'Рендерим темплейт с полученными данными')
-        templates_path = os.path.join(BASE_DIR, './templates')
-        env = Environment(loader=FileSystemLoader(templates_path))
-        template = env.get_template(template_type)
+        template = get_template_env().get_template(template_type)
 
         # Создаем данные для графика в формате JSON
         graph_data = create_pie_chart(column2)
@@ -360,7 +881,8 @@ async def templates_handler(template_type: str, column1: str, column2: list, col
             column1=column1,
             column2=column2,
             column3=column3,
-            graph_data=graph_data
+            graph_data=graph_data,
+            **extra
         )
 
         html_output_path = get_local_file(f'{output_file_name}.html')
@@ -368,12 +890,6 @@ async def templates_handler(template_type: str, column1: str, column2: list, col
             with open(html_output_path, 'w', encoding='utf-8') as f:
                 f.write(rendered_content)
 
-        # Создаем директорию reports с использованием BASE_DIR
-        reports_path = os.path.join(BASE_DIR, '../reports')
-        os.makedirs(reports_path, exist_ok=True)
-
-        pdf_output_path = os.path.join(reports_path, f"{output_file_name}.pdf")
-
         # Асинхронный вызов render_pdf через await
         await render_pdf(rendered_content, pdf_output_path)
 
@@ -384,65 +900,156 @@ async def templates_handler(template_type: str, column1: str, column2: list, col
 
     except Exception as e:
         logging.error(f'Возникла ошибка при попытке зарендерить шаблон с полученными данными: {e}')
-        pass
-
-def get_chrome_path():
-    system = platform.system()
-    if system == "Windows":
-        return "C:/Program Files/Google/Chrome/Application/chrome.exe"
-    elif system == "Darwin":  # MacOS
-        return "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
-    elif system == "Linux":
-        return "/usr/bin/google-chrome"
-    else:
-        raise EnvironmentError("Не удалось найти совместимый браузер для вашей ОС")
+        if isinstance(e, RenderError):
+            raise
+        raise RenderError(f'Не удалось отрендерить {template_type}: {e}') from e
+
+#RU
+# Функция supports_chunks
+# На вход: имя шаблона.
+# Возвращает: True, если шаблон умеет рендериться частями (использует row_offset и chunk_index).
+
+#ENG
+# Function supports_chunks
+# Input: template name.
+# Returns: True if the template supports chunked rendering (uses row_offset and chunk_index).
+def supports_chunks(template_name: str) -> bool:
+    env = get_template_env()
+    try:
+        source, _, _ = env.loader.get_source(env, template_name)
+    except TemplateNotFound:
+        return False
+    return 'row_offset' in source and 'chunk_index' in source
+
+#RU
+# Функция render_table
+# На вход: название компании, транзакции, список компаний и имя выходного файла.
+# Возвращает: путь к PDF с таблицей транзакций (template_2.html).
+# Если строк больше chunk_rows (секция [RENDER]), таблица делится на части, которые рендерятся
+# параллельно на браузерах пула, а готовые PDF склеиваются по порядку. Каждая часть получает
+# row_offset (номер строки перед частью), chunk_index и chunk_count, чтобы нумерация строк
+# (row_offset + loop.index) была сквозной, а шапка отчета выводилась только в первой части.
+
+#ENG
+# Function render_table
+# Input: company name, column2, list of companies, and output file name.
+# Returns: path to the transaction table PDF (template_2.html).
+# If there are more than chunk_rows rows (the [RENDER] section), the table is split into chunks that
+# are rendered concurrently on the pool browsers, and the partial PDFs are stitched in order. Each chunk
+# gets row_offset (the row number before the chunk), chunk_index and chunk_count, so row numbering
+# (row_offset + loop.index) is continuous and the report heading is printed only in the first chunk.
+async def render_table(column1: str, column2: list, column3: list, output_file_name: str) -> str:
+    chunk_rows = get_setting('RENDER', 'chunk_rows', 0, int)
+    # Встроенный движок не строит DOM, делить таблицу для него незачем; шаблон без row_offset
+    # при делении нумеровал бы строки каждой части с единицы и повторял бы заголовок
+    if (not chunk_rows or len(column2) <= chunk_rows or get_engine('template_2.html') == ENGINE_NATIVE
+            or not supports_chunks('template_2.html')):
+        return await templates_handler('template_2.html', column1, column2, column3, output_file_name,
+                                       row_offset=0, chunk_index=0, chunk_count=1)
+
+    offsets = range(0, len(column2), chunk_rows)
+    logging.info(f'Таблица из {len(column2)} строк рендерится частями: {len(offsets)}')
+    tasks = [
+        asyncio.create_task(templates_handler(
+            'template_2.html', column1, column2[offset:offset + chunk_rows], column3,
+            f'{output_file_name}_part{index}', row_offset=offset, chunk_index=index, chunk_count=len(offsets)
+        ))
+        for index, offset in enumerate(offsets)
+    ]
+    try:
+        part_paths = await asyncio.gather(*tasks)
+    except BaseException:
+        # Одна часть не удалась - остальные уже не нужны
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, str) and os.path.exists(result):
+                os.remove(result)
+        raise
+
+    pdf_output_path = os.path.join(BASE_DIR, '../reports', f'{output_file_name}.pdf')
+    await asyncio.to_thread(stitch_pdf, part_paths, pdf_output_path)
+    return pdf_output_path
+
+#RU
+# Функция stitch_pdf
+# На вход: список путей к частям PDF и путь к итоговому файлу.
+# Возвращает: ничего.
+# Склеивает части по порядку и удаляет их.
+
+#ENG
+# Function stitch_pdf
+# Input: list of partial PDF paths and the output file path.
+# Returns: none.
+# Stitches the parts in order and removes them.
+def stitch_pdf(part_paths: list, output_pdf_path: str) -> None:
+    merger = PdfMerger()
+    try:
+        for part_path in part_paths:
+            merger.append(part_path)
+        merger.write(output_pdf_path)
+    finally:
+        merger.close()
+        for part_path in part_paths:
+            os.remove(part_path)
 
 #RU
 # Функция render_pdf
 # На вход: HTML-контент и путь для сохранения PDF.
 # Возвращает: ничего.
 # Использует Playwright для преобразования HTML в PDF.
+# У каждого этапа свой дедлайн; после таймаута рендер повторяется один раз на новом браузере.
 
 #ENG
 # Function render_pdf
 # Input: HTML content and output PDF path.
 # Returns: none.
 # Uses Playwright to convert HTML to PDF.
+# Each stage has its own deadline; after a timeout the render is retried once on a fresh browser.
 async def render_pdf(html_content: str, output_pdf_path: str):
-    async with async_playwright() as p:
-        # Запуск браузера в headless-режиме
-        browser = await p.chromium.launch(
-            headless=True,
-            executable_path=get_chrome_path(),  # Убедитесь, что get_chrome_path() возвращает корректный путь
-            args=["--no-sandbox", "--disable-gpu"]
-        )
-        page = await browser.new_page()
-        
-        # Устанавливаем HTML-контент
-        await page.set_content(html_content)
-        
-        # Небольшая пауза, если требуется для загрузки динамического контента
-        await asyncio.sleep(4)
-        
-        # Сохранение страницы как PDF
-        await page.pdf(path=output_pdf_path, format="A4", print_background=True, landscape=True)
-        
-        await browser.close()
+    set_content_timeout = get_setting('RENDER', 'set_content_timeout', 60, float)
+    pdf_timeout = get_setting('RENDER', 'pdf_timeout', 120, float)
+    settle_delay = get_setting('RENDER', 'settle_delay', 4, float)
+
+    # Зависший браузер пул заменяет новым, поэтому после таймаута пробуем еще раз
+    for attempt in (1, 2):
+        try:
+            async with get_browser_pool().page() as page:
+                # Устанавливаем HTML-контент
+                await asyncio.wait_for(page.set_content(html_content), set_content_timeout)
+                
+                # Небольшая пауза, если требуется для загрузки динамического контента
+                await asyncio.sleep(settle_delay)
+                
+                # Сохранение страницы как PDF
+                await asyncio.wait_for(
+                    page.pdf(path=output_pdf_path, format="A4", print_background=True, landscape=True),
+                    pdf_timeout
+                )
+            return
+        except asyncio.TimeoutError:
+            logging.error(f'Превышено время рендера {output_pdf_path} (попытка {attempt})')
+            if attempt == 2:
+                raise RenderError(f'Превышено время рендера PDF: {os.path.basename(output_pdf_path)}')
 
 #RU
 # Функция prepare_table
-# На вход: имя файла (строка) и флаг API.
+# На вход: имя файла (строка), флаг API и раскладка выписки (None - определить по первой строке листа).
 # Возвращает: имя обработанного файла.
-# Удаляет ненужные строки и столбцы, очищает данные и сохраняет их в новый файл.
+# Удаляет ненужные строки и столбцы по раскладке (см. scripts/layouts.py), очищает данные и сохраняет их в новый файл.
 
 #ENG
 # Function prepare_table
-# Input: file name (string) and API flag.
+# Input: file name (string), API flag and the statement layout (None - detect it from the first sheet row).
 # Returns: name of the processed file.
-# Removes unnecessary rows and columns, cleans the data, and saves it to a new file.
-def prepare_table(file_name : str, api=False) -> str:
+# Removes unnecessary rows and columns according to the layout (see scripts/layouts.py), cleans the data, and saves it to a new file.
+def prepare_table(file_name : str, api=False, layout=None) -> str:
     file_name_only = os.path.basename(file_name)
-    if api:
+    if os.path.isabs(file_name):
+        # Задачи из очереди хранят абсолютный путь к файлу
+        file_path = file_name
+    elif api:
         file_path = get_downloaded_file_api(file_name_only)
     else:
         file_path = get_downloaded_file(file_name_only)
@@ -458,21 +1065,22 @@ def prepare_table(file_name : str, api=False) -> str:
     
     warnings.simplefilter("ignore", UserWarning)
     # Чтение таблицы
-    df = pd.read_excel(file_path, header=None)
+    layout = layout or file_layout(file_path)
+    df = read_sheet(file_path, header=None)
 
-    df = df.drop(df.index[13])
+    # 1. Удаление служебных строк под шапкой
+    df = df.drop(index=[row for row in layout.skip_rows if row in df.index])
 
-    # 1. Удаление первых 7 столбцов
-    df = df.iloc[:, 11:]
+    # 2. Удаление столбцов слева от таблицы
+    df = df.iloc[:, layout.column_offset:]
 
-    # 2. Удаление первых 9 строчек
-    df = df.iloc[10:, :]
+    # 3. Удаление строк над шапкой таблицы
+    df = df.loc[layout.header_row:]
 
-    df.columns = df.iloc[0] 
+    df.columns = df.iloc[0]
     df = df.drop(df.index[0])
-    df = df.drop(df.index[1])
 
-    df = df.drop(df.columns[8:10], axis=1)
+    df = df.drop(df.columns[layout.drop_columns], axis=1)
 
     df = df.dropna(how='all')
     # Сохранение в новый файл
@@ -483,31 +1091,34 @@ def prepare_table(file_name : str, api=False) -> str:
 
 #RU
 # Функция merge_pdf
-# На вход: пути к файлам таблицы, компаний и графиков.
+# На вход: пути к файлам таблицы, компаний, графиков и страницы качества данных (необязательно).
 # Возвращает: ничего.
 # Объединяет несколько PDF-файлов в один отчет и удаляет временные файлы.
 
 #ENG
 # Function merge_pdf
-# Input: paths to table, company, and graph files.
+# Input: paths to table, company, graph, and (optionally) data-quality page files.
 # Returns: none.
 # Merges multiple PDF files into one report and deletes temporary files.
-def merge_pdf(file_table, file_companies, file_graphs):
+def merge_pdf(file_table, file_companies, file_graphs, file_quality=None):
     merger = PdfMerger()
 
-    title_list = get_local_file('title-page.pdf')
-
-    # Проверяем, существует ли title-page.pdf
-    merger.append(title_list)
-    merger.append(file_table)
-    merger.append(file_companies)
-    merger.append(file_graphs)
-
-    merger.write(file_table)
-    merger.close()
-
-    os.remove(file_companies)
-    os.remove(file_graphs)
+    try:
+        # Титульная страница разобрана заранее и переиспользуется
+        merger.append(get_title_page())
+        merger.append(file_table)
+        merger.append(file_companies)
+        merger.append(file_graphs)
+        if file_quality:
+            merger.append(file_quality)
+
+        merger.write(file_table)
+    finally:
+        merger.close()
+        os.remove(file_companies)
+        os.remove(file_graphs)
+        if file_quality:
+            os.remove(file_quality)
     
 #RU
 # Функция create_password
@@ -0,0 +1,162 @@
+#RU
+# Этот скрипт реализует проверку качества данных выписки: ИНН, КПП и пустые наименования.
+# ИНН из 10 и 12 цифр проверяются по контрольным цифрам, 9-символьные значения - по формату КПП.
+# Проверка векторная: строки переводятся в матрицу цифр (numpy), контрольные суммы считаются
+# умножением на вектор весов сразу для всех значений. Каждое уникальное значение проверяется один раз,
+# результат умножается на число его строк. Итог - структурированная сводка, которая попадает
+# в метаданные задачи, предпросмотр и (по желанию) на отдельную страницу отчета.
+
+#ENG
+# This script implements statement data-quality checks: INNs, KPPs and empty names.
+# 10- and 12-digit INNs are checked by their control digits, 9-character values by the KPP format.
+# The check is vectorized: strings are turned into a digit matrix (numpy), and control sums are computed
+# by multiplying with a weight vector for all values at once. Each unique value is checked once,
+# and the result is weighted by its row count. The outcome is a structured summary that goes into
+# the job metadata, the preview and (optionally) a separate report page.
+import numpy as np
+import pandas as pd
+
+#RU
+# Константы весов контрольных цифр ИНН и формата КПП
+#ENG
+# INN control digit weights and KPP format constants
+INN10_WEIGHTS = np.array([2, 4, 10, 3, 5, 9, 4, 6, 8])
+INN11_WEIGHTS = np.array([7, 2, 4, 10, 3, 5, 9, 4, 6, 8])
+INN12_WEIGHTS = np.array([3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8])
+KPP_PATTERN = r'[0-9]{4}[0-9A-Z]{2}[0-9]{3}'
+
+#RU
+# Константы результатов проверки значения COLUMN2
+#ENG
+# COLUMN2 value check result constants
+STATUS_INN10 = 'inn10'
+STATUS_INN12 = 'inn12'
+STATUS_KPP = 'kpp'
+STATUS_BAD_CHECKSUM = 'bad_checksum'
+STATUS_BAD_FORMAT = 'bad_format'
+STATUS_EMPTY = 'empty'
+QUALITY_STATUSES = (STATUS_INN10, STATUS_INN12, STATUS_KPP, STATUS_BAD_CHECKSUM, STATUS_BAD_FORMAT, STATUS_EMPTY)
+QUALITY_LABELS = {
+    STATUS_INN10: 'ИНН юридического лица (10 цифр)',
+    STATUS_INN12: 'ИНН физического лица или ИП (12 цифр)',
+    STATUS_KPP: 'КПП (9 символов)',
+    STATUS_BAD_CHECKSUM: 'ИНН с неверной контрольной цифрой',
+    STATUS_BAD_FORMAT: 'Неверный формат',
+    STATUS_EMPTY: 'Не заполнено',
+}
+
+#RU Матрица цифр (n x width) из строк одинаковой длины, состоящих только из цифр
+#ENG A digit matrix (n x width) from equal-length strings made of digits only
+def _digit_matrix(values: np.ndarray, width: int) -> np.ndarray:
+    raw = np.frombuffer(''.join(values).encode('ascii'), dtype=np.uint8)
+    return raw.reshape(-1, width).astype(np.int64) - ord('0')
+
+#RU Контрольная цифра по первым len(weights) цифрам каждой строки матрицы
+#ENG The control digit over the first len(weights) digits of each matrix row
+def _control_digit(digits: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    return digits[:, :len(weights)] @ weights % 11 % 10
+
+#RU
+# Функция classify_inns
+# На вход: значения COLUMN2 (строки; числа вида '7701234567.0' приводятся к целым).
+# Возвращает: массив статусов из QUALITY_STATUSES той же длины.
+# Пропуски (None, NaN, NaT) и их строковые формы ('nan', 'None') считаются пустыми значениями.
+
+#ENG
+# Function classify_inns
+# Input: COLUMN2 values (strings; numbers like '7701234567.0' are converted to integers).
+# Returns: an array of statuses from QUALITY_STATUSES of the same length.
+# Missing values (None, NaN, NaT) and their string forms ('nan', 'None') count as empty.
+def classify_inns(values) -> np.ndarray:
+    values = pd.Series(np.asarray(values, dtype=object))
+    # Пропуски заменяются явно: astype(str) в pandas 3 оставляет их NaN, а не 'nan'
+    values = values.where(values.notna(), '').astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    status = np.full(len(values), STATUS_BAD_FORMAT, dtype=object)
+    status[values.isin(['', 'nan', 'None', 'NaT']).to_numpy()] = STATUS_EMPTY
+    status[values.str.fullmatch(KPP_PATTERN).to_numpy(dtype=bool)] = STATUS_KPP
+
+    for width, valid_status in ((10, STATUS_INN10), (12, STATUS_INN12)):
+        mask = values.str.fullmatch(rf'[0-9]{{{width}}}').to_numpy(dtype=bool)
+        if not mask.any():
+            continue
+        digits = _digit_matrix(values[mask].to_numpy(), width)
+        if width == 10:
+            valid = _control_digit(digits, INN10_WEIGHTS) == digits[:, 9]
+        else:
+            valid = ((_control_digit(digits, INN11_WEIGHTS) == digits[:, 10])
+                     & (_control_digit(digits, INN12_WEIGHTS) == digits[:, 11]))
+        status[mask] = np.where(valid, valid_status, STATUS_BAD_CHECKSUM)
+    return status
+
+#RU
+# Функция quality_summary
+# На вход: число строк, число строк с пустым наименованием, уникальные значения COLUMN2
+# в порядке появления и число строк с каждым из них.
+# Возвращает: сводку качества данных: {'rows', 'empty_names', 'inn': {статус: строк},
+# 'examples': {статус: до 5 примеров}} для некорректных значений.
+
+#ENG
+# Function quality_summary
+# Input: the row count, the number of rows with an empty name, unique COLUMN2 values
+# in order of appearance and the row count of each.
+# Returns: the data-quality summary: {'rows', 'empty_names', 'inn': {status: rows},
+# 'examples': {status: up to 5 examples}} for invalid values.
+def quality_summary(rows: int, empty_names: int, inns, counts) -> dict:
+    inns = np.asarray(inns, dtype=object)
+    counts = np.asarray(counts, dtype=np.int64)
+    status = classify_inns(inns)
+    return {
+        'rows': int(rows),
+        'empty_names': int(empty_names),
+        'inn': {name: int(counts[status == name].sum()) for name in QUALITY_STATUSES},
+        'examples': {name: [str(value) for value in inns[status == name][:5]]
+                     for name in (STATUS_BAD_FORMAT, STATUS_BAD_CHECKSUM)},
+    }
+
+#RU
+# Функция frame_quality
+# На вход: колонка COLUMN2 и колонка названий контрагентов.
+# Возвращает: сводку качества данных (см. quality_summary) по всей колонке сразу.
+
+#ENG
+# Function frame_quality
+# Input: the COLUMN2 column and the counterparty name column.
+# Returns: the data-quality summary (see quality_summary) over the whole column at once.
+def frame_quality(inn: pd.Series, names: pd.Series) -> dict:
+    codes, uniques = pd.factorize(inn, use_na_sentinel=False)
+    return quality_summary(len(inn), names.isna().sum(), np.asarray(uniques, dtype=object),
+                           np.bincount(codes, minlength=len(uniques)))
+
+#RU
+# Функция quality_warnings
+# На вход: сводка качества данных.
+# Возвращает: список замечаний в формате warnings (code, message, rows, examples).
+
+#ENG
+# Function quality_warnings
+# Input: the data-quality summary.
+# Returns: a list of remarks in the warnings format (code, message, rows, examples).
+def quality_warnings(summary: dict) -> list:
+    warnings_found = []
+    if summary['empty_names']:
+        warnings_found.append({
+            'code': 'empty_name',
+            'message': 'Строки с пустым наименованием контрагента',
+            'rows': summary['empty_names'],
+        })
+    bad_format = summary['inn'][STATUS_BAD_FORMAT] + summary['inn'][STATUS_EMPTY]
+    if bad_format:
+        warnings_found.append({
+            'code': 'bad_inn',
+            'message': 'Строки с ИНН/КПП неверного формата',
+            'rows': bad_format,
+            'examples': summary['examples'][STATUS_BAD_FORMAT],
+        })
+    if summary['inn'][STATUS_BAD_CHECKSUM]:
+        warnings_found.append({
+            'code': 'bad_inn_checksum',
+            'message': 'Строки с ИНН с неверной контрольной цифрой',
+            'rows': summary['inn'][STATUS_BAD_CHECKSUM],
+            'examples': summary['examples'][STATUS_BAD_CHECKSUM],
+        })
+    return warnings_found
@@ -0,0 +1,246 @@
+#RU
+# Этот скрипт реализует потоковый разбор больших выписок с постоянным расходом памяти.
+# Обычный путь (prepare_table + load_statement) загружает весь лист, режет его через iloc,
+# пишет промежуточный .xlsx и читает его снова - пиковая память в разы больше файла.
+# Здесь строки листа читаются по одной в режиме read-only: служебный блок сверху и лишние
+# столбцы пропускаются на лету, а каждая строка сразу добавляется в накопитель группировки
+# по (контрагент, ИНН). Память растет с числом контрагентов, а не с числом операций
+# (назначения платежей по-прежнему хранятся целиком - они попадают в отчет).
+
+#ENG
+# This script implements constant-memory streaming parsing of large statements.
+# The regular path (prepare_table + load_statement) loads the whole sheet, slices it with iloc,
+# writes an intermediate .xlsx and reads it back - peak memory is several times the file size.
+# Here sheet rows are read one by one in read-only mode: the service block at the top and the extra
+# columns are skipped on the fly, and each row is folded right away into a groupby accumulator
+# keyed by (counterparty, INN). Memory grows with the number of counterparties, not operations
+# (payment descriptions are still kept in full - they go into the report).
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from .commands import get_setting
+from .compact import from_kopecks
+from .cube import cells_cube
+from .quality import quality_summary, quality_warnings
+from .excel_reader import iter_sheet_rows
+from .layouts import file_layout
+from .periods import parse_period
+
+#RU
+# Функция use_streaming
+# На вход: путь к файлу.
+# Возвращает: True, если файл не меньше stream_min_mb мегабайт (секция [EXCEL], 0 - потоковый разбор выключен).
+
+#ENG
+# Function use_streaming
+# Input: file path.
+# Returns: True if the file is at least stream_min_mb megabytes (the [EXCEL] section, 0 disables streaming).
+def use_streaming(file_path: str) -> bool:
+    threshold = get_setting('EXCEL', 'stream_min_mb', 0, float)
+    return threshold > 0 and os.path.getsize(file_path) >= threshold * 1024 * 1024
+
+#RU Имена столбцов после записи и повторного чтения через pandas: пустые - 'Unnamed: N', повторы - 'X.1', 'X.2'
+#ENG Column names as after a pandas write/read roundtrip: empty ones are 'Unnamed: N', repeats are 'X.1', 'X.2'
+def _column_names(values) -> list:
+    names = []
+    counts = {}
+    for index, value in enumerate(values):
+        name = str(value) if value not in (None, '') else f'Unnamed: {index}'
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[name] = count + 1
+            name = f'{name}.{count}'
+            count = counts.get(name, 0)
+        counts[name] = count + 1
+        names.append(name)
+    return names
+
+#RU Дата операции как после pd.to_datetime(errors='coerce'), None - если не разобрана
+#ENG The operation date as after pd.to_datetime(errors='coerce'), None if it cannot be parsed
+def _to_date(value):
+    if isinstance(value, datetime):
+        return pd.Timestamp(value)
+    if value in (None, ''):
+        return None
+    date = pd.to_datetime(value, errors='coerce')
+    return None if pd.isna(date) else date
+
+#RU ИНН в виде строки, как после astype(str) в aggregate_frame
+#ENG The INN as a string, as after astype(str) in aggregate_frame
+def _to_inn(value) -> str:
+    if value in (None, ''):
+        return 'nan'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+#RU Назначение платежа в виде строки (пустая ячейка - пустая строка)
+#ENG The payment description as a string (an empty cell is an empty string)
+def _to_text(value) -> str:
+    return '' if value is None else str(value)
+
+#RU
+# Класс StatementAccumulator
+# На вход: замены для приведения названий (как в load_statement) и период (см. scripts/periods.py).
+# Накопитель группировки: метод add принимает одну строку выписки, метод result возвращает
+# данные отчета в том же виде, что и aggregate_frame. Для каждой пары (контрагент, ИНН)
+# хранятся первая дата, сумма дебета в целых копейках и назначения платежей, а также ячейки куба
+# (контрагент, день), см. scripts/cube.py. Замены применяются один раз на каждое уникальное название.
+# Первая и последняя дата операций периода хранятся в first_date и last_date.
+
+#ENG
+# Class StatementAccumulator
+# Input: name normalization replacements (as in load_statement) and the period (see scripts/periods.py).
+# A groupby accumulator: add takes one statement row, result returns the report data
+# in the same shape as aggregate_frame. For each (counterparty, INN) pair it keeps the first date,
+# the debit sum in integer kopecks and the payment descriptions, plus the (counterparty, day) cube cells
+# (see scripts/cube.py). Replacements are applied once per unique name.
+# The first and last operation dates of the period are kept in first_date and last_date.
+class StatementAccumulator:
+    def __init__(self, replacements, period: str = ''):
+        self._replacements = replacements
+        self._ranges, self._months = parse_period(period) if period else ([], set())
+        self._period = bool(period)
+        self._names = {}
+        self.groups = {}
+        self.owner = None
+        self.rows = 0
+        self.first_date = None
+        self.last_date = None
+        self.empty_names = 0
+        self.inns = {}
+        self.cells = {}
+
+    def _normalize(self, name):
+        if name in (None, ''):
+            return None
+        if name not in self._names:
+            self._names[name] = pd.Series([name], dtype=object).replace(self._replacements, regex=True).iloc[0]
+        return self._names[name]
+
+    def _in_period(self, date) -> bool:
+        if not self._period:
+            return True
+        if date is None:
+            return False
+        return (any((start is None or date >= start) and (end is None or date < end) for start, end in self._ranges)
+                or date.month in self._months)
+
+    def add(self, row: dict) -> None:
+        date = _to_date(row.get('COLUMN5'))
+        if not self._in_period(date):
+            return
+        self.rows += 1
+        if date is not None:
+            self.first_date = date if self.first_date is None else min(self.first_date, date)
+            self.last_date = date if self.last_date is None else max(self.last_date, date)
+        name = self._normalize(row.get('COLUMN1.1.1'))
+        inn = _to_inn(row.get('COLUMN2'))
+        if name is None:
+            self.empty_names += 1
+        self.inns[inn] = self.inns.get(inn, 0) + 1
+
+        debit = row.get('COLUMN3')
+        if isinstance(debit, bool) or not isinstance(debit, (int, float)) or not debit > 0:
+            return
+        if self.owner is None:
+            owner = self._normalize(row.get('COLUMN1'))
+            self.owner = owner if owner is not None else float('nan')
+        if name is None:
+            # groupby отбрасывает строки с пустым ключом
+            return
+        kopecks = round(debit * 100)
+        cell = self.cells.setdefault((name, date.date() if date is not None else None), [0, 0])
+        cell[0] += kopecks
+        cell[1] += 1
+        group = self.groups.get((name, inn))
+        if group is None:
+            self.groups[(name, inn)] = [date, kopecks, [_to_text(row.get('COLUMN4'))]]
+        else:
+            if group[0] is None:
+                group[0] = date
+            group[1] += kopecks
+            group[2].append(_to_text(row.get('COLUMN4')))
+
+    def result(self):
+        # ИНН проверяются один раз на каждое уникальное значение (см. scripts/quality.py)
+        quality = quality_summary(self.rows, self.empty_names, list(self.inns), list(self.inns.values()))
+        warnings_found = quality_warnings(quality)
+        for warning in warnings_found:
+            logging.warning(f"{warning['message']}: {warning['rows']}")
+        if self.owner is None:
+            return None
+
+        column2 = []
+        for (name, inn), (date, kopecks, descriptions) in sorted(self.groups.items(), key=lambda item: item[0]):
+            column2.append({
+                'date': date.strftime('%Y-%m-%d') if date is not None else None,
+                'column1': name,
+                'company_inn': inn,
+                'debit': from_kopecks(kopecks),
+                'payment_description': '<br><br>'.join(descriptions)
+            })
+        column3 = list(dict.fromkeys(item['column1'] for item in column2))
+        return {'column1': self.owner, 'column2': column2, 'column3': column3, 'warnings': warnings_found,
+                'quality': quality, 'cube': cells_cube(self.cells)}
+
+#RU
+# Функция iter_statement_rows
+# На вход: путь к .xlsx файлу выписки и ее раскладка (None - определить по первой строке листа).
+# Возвращает: генератор строк таблицы операций в виде словарей {столбец отчета: значение}.
+# Служебные строки, столбцы до начала таблицы и лишние столбцы пропускаются по раскладке
+# (см. scripts/layouts.py) так же, как в prepare_table, полностью пустые строки отбрасываются.
+
+#ENG
+# Function iter_statement_rows
+# Input: path to the statement .xlsx file and its layout (None - detect it from the first sheet row).
+# Returns: a generator of operation table rows as {report column: value} dictionaries.
+# Service rows, columns before the table and extra columns are skipped according to the layout
+# (see scripts/layouts.py) the same way as in prepare_table, fully empty rows are dropped.
+def iter_statement_rows(file_path: str, layout=None):
+    layout = layout or file_layout(file_path)
+    skip_rows = set(layout.skip_rows)
+    drop_columns = set(layout.drop_columns)
+    renames = layout.renames()
+    columns = None
+    for index, row in enumerate(iter_sheet_rows(file_path)):
+        if index < layout.header_row or index in skip_rows:
+            continue
+        values = [value for position, value in enumerate(row[layout.column_offset:]) if position not in drop_columns]
+        if columns is None:
+            columns = [renames.get(name, name) for name in _column_names(values)]
+            continue
+        if all(value in (None, '') for value in values):
+            continue
+        yield dict(zip(columns, values))
+
+#RU
+# Функция stream_statement
+# На вход: путь к файлу выписки, замены для приведения названий и период.
+# Возвращает: StatementAccumulator со всеми строками выписки за период.
+
+#ENG
+# Function stream_statement
+# Input: statement file path, name normalization replacements and the period.
+# Returns: a StatementAccumulator holding all statement rows of the period.
+def stream_statement(file_path: str, replacements, period: str = '') -> StatementAccumulator:
+    accumulator = StatementAccumulator(replacements, period)
+    for row in iter_statement_rows(file_path):
+        accumulator.add(row)
+    logging.info(f'Потоковый разбор {file_path}: строк {accumulator.rows}, контрагентов {len(accumulator.groups)}')
+    return accumulator
+
+#RU
+# Функция stream_aggregate
+# На вход: путь к файлу выписки, замены для приведения названий и период.
+# Возвращает: данные отчета (см. aggregate_frame) или None, если нет строк с ненулевым дебетом.
+
+#ENG
+# Function stream_aggregate
+# Input: statement file path, name normalization replacements and the period.
+# Returns: the report data (see aggregate_frame) or None if there are no rows with a non-zero debit.
+def stream_aggregate(file_path: str, replacements, period: str = ''):
+    return stream_statement(file_path, replacements, period).result()
@@ -0,0 +1,68 @@
+#RU
+# Этот скрипт создает синтетические выписки для замеров производительности.
+# Файл повторяет раскладку настоящей выписки, которую ожидает prepare_table: заголовок
+# "Операции на счетах" в первой строке (ширина листа 36 столбцов), шапка таблицы в 11-й строке
+# со сдвигом на 11 столбцов, служебные 13-я и 14-я строки и два лишних столбца в конце таблицы.
+
+#ENG
+# This script creates synthetic statements for performance measurements.
+# The file follows the layout of a real statement expected by prepare_table: the
+# "Операции на счетах" title in the first row (a 36-column wide sheet), the table header in row 11
+# offset by 11 columns, service rows 13 and 14, and two extra columns at the end of the table.
+import datetime
+import random
+
+#RU
+# Константы раскладки синтетической выписки
+#ENG
+# Synthetic statement layout constants
+SHEET_WIDTH = 36
+TABLE_OFFSET = 11
+HEADER_ROW = ['COLUMN5', 'COLUMN1', 'COLUMN1.1', 'COLUMN1.1', 'COLUMN2', 'COLUMN3', 'COLUMN4', 'COLUMN6',
+              'COLUMN7', 'COLUMN8']
+
+#RU
+# Функция make_statement
+# На вход: путь к создаваемому .xlsx файлу, число операций, число контрагентов и зерно генератора.
+# Возвращает: путь к файлу.
+# Пишет лист в режиме write-only, поэтому подходит и для выписок в сотни тысяч строк.
+
+#ENG
+# Function make_statement
+# Input: path of the .xlsx file to create, number of operations, number of counterparties and generator seed.
+# Returns: the file path.
+# Writes the sheet in write-only mode, so it also suits statements of hundreds of thousands of rows.
+def make_statement(file_path: str, rows: int, counterparties: int = 500, seed: int = 0) -> str:
+    import openpyxl
+
+    rng = random.Random(seed)
+    owner = 'ООО "Синтетика"'
+    partners = [
+        (f'ООО "Контрагент {n}"', ''.join(rng.choice('0123456789') for _ in range(rng.choice((10, 12)))))
+        for n in range(counterparties)
+    ]
+    start = datetime.datetime(2024, 1, 1)
+    padding = [None] * TABLE_OFFSET
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    # Пустые строки вместо None: write-only режим не пишет пустые ячейки, а раскладка определяется по ширине первой строки
+    sheet.append(['Операции на счетах'] + [''] * (SHEET_WIDTH - 1))
+    sheet.append(['Владелец счета', owner] + [None] * (SHEET_WIDTH - 3) + ['-'])
+    for _ in range(8):
+        sheet.append([])
+    sheet.append(padding + HEADER_ROW)
+
+    def operation(index: int) -> list:
+        name, inn = rng.choice(partners)
+        debit = round(rng.uniform(100, 100000), 2) if rng.random() < 0.7 else 0
+        date = start + datetime.timedelta(days=rng.randrange(366), minutes=index % 1440)
+        return padding + [date, owner, name, name, inn, debit, f'Оплата по счету {index}', '', None, None]
+
+    sheet.append(operation(0))
+    sheet.append(padding + list(range(1, len(HEADER_ROW) + 1)))
+    sheet.append(padding + ['Итого за период'])
+    for index in range(1, rows):
+        sheet.append(operation(index))
+    workbook.save(file_path)
+    return file_path
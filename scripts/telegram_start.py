@@ -12,6 +12,7 @@ import logging
 import os
 import asyncio
 import re
+import uuid
 import sys
 
 from configparser import ConfigParser
@@ -20,11 +21,21 @@ import pandas as pd
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 
-from scripts.commands import get_file
-from scripts.process import generate_report
-
-queue = asyncio.Queue()
-queue_positions = {}
+from scripts.commands import get_file, get_setting
+from scripts.process import warm_up, resolve_period, sanitize_filename
+from scripts.jobs import (init_jobs_db, get_job, queue_position, queued_jobs, set_notified_position,
+                          undelivered_jobs, mark_delivered, active_jobs, STATUS_DONE, STATUS_CANCELLED,
+                          LANE_INTERACTIVE, LANE_BATCH)
+from scripts.exports import OUTPUT_FORMATS, FORMAT_PDF
+from scripts.admission import sniff_statement, estimate_cost, check_admission, admit_jobs
+from scripts.worker import work_once, make_worker_id, embedded_workers_enabled, request_cancel
+
+#RU Названия полос очереди для сообщений пользователю
+#ENG Queue lane names for user messages
+LANE_TITLES = {
+    LANE_INTERACTIVE: 'быстрая',
+    LANE_BATCH: 'общая',
+}
 
 #RU
 # Функция is_user_allowed
@@ -125,17 +136,18 @@ async def download_xlsx_file(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         # Проверяем MIME-тип для .xlsx файлов
         if mime_type == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet':
-            # Отправляем сообщение о добавлении в очередь
-            position = queue.qsize() + 1  # Рассчитываем позицию нового файла в очереди
-            await update.message.reply_text(
-                f"Ваш файл добавлен в очередь под номером *{position}*. Пожалуйста, ожидайте.",
-                parse_mode="Markdown"
-            )
+            # Проверяем нагрузку по размеру файла еще до загрузки
+            file_size = update.message.document.file_size or 0
+            decision = await asyncio.to_thread(check_admission, user_id, estimate_cost(file_size))
+            if not decision.admitted:
+                await reply_rejected(update, decision)
+                return
 
             # Асинхронно загружаем файл
             file_id = update.message.document.file_id
             file = await context.bot.get_file(file_id)
-            prepared_file_name = f'{user_id}_{original_file_name}'
+            # Уникальный префикс: задачи ждут в очереди, и одноименный файл не должен перезаписать чужой вход
+            prepared_file_name = f'{user_id}_{uuid.uuid4().hex[:8]}_{sanitize_filename(original_file_name)}'
             os.makedirs('downloads', exist_ok=True)
             file_path = f'./downloads/{prepared_file_name}'
 
@@ -143,43 +155,78 @@ async def download_xlsx_file(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
             
 
-            columns_to_check =['Unnamed: 0', 'Unnamed: 1', 'Unnamed: 2', 'Unnamed: 3', 'Unnamed: 4', 'Unnamed: 5', 'Unnamed: 6', 'Unnamed: 7', 
-                               'Unnamed: 8', 'Unnamed: 9', 'Unnamed: 10', 'Unnamed: 11', 'Unnamed: 12', 'Unnamed: 13', 'Unnamed: 14', 'Unnamed: 15', 
-                               'Unnamed: 16', 'Unnamed: 17', 'Unnamed: 18', 'Unnamed: 19', 'Unnamed: 20', 'Unnamed: 21', 'Unnamed: 22', 'Unnamed: 23', 
-                               'Unnamed: 24', 'Unnamed: 25', 'Unnamed: 26', 'Unnamed: 27', 'Unnamed: 28', 'Unnamed: 29', 
-                               'Unnamed: 30', 'Unnamed: 31', 'Unnamed: 32', 'Unnamed: 33', 'Unnamed: 34', 'Unnamed: 35']
-            
             try:
-                # Загружаем файл в DataFrame для проверки
-                df = pd.read_excel(file_path, engine='openpyxl')
+                # Читаем только заголовок листа для проверки
+                sniff = await asyncio.to_thread(sniff_statement, file_path)
                 
-                # Проверяем соответствие столбцов
-                if list(df.columns) != columns_to_check:
+                # Проверяем, что структура выписки известна (см. scripts/layouts.py)
+                if sniff['layout'] is None:
                     # Уведомляем пользователя о несоответствии и удаляем файл
                     await update.message.reply_text(
                         "Ваш файл не является типовым и не будет обработан. Пожалуйста, отправьте файл с корректной структурой."
                     )
                     os.remove(file_path)
                     logging.info(f"Пользователь {user_name} || ID {user_id} отправил не типовой файл {original_file_name} он был удален")
+                    return
                     
             except Exception as e:
-                # В случае ошибки загрузки файла в DataFrame
+                # В случае ошибки чтения файла
                 await update.message.reply_text(
                     "Произошла ошибка при проверке вашего файла. Пожалуйста, убедитесь, что файл в формате .xlsx и повторите попытку."
                 )
                 logging.error(f"Ошибка при чтении файла {file_path} от пользователя Пользователь {user_name} || ID {user_id}: {e}")
                 os.remove(file_path)
                 return
-            
-            # Добавляем файл в очередь после загрузки
-            queue_positions[file_path] = (position, user_id)
-            await queue.put((file_path, user_id))
+
+            # Уточняем стоимость по числу строк и добавляем файл в постоянную очередь:
+            # нагрузка проверяется еще раз в одной транзакции с постановкой в очередь
+            cost = estimate_cost(file_size, sniff['rows'])
+            params = {
+                'output_format': context.user_data.get('output_format', FORMAT_PDF),
+                'incremental': get_setting('INCREMENTAL', 'enabled', False, bool),
+                'period': context.user_data.get('period', ''),
+            }
+            decision, job_ids = await asyncio.to_thread(
+                admit_jobs, 'tg', user_id, [(file_path, original_file_name, params, cost)]
+            )
+            if not decision.admitted:
+                os.remove(file_path)
+                await reply_rejected(update, decision)
+                return
+            job_id = job_ids[0]
+            job = await asyncio.to_thread(get_job, job_id)
+            position = await asyncio.to_thread(queue_position, job_id)
+            await asyncio.to_thread(set_notified_position, job_id, position)
+            await update.message.reply_text(
+                f"Ваш файл добавлен в очередь под номером *{position}* (полоса: {LANE_TITLES[job['lane']]}). Пожалуйста, ожидайте.",
+                parse_mode="Markdown"
+            )
         else:
             logging.info(f'Пользователь {user_name} || ID {user_id} отправил не xlsx файл: {original_file_name} с MIME-типом {mime_type}')
             await update.message.reply_text('Пожалуйста, отправьте файл в формате .xlsx.')
     else:
         logging.info(f'Пользователь {user_name} || ID {user_id} отправил текстовое сообщение {update.message.text}')
 
+#RU
+# Функция reply_rejected
+# На вход: объект Update и решение контроля приема.
+# Возвращает: ничего.
+# Сообщает пользователю, что очередь переполнена и когда стоит попробовать снова.
+
+#ENG
+# Function reply_rejected
+# Input: Update object and the admission decision.
+# Returns: none.
+# Tells the user the queue is full and when to try again.
+async def reply_rejected(update: Update, decision) -> None:
+    if not decision.retry_after:
+        await update.message.reply_text("Ваш файл слишком большой и не может быть обработан.")
+        return
+    minutes = max(1, round(decision.retry_after / 60))
+    await update.message.reply_text(
+        f"Очередь переполнена, попробуйте позже (примерно через {minutes} мин.)."
+    )
+
 #RU
 # Функция process_file_download
 # На вход: объект Update и контекст ContextTypes.
@@ -203,7 +250,7 @@ async def process_file_download(update: Update, context: ContextTypes.DEFAULT_TY
                 file_id = update.message.document.file_id
                 file = await context.bot.get_file(file_id)
                 
-                prepared_file_name = f'{user_id}_{original_file_name}'
+                prepared_file_name = f'{user_id}_{uuid.uuid4().hex[:8]}_{sanitize_filename(original_file_name)}'
                 
                 os.makedirs('downloads', exist_ok=True)
                 file_path = f'./downloads/{prepared_file_name}'
@@ -220,32 +267,6 @@ async def process_file_download(update: Update, context: ContextTypes.DEFAULT_TY
         logging.error(f'Ошибка при загрузке файла: {e}')
         return '', ''
 
-#RU
-# Функция handle_file
-# На вход: путь к файлу (строка).
-# Возвращает: путь к сгенерированному PDF или None в случае ошибки.
-# Асинхронно обрабатывает файл и создает PDF-отчет.
-
-#ENG
-# Function handle_file
-# Input: file path (string).
-# Returns: path to the generated PDF or None in case of an error.
-# Asynchronously processes the file and generates a PDF report.
-async def handle_file(file_path: str) -> str:
-    try:
-        # Асинхронный вызов generate_report
-        pdf_path = await generate_report(file_to_prepare=file_path, template='template_2')
-
-        if pdf_path:
-            logging.info(f"Отчёт успешно сгенерирован: {pdf_path}")
-            return pdf_path
-        else:
-            logging.error(f"Ошибка при генерации отчёта для файла {file_path}")
-            return None
-    except Exception as e:
-        logging.error(f"Ошибка при обработке файла {file_path}: {e}")
-        return None
-    
 #RU
 # Функция get_file_name
 # На вход: ключ (строка).
@@ -266,71 +287,91 @@ def get_file_name(key):
 # Функция process_queue
 # На вход: контекст ContextTypes.
 # Возвращает: ничего.
-# Последовательно обрабатывает файлы из очереди, уведомляет пользователей
-# об изменении их позиций и отправляет результаты обработки.
+# Уведомляет пользователей об изменении позиций их файлов в постоянной очереди,
+# обрабатывает задачи из очереди (если нет отдельных воркеров) и отправляет пользователям готовые результаты.
 
 #ENG
 # Function process_queue
 # Input: ContextTypes context.
 # Returns: none.
-# Sequentially processes files from the queue, notifies users
-# of position changes, and sends processing results.
+# Notifies users of position changes of their files in the persistent queue,
+# processes queued jobs (unless dedicated workers do it), and sends finished results to users.
 async def process_queue(context: ContextTypes.DEFAULT_TYPE) -> None:
+    worker_id = make_worker_id()
     while True:
         try:
-            if queue.empty():
-                return
+            await notify_positions(context)
+            await deliver_results(context)
 
-            file_path, user_id = await queue.get()
-
-            # Удаляем текущий файл из позиций и сохраняем изменения для оставшихся файлов
-            queue_positions.pop(file_path, None)
-            updated_positions = {}
-
-            # Обновляем позиции всех оставшихся файлов
-            for key, (pos, file_user_id) in queue_positions.items():
-                new_position = pos - 1
-                updated_positions[key] = (new_position, file_user_id)
-                # Отправляем уведомление только владельцу файла о его новой позиции
-                await context.bot.send_message(
-                    chat_id=file_user_id, 
-                    text=f"Ваш файл ***{get_file_name(key)}*** сместился в очереди и теперь под номером *{new_position}*.",
-                    parse_mode="Markdown"
-                )
+            # Обрабатываем задачи, пока очередь не опустеет (если нет отдельных воркеров)
+            if not embedded_workers_enabled() or not await work_once(worker_id):
+                return
+        except Exception as e:
+            logging.error(f"Ошибка в process_queue: {e}")
+            return
 
-            # Применяем обновления к словарю queue_positions после итерации
-            queue_positions.update(updated_positions)
-            file_name = file_path.replace('./downloads/', '')
+#RU
+# Функция notify_positions
+# На вход: контекст ContextTypes.
+# Возвращает: ничего.
+# Сообщает владельцу файла его новую позицию в очереди, если она изменилась.
 
-            logging.info(f'Был скачен файл {file_name}')
+#ENG
+# Function notify_positions
+# Input: ContextTypes context.
+# Returns: none.
+# Tells the file owner their new queue position if it has changed.
+async def notify_positions(context: ContextTypes.DEFAULT_TYPE) -> None:
+    for job in await asyncio.to_thread(queued_jobs, 'tg'):
+        new_position = await asyncio.to_thread(queue_position, job['id'])
+        if new_position == job['notified_position'] or new_position == 0:
+            continue
+        await context.bot.send_message(
+            chat_id=int(job['user_id']), 
+            text=f"Ваш файл ***{job['file_name']}*** сместился в очереди и теперь под номером *{new_position}* (полоса: {LANE_TITLES[job['lane']]}).",
+            parse_mode="Markdown"
+        )
+        await asyncio.to_thread(set_notified_position, job['id'], new_position)
 
-            # Асинхронная обработка файла
-            pdf_path = await handle_file(file_name)
-            
-            if pdf_path:
-                if os.path.getsize(pdf_path) > 0:
-                    # Отправляем файл пользователю, если его размер больше нуля
-                    await context.bot.send_message(
-                        chat_id=user_id, 
-                        text=f"Ваш файл ***{get_file_name(file_path)}*** обработался.",
-                        parse_mode="Markdown"
-                    )
-                    with open(pdf_path, 'rb') as document:
-                        await context.bot.send_document(chat_id=user_id, document=document)
-                    logging.info(f"Результат отправлен пользователю ID {user_id}")
-                else:
-                    # Если файл пустой, отправляем сообщение об ошибке
-                    await context.bot.send_message(
-                        chat_id=user_id, 
-                        text="При обработке вашего файла произошла ошибка. Пожалуйста, попробуйте еще раз."
-                    )
-                    logging.error(f"Файл {pdf_path} пустой и не был отправлен пользователю {user_id}")
-            
-            await asyncio.to_thread(os.remove, file_path)
+#RU
+# Функция deliver_results
+# На вход: контекст ContextTypes.
+# Возвращает: ничего.
+# Отправляет пользователям результаты завершенных задач (кем бы они ни были обработаны).
 
-            queue.task_done()
-        except Exception as e:
-            logging.error(f"Ошибка в process_queue: {e}")
+#ENG
+# Function deliver_results
+# Input: ContextTypes context.
+# Returns: none.
+# Sends users the results of finished jobs (whichever worker processed them).
+async def deliver_results(context: ContextTypes.DEFAULT_TYPE) -> None:
+    for job in await asyncio.to_thread(undelivered_jobs, 'tg'):
+        user_id = int(job['user_id'])
+        pdf_path = job['result_path']
+        if job['status'] == STATUS_DONE and pdf_path and os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
+            # Отправляем файл пользователю, если его размер больше нуля
+            await context.bot.send_message(
+                chat_id=user_id, 
+                text=f"Ваш файл ***{job['file_name']}*** обработался.",
+                parse_mode="Markdown"
+            )
+            with open(pdf_path, 'rb') as document:
+                await context.bot.send_document(chat_id=user_id, document=document)
+            logging.info(f"Результат отправлен пользователю ID {user_id}")
+        elif job['status'] == STATUS_CANCELLED:
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=f"Обработка файла ***{job['file_name']}*** отменена.",
+                parse_mode="Markdown"
+            )
+        else:
+            # Если файл пустой или задача завершилась ошибкой, отправляем сообщение об ошибке
+            await context.bot.send_message(
+                chat_id=user_id, 
+                text="При обработке вашего файла произошла ошибка. Пожалуйста, попробуйте еще раз."
+            )
+            logging.error(f"Задача {job['id']} не дала результата для пользователя {user_id}: {job['error']}")
+        await asyncio.to_thread(mark_delivered, job['id'])
 
 #RU
 # Функция start
@@ -357,6 +398,96 @@ async def description(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     logging.info(f'Отправлено описание бота отправлено пользователю {update.message.from_user.name} |ID: {update.message.from_user.id}')
     await update.message.reply_text('''Этот бот подготовит отчет по вашему xlsx файлу. Ваш файл должен быть типовым''')
 
+#RU
+# Функция cancel
+# На вход: объект Update и контекст ContextTypes.
+# Возвращает: ничего.
+# Отменяет все задачи пользователя, которые еще в очереди или в работе.
+
+#ENG
+# Function cancel
+# Input: Update object and ContextTypes context.
+# Returns: none.
+# Cancels all of the user's jobs that are still queued or running.
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not check_user(update.message.from_user.id):
+        return
+    jobs = await asyncio.to_thread(active_jobs, 'tg', update.message.from_user.id)
+    if not jobs:
+        await update.message.reply_text('У вас нет файлов в обработке.')
+        return
+    for job in jobs:
+        await asyncio.to_thread(request_cancel, job['id'])
+    logging.info(f'Пользователь {update.message.from_user.name} | ID: {update.message.from_user.id} отменил задач: {len(jobs)}')
+    await update.message.reply_text(f'Отменяем обработку файлов: {len(jobs)}.')
+
+#RU
+# Функция set_format
+# На вход: объект Update и контекст ContextTypes.
+# Возвращает: ничего.
+# Команда /format <формат> выбирает формат результата для следующих файлов пользователя
+# (pdf, csv, xlsx, json, html). Без аргумента показывает текущий формат.
+
+#ENG
+# Function set_format
+# Input: Update object and ContextTypes context.
+# Returns: none.
+# The /format <format> command selects the output format for the user's next files
+# (pdf, csv, xlsx, json, html). Without an argument it shows the current format.
+async def set_format(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not check_user(update.message.from_user.id):
+        return
+    formats = ', '.join(OUTPUT_FORMATS)
+    if not context.args:
+        current = context.user_data.get('output_format', FORMAT_PDF)
+        await update.message.reply_text(f'Текущий формат отчета: {current}. Доступные форматы: {formats}')
+        return
+    output_format = context.args[0].lower()
+    if output_format not in OUTPUT_FORMATS:
+        await update.message.reply_text(f'Неизвестный формат. Доступные форматы: {formats}')
+        return
+    context.user_data['output_format'] = output_format
+    logging.info(f'Пользователь {update.message.from_user.name} | ID: {update.message.from_user.id} выбрал формат {output_format}')
+    await update.message.reply_text(f'Следующие отчеты будут в формате {output_format}')
+
+#RU
+# Функция set_period
+# На вход: объект Update и контекст ContextTypes.
+# Возвращает: ничего.
+# Команда /period <период> выбирает период для следующих отчетов пользователя:
+# 2024-Q1, 2024-03, 2024, 2024-01-01..2024-03-31, несколько периодов через запятую
+# или коды 1-5 (текущий/прошлый месяц, текущий/прошлый квартал, текущий год).
+# /period all сбрасывает период, без аргумента команда показывает текущий.
+
+#ENG
+# Function set_period
+# Input: Update object and ContextTypes context.
+# Returns: none.
+# The /period <period> command selects the period for the user's next reports:
+# 2024-Q1, 2024-03, 2024, 2024-01-01..2024-03-31, several periods separated by commas,
+# or codes 1-5 (current/previous month, current/previous quarter, current year).
+# /period all resets the period, without an argument the command shows the current one.
+async def set_period(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not check_user(update.message.from_user.id):
+        return
+    if not context.args:
+        current = context.user_data.get('period') or 'вся выписка'
+        await update.message.reply_text(f'Текущий период отчета: {current}')
+        return
+    period = ' '.join(context.args)
+    if period.lower() == 'all':
+        context.user_data.pop('period', None)
+        await update.message.reply_text('Следующие отчеты будут по всей выписке')
+        return
+    try:
+        resolve_period(period)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    context.user_data['period'] = period
+    logging.info(f'Пользователь {update.message.from_user.name} | ID: {update.message.from_user.id} выбрал период {period}')
+    await update.message.reply_text(f'Следующие отчеты будут за период {period}')
+
 async def help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not check_user(update.message.from_user.id):
         return
@@ -432,9 +563,29 @@ def setup_logging(api_key):
 
 
 
+#RU
+# Функция warm_up_bot
+# На вход: объект Application.
+# Возвращает: ничего.
+# Прогревает процесс бота до начала опроса, чтобы первый отчет не платил за запуск Chromium.
+
+#ENG
+# Function warm_up_bot
+# Input: Application object.
+# Returns: none.
+# Warms the bot process up before polling starts, so the first report does not pay for launching Chromium.
+async def warm_up_bot(application: Application) -> None:
+    init_jobs_db()
+    if not get_setting('RENDER', 'warmup', True, bool):
+        return
+    try:
+        await warm_up()
+    except Exception as e:
+        logging.error(f"Ошибка при прогреве бота: {e}")
+
 def main(API_KEY: str, config: ConfigParser) -> None:
     # Создаем приложение Telegram
-    application = Application.builder().token(API_KEY).build()
+    application = Application.builder().token(API_KEY).post_init(warm_up_bot).build()
 
     # Создаем JobQueue и добавляем задачу для очереди
     job_queue = application.job_queue
@@ -443,6 +594,9 @@ def main(API_KEY: str, config: ConfigParser) -> None:
     # Добавляем обработчики команд
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('description', description))
+    application.add_handler(CommandHandler('cancel', cancel))
+    application.add_handler(CommandHandler('format', set_format))
+    application.add_handler(CommandHandler('period', set_period))
 
     # Обработчик для документов (.xlsx файлов)
     application.add_handler(MessageHandler(filters.Document.ALL, download_xlsx_file))
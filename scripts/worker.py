@@ -0,0 +1,281 @@
+#RU
+# Этот скрипт выполняет задачи из постоянной очереди (scripts/jobs.py).
+# Воркер забирает задачу под аренду, продлевает аренду во время работы,
+# генерирует отчет, кладет результат в папку processed и отмечает задачу выполненной.
+
+#ENG
+# This script executes jobs from the persistent queue (scripts/jobs.py).
+# A worker claims a job under a lease, renews the lease while working,
+# generates the report, puts the result into the processed folder and marks the job done.
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import time
+
+from pathlib import Path
+
+from .commands import get_file, get_setting, get_downloaded_file
+from .jobs import (claim_job, renew_lease, complete_job, fail_job, active_input_files,
+                   is_cancel_requested, mark_cancelled, job_input_files, cancel_job, get_job, STATUS_CANCELLED,
+                   DEFAULT_LEASE_SECONDS)
+from .process import generate_report
+from .exports import FORMAT_PDF
+
+#RU
+# Функция make_worker_id
+# На вход: номер воркера в процессе.
+# Возвращает: уникальный ID воркера вида host:pid:n.
+
+#ENG
+# Function make_worker_id
+# Input: worker number within the process.
+# Returns: a unique worker ID in the form host:pid:n.
+def make_worker_id(n=0) -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{n}'
+
+#RU
+# Функция embedded_workers_enabled
+# На вход: ничего.
+# Возвращает: True, если задачи обрабатываются внутри API и бота.
+# Если в секции [WORKER] задано processes > 0, задачи обрабатывают отдельные процессы worker.py.
+
+#ENG
+# Function embedded_workers_enabled
+# Input: none.
+# Returns: True if jobs are processed inside the API and the bot.
+# If processes > 0 is set in the [WORKER] section, jobs are processed by separate worker.py processes.
+def embedded_workers_enabled() -> bool:
+    return get_setting('WORKER', 'processes', 0, int) == 0
+
+#RU
+# Функция get_artifacts_dir
+# На вход: ничего.
+# Возвращает: путь к папке готовых отчетов (создает ее при необходимости).
+
+#ENG
+# Function get_artifacts_dir
+# Input: none.
+# Returns: path to the finished reports folder (creates it if needed).
+def get_artifacts_dir() -> Path:
+    artifacts_dir = Path(get_file(get_setting('JOBS', 'artifacts_dir', 'processed')))
+    artifacts_dir.mkdir(parents=True, exist_ok=True)
+    return artifacts_dir
+
+#RU
+# Функция run_job
+# На вход: словарь задачи.
+# Возвращает: пару (путь к готовому отчету в папке артефактов, метаданные задачи - замечания и сводка качества данных).
+# Выбрасывает исключение, если отчет не был создан.
+
+#ENG
+# Function run_job
+# Input: a job dictionary.
+# Returns: a pair (path to the finished report in the artifacts folder, job metadata - remarks and the data-quality summary).
+# Raises an exception if the report was not created.
+async def run_job(job: dict) -> tuple:
+    for file_path in job_input_files(job):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Файл не найден: {file_path}")
+
+    meta = {}
+    report_path = await generate_report(file_to_prepare=job['file_path'], api=job['source'] == 'api',
+                                        output_format=job['params'].get('output_format', FORMAT_PDF),
+                                        files=job['params'].get('files'),
+                                        incremental=job['params'].get('incremental', False),
+                                        period=job['params'].get('period', ''),
+                                        meta=meta)
+    if not report_path or not os.path.exists(report_path):
+        raise RuntimeError('Отчет не был сгенерирован')
+
+    result_path = get_artifacts_dir() / Path(report_path).name
+    shutil.move(report_path, result_path)
+    return str(result_path), meta
+
+#RU
+# Функция watch_job
+# На вход: ID задачи, ID воркера, длительность аренды, выполняющаяся задача asyncio и событие отмены.
+# Возвращает: ничего.
+# Продлевает аренду каждую треть срока и раз в cancel_poll секунд проверяет, не запросил ли
+# пользователь отмену. При отмене устанавливает событие и отменяет выполнение задачи.
+
+#ENG
+# Function watch_job
+# Input: job ID, worker ID, lease duration, the running asyncio task, and the cancel event.
+# Returns: none.
+# Renews the lease every third of its duration and checks every cancel_poll seconds whether
+# the user has requested cancellation. On cancellation it sets the event and cancels the running task.
+async def watch_job(job_id: str, worker_id: str, lease_seconds: float, job_task: asyncio.Task,
+                    cancel_event: asyncio.Event) -> None:
+    poll = min(get_setting('JOBS', 'cancel_poll', 2, float), lease_seconds / 3)
+    renewed_at = time.monotonic()
+    while not job_task.done():
+        await asyncio.sleep(poll)
+        if await asyncio.to_thread(is_cancel_requested, job_id):
+            logging.info(f'Задача {job_id} отменена пользователем, прерываем выполнение')
+            cancel_event.set()
+            job_task.cancel()
+            return
+        if time.monotonic() - renewed_at >= lease_seconds / 3:
+            renewed_at = time.monotonic()
+            if not await asyncio.to_thread(renew_lease, job_id, worker_id, lease_seconds):
+                logging.warning(f'Воркер {worker_id} потерял аренду задачи {job_id}')
+                return
+
+#RU
+# Функция work_once
+# На вход: ID воркера и полосы очереди, которые он обслуживает (по умолчанию все).
+# Возвращает: True, если задача была взята из очереди, иначе False.
+# Выполняет одну задачу: при ошибке задача возвращается в очередь, пока не исчерпаны попытки.
+# Задача, не уложившаяся в job_timeout (секция [JOBS]), завершается с ошибкой без повтора,
+# отмененная пользователем - помечается cancelled.
+# Входной файл удаляется, только когда задача завершена окончательно и воркер еще владел ей.
+
+#ENG
+# Function work_once
+# Input: worker ID and the queue lanes it serves (all by default).
+# Returns: True if a job was taken from the queue, otherwise False.
+# Executes one job: on error the job goes back to the queue until it runs out of attempts.
+# A job that exceeds job_timeout (the [JOBS] section) fails without a retry,
+# a job cancelled by the user is marked cancelled.
+# The input file is removed only when the job is finished for good and the worker still owned it.
+async def work_once(worker_id: str, lanes: list = None) -> bool:
+    lease_seconds = get_setting('JOBS', 'lease_seconds', DEFAULT_LEASE_SECONDS, int)
+    job_timeout = get_setting('JOBS', 'job_timeout', 0, float)
+    job = await asyncio.to_thread(claim_job, worker_id, lease_seconds, lanes)
+    if job is None:
+        return False
+
+    logging.info(f"Воркер {worker_id} взял задачу {job['id']} (попытка {job['attempts']})")
+    cancel_event = asyncio.Event()
+    job_task = asyncio.create_task(run_job(job))
+    watch_task = asyncio.create_task(watch_job(job['id'], worker_id, lease_seconds, job_task, cancel_event))
+    finished = True
+    try:
+        result_path, meta = await asyncio.wait_for(job_task, job_timeout or None)
+        await asyncio.to_thread(complete_job, job['id'], worker_id, result_path, meta)
+        logging.info(f"Задача {job['id']} выполнена: {result_path}")
+    except asyncio.CancelledError:
+        if not cancel_event.is_set():
+            raise
+        await asyncio.to_thread(mark_cancelled, job['id'], worker_id)
+    # fail_job возвращает False, только если задача завершена окончательно: при повторе (True) и при потерянной
+    # аренде (None) входные файлы нужны следующей попытке
+    except asyncio.TimeoutError:
+        error = f'Превышено время обработки ({job_timeout:g} с)'
+        finished = await asyncio.to_thread(fail_job, job['id'], worker_id, error) is False
+        logging.error(f"Задача {job['id']} завершилась с ошибкой: {error}")
+    except FileNotFoundError as e:
+        finished = await asyncio.to_thread(fail_job, job['id'], worker_id, str(e)) is False
+        logging.error(f"Задача {job['id']} завершилась с ошибкой: {e}")
+    except Exception as e:
+        finished = await asyncio.to_thread(fail_job, job['id'], worker_id, str(e), True) is False
+        logging.error(f"Задача {job['id']} завершилась с ошибкой: {e}")
+    finally:
+        watch_task.cancel()
+
+    if finished:
+        await asyncio.to_thread(remove_input_files, job)
+    return True
+
+#RU
+# Функция remove_input_files
+# На вход: словарь задачи.
+# Возвращает: ничего.
+# Удаляет все входные файлы задачи, которые еще существуют.
+
+#ENG
+# Function remove_input_files
+# Input: a job dictionary.
+# Returns: none.
+# Removes all of the job's input files that still exist.
+def remove_input_files(job: dict) -> None:
+    for file_path in job_input_files(job):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+#RU
+# Функция request_cancel
+# На вход: ID задачи.
+# Возвращает: статус задачи после запроса отмены или None, если задачи нет.
+# Если задача отменена еще в очереди, сразу удаляет ее входной файл
+# (выполняющуюся задачу прерывает и убирает за собой воркер).
+
+#ENG
+# Function request_cancel
+# Input: job ID.
+# Returns: the job status after the cancellation request, or None if there is no such job.
+# If the job was cancelled while still queued, its input file is removed right away
+# (a running job is aborted and cleaned up by its worker).
+def request_cancel(job_id: str):
+    status = cancel_job(job_id)
+    if status == STATUS_CANCELLED:
+        job = get_job(job_id)
+        if job:
+            remove_input_files(job)
+    return status
+
+#RU
+# Функция work_loop
+# На вход: ID воркера, интервал опроса очереди, событие остановки, лимит задач и полосы очереди.
+# Возвращает: ничего.
+# Обрабатывает задачи, пока не будет установлено событие остановки.
+# При max_jobs > 0 после стольких задач устанавливает событие остановки сам,
+# чтобы супервизор пересоздал процесс.
+
+#ENG
+# Function work_loop
+# Input: worker ID, queue polling interval, stop event, job limit, and queue lanes.
+# Returns: none.
+# Processes jobs until the stop event is set.
+# With max_jobs > 0 it sets the stop event itself after that many jobs,
+# so the supervisor recycles the process.
+async def work_loop(worker_id: str, poll_interval: float = 2, stop_event: asyncio.Event = None,
+                    max_jobs: int = 0, lanes: list = None) -> None:
+    logging.info(f'Воркер {worker_id} запущен')
+    processed = 0
+    while stop_event is None or not stop_event.is_set():
+        try:
+            if await work_once(worker_id, lanes):
+                processed += 1
+                if max_jobs and processed >= max_jobs:
+                    logging.info(f'Воркер {worker_id} обработал {processed} задач и будет перезапущен')
+                    if stop_event is not None:
+                        stop_event.set()
+                    return
+                continue
+        except Exception as e:
+            logging.error(f'Ошибка в воркере {worker_id}: {e}')
+        await asyncio.sleep(poll_interval)
+
+#RU
+# Функция cleanup_orphans
+# На вход: максимальный возраст файла в секундах.
+# Возвращает: количество удаленных файлов.
+# Удаляет из downloads старые файлы, которые не принадлежат ни одной активной задаче.
+# Рассчитана на одну машину: папка downloads локальная, а активные задачи видны по локальной jobs.db.
+
+#ENG
+# Function cleanup_orphans
+# Input: maximum file age in seconds.
+# Returns: the number of deleted files.
+# Deletes old files from downloads that do not belong to any active job.
+# Meant for a single host: the downloads folder is local, and active jobs are visible through the local jobs.db.
+def cleanup_orphans(max_age: float = 3600) -> int:
+    downloads_dir = get_downloaded_file('')
+    if not os.path.isdir(downloads_dir):
+        return 0
+    active = active_input_files()
+    now = time.time()
+    removed = 0
+    for root, _, files in os.walk(downloads_dir):
+        for name in files:
+            path = os.path.abspath(os.path.join(root, name))
+            if path in active or now - os.path.getmtime(path) < max_age:
+                continue
+            os.remove(path)
+            removed += 1
+    if removed:
+        logging.info(f'Удалено осиротевших файлов из downloads: {removed}')
+    return removed
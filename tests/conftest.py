@@ -0,0 +1,29 @@
+#RU
+# Общие настройки тестов: корень проекта добавляется в sys.path, чтобы импортировать пакет scripts,
+# а фикстура settings подменяет значения config.ini для одного теста.
+
+#ENG
+# Shared test setup: the project root is added to sys.path to import the scripts package,
+# and the settings fixture overrides config.ini values for a single test.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+#RU
+# Фикстура settings
+# Возвращает: функцию override(module, {(секция, ключ): значение}), которая подменяет get_setting
+# в модуле. Остальные параметры берутся из значений по умолчанию, config.ini не читается.
+
+#ENG
+# Fixture settings
+# Returns: an override(module, {(section, key): value}) function that replaces get_setting
+# in the module. Other parameters use their fallback values, config.ini is not read.
+@pytest.fixture
+def settings(monkeypatch):
+    def override(module, values: dict) -> None:
+        monkeypatch.setattr(module, 'get_setting',
+                            lambda section, key, fallback=None, cast=str: values.get((section, key), fallback))
+    return override
@@ -0,0 +1,88 @@
+import pytest
+
+from scripts import admission, jobs
+
+
+@pytest.fixture
+def queue(tmp_path, settings):
+    settings(jobs, {('JOBS', 'db'): str(tmp_path / 'jobs.db')})
+    settings(admission, {
+        ('ADMISSION', 'max_jobs'): 3,
+        ('ADMISSION', 'max_rows'): 1000,
+        ('ADMISSION', 'max_user_jobs'): 2,
+        ('ADMISSION', 'max_job_rows'): 800,
+        ('ADMISSION', 'retry_after'): 30,
+        ('ADMISSION', 'rows_per_second'): 10,
+    })
+    jobs.init_jobs_db()
+    return jobs
+
+
+def spec(name: str, cost: int = 10) -> tuple:
+    return (name, name, {}, cost)
+
+
+def count_jobs() -> int:
+    return jobs.inflight_stats('nobody')['jobs']
+
+
+def test_estimate_cost_prefers_row_count(settings):
+    settings(admission, {('ADMISSION', 'bytes_per_row'): 100})
+    assert admission.estimate_cost(5000, 42) == 42
+    assert admission.estimate_cost(5000) == 50
+
+
+def test_too_large_job_is_rejected_without_retry(queue):
+    decision = admission.check_admission('u1', 900)
+    assert not decision.admitted
+    assert decision.retry_after == 0
+
+
+def test_single_large_job_is_admitted_into_empty_queue(queue):
+    decision, job_ids = admission.admit_jobs('api', 'u1', [spec('big.xlsx', 800)])
+    assert decision.admitted
+    assert len(job_ids) == 1
+
+
+def test_user_limit_rejects_without_creating_jobs(queue):
+    admission.admit_jobs('api', 'u1', [spec('a.xlsx'), spec('b.xlsx')])
+    decision, job_ids = admission.admit_jobs('api', 'u1', [spec('c.xlsx')])
+    assert not decision.admitted
+    assert decision.retry_after == 30
+    assert job_ids == []
+    assert count_jobs() == 2
+    # Другой пользователь упирается только в общие лимиты
+    decision, job_ids = admission.admit_jobs('api', 'u2', [spec('d.xlsx')])
+    assert decision.admitted
+    assert count_jobs() == 3
+
+
+def test_global_limit_rejects(queue):
+    for user_id in ('u1', 'u2', 'u3'):
+        admission.admit_jobs('api', user_id, [spec('a.xlsx')])
+    decision, job_ids = admission.admit_jobs('api', 'u4', [spec('b.xlsx')])
+    assert not decision.admitted
+    assert job_ids == []
+    assert count_jobs() == 3
+
+
+def test_batch_is_admitted_or_rejected_as_a_whole(queue):
+    admission.admit_jobs('api', 'u1', [spec('a.xlsx', 600)])
+    # Вместе файлы пакета превышают лимит строк, поэтому не создается ни одна задача
+    decision, job_ids = admission.admit_jobs('api', 'u2', [spec('b.xlsx', 300), spec('c.xlsx', 300)])
+    assert not decision.admitted
+    assert job_ids == []
+    assert count_jobs() == 1
+
+    decision, job_ids = admission.admit_jobs('api', 'u2', [spec('b.xlsx', 200), spec('c.xlsx', 200)], group_id='g1')
+    assert decision.admitted
+    assert [job['id'] for job in jobs.group_jobs('g1')] == job_ids
+
+
+def test_finished_jobs_do_not_count_against_limits(queue):
+    _, job_ids = admission.admit_jobs('api', 'u1', [spec('a.xlsx'), spec('b.xlsx')])
+    for job_id in job_ids:
+        jobs.claim_job('w1')
+        jobs.complete_job(job_id, 'w1', 'report.pdf')
+    decision, _ = admission.admit_jobs('api', 'u1', [spec('c.xlsx')])
+    assert decision.admitted
@@ -0,0 +1,61 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+from scripts import batch, jobs
+
+
+def make_zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_unpack_uploads_replaces_archives_with_statements(settings):
+    settings(batch, {})
+    archive = make_zip({
+        'folder/a.xlsx': b'a',
+        '~$a.xlsx': b'lock',
+        'notes.txt': b'text',
+        'folder/': b'',
+    })
+    assert batch.unpack_uploads([('b.xlsx', b'b'), ('pack.ZIP', archive)]) == [('b.xlsx', b'b'), ('a.xlsx', b'a')]
+
+
+def test_unpack_uploads_limits_unpacked_size(settings):
+    settings(batch, {('BATCH', 'max_unpacked_mb'): 1})
+    archive = make_zip({'a.xlsx': b'0' * (1024 * 1024), 'b.xlsx': b'1'})
+    with pytest.raises(ValueError):
+        batch.unpack_uploads([('pack.zip', archive)])
+
+
+def test_stream_group_zip_collects_reports_and_errors(tmp_path, settings):
+    settings(jobs, {('JOBS', 'db'): str(tmp_path / 'jobs.db'), ('JOBS', 'max_attempts'): 1})
+    settings(batch, {})
+    jobs.init_jobs_db()
+    done_ids = [jobs.enqueue_job('api', 1, f'{name}.xlsx', f'{name}.xlsx', group_id='g1') for name in ('a', 'b')]
+    failed_id = jobs.enqueue_job('api', 1, 'c.xlsx', 'c.xlsx', group_id='g1')
+    jobs.enqueue_job('api', 1, 'other.xlsx', group_id='g2')
+    for job_id, folder in zip(done_ids, ('first', 'second')):
+        result = tmp_path / folder / 'report.pdf'
+        result.parent.mkdir()
+        result.write_bytes(folder.encode())
+        jobs.claim_job('w1')
+        jobs.complete_job(job_id, 'w1', str(result))
+    jobs.claim_job('w1')
+    jobs.fail_job(failed_id, 'w1', 'Битый файл')
+
+    async def collect() -> bytes:
+        return b''.join([chunk async for chunk in batch.stream_group_zip('g1', poll_interval=0)])
+
+    with zipfile.ZipFile(io.BytesIO(asyncio.run(collect()))) as archive:
+        names = archive.namelist()
+        # Одноименные отчеты не перезаписывают друг друга
+        assert names[0] == 'report.pdf'
+        assert names[1] == f'{done_ids[1][:8]}_report.pdf'
+        assert [archive.read(name) for name in names[:2]] == [b'first', b'second']
+        assert archive.read('errors.txt').decode() == 'c.xlsx: failed Битый файл'
@@ -0,0 +1,47 @@
+from scripts import cli_batch
+from scripts.frame_cache import file_digest
+
+
+def test_collect_inputs_skips_temporary_files(tmp_path):
+    for name in ('b.xlsx', 'a.xlsx', '~$a.xlsx', 'prepared_a.xlsx', 'notes.txt'):
+        (tmp_path / name).write_bytes(b'')
+    (tmp_path / 'nested').mkdir()
+    (tmp_path / 'nested' / 'c.xlsx').write_bytes(b'')
+    expected = [str(tmp_path / 'a.xlsx'), str(tmp_path / 'b.xlsx')]
+    assert cli_batch.collect_inputs([str(tmp_path)]) == expected
+    # Папка и шаблон с теми же файлами не дают повторов
+    assert cli_batch.collect_inputs([str(tmp_path), str(tmp_path / '*.xlsx')]) == expected
+    assert cli_batch.collect_inputs([str(tmp_path / '**' / 'c.xlsx')]) == [str(tmp_path / 'nested' / 'c.xlsx')]
+
+
+def test_manifest_round_trip(tmp_path):
+    assert cli_batch.load_manifest(str(tmp_path)) == {}
+    manifest = {'/data/a.xlsx': {'digest': 'abc', 'output': 'a.pdf'}}
+    cli_batch.save_manifest(str(tmp_path), manifest)
+    assert cli_batch.load_manifest(str(tmp_path)) == manifest
+    (tmp_path / cli_batch.MANIFEST_FILE).write_text('{broken', encoding='utf-8')
+    assert cli_batch.load_manifest(str(tmp_path)) == {}
+
+
+def test_is_done_checks_hashes_and_params(tmp_path):
+    output = tmp_path / 'a.pdf'
+    output.write_bytes(b'report')
+    params = {'period': '', 'output_format': 'pdf'}
+    record = {'digest': 'abc', 'params': params, 'output': 'a.pdf', 'output_digest': file_digest(str(output))}
+    assert cli_batch.is_done(record, 'abc', params, str(tmp_path))
+    assert not cli_batch.is_done(None, 'abc', params, str(tmp_path))
+    assert not cli_batch.is_done(record, 'changed', params, str(tmp_path))
+    assert not cli_batch.is_done(record, 'abc', dict(params, period='2024'), str(tmp_path))
+    # Отчет изменили или удалили после запуска
+    output.write_bytes(b'edited')
+    assert not cli_batch.is_done(record, 'abc', params, str(tmp_path))
+    output.unlink()
+    assert not cli_batch.is_done(record, 'abc', params, str(tmp_path))
+
+
+def test_output_names_do_not_collide():
+    taken = set()
+    assert cli_batch._output_name('/one/statement.xlsx', 'aaaaaaaa11', 'pdf', taken) == 'statement.pdf'
+    assert cli_batch._output_name('/two/statement.xlsx', 'bbbbbbbb22', 'pdf', taken) == 'statement_bbbbbbbb.pdf'
+    assert cli_batch._output_name('/two/statement.xlsx', 'bbbbbbbb22', 'csv', taken) == 'statement.csv'
+    assert taken == {'statement.pdf', 'statement_bbbbbbbb.pdf', 'statement.csv'}
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from scripts import client_state
+
+
+@pytest.fixture
+def state(tmp_path, settings):
+    settings(client_state, {('INCREMENTAL', 'db'): str(tmp_path / 'state.db')})
+    return client_state
+
+
+def statement(rows: list) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=['name', 'inn', 'kopecks', 'date', 'description'])
+    df['_hash'] = [hash(tuple(row)) for row in rows]
+    df['_occurrence'] = df.groupby('_hash').cumcount()
+    return df
+
+
+def aggregate(df: pd.DataFrame) -> dict:
+    return {'column2': [{
+        'column1': name,
+        'company_inn': inn,
+        'debit': group['kopecks'].sum() / 100,
+        'date': group['date'].min(),
+        'payment_description': '<br><br>'.join(group['description']),
+    } for (name, inn), group in df.groupby(['name', 'inn'])]}
+
+
+JANUARY = [
+    ('ООО "Альфа"', '7707083893', 10, '2024-01-10', 'Счет 1'),
+    ('ООО "Альфа"', '7707083893', 20, '2024-01-20', 'Счет 2'),
+    ('ООО "Бета"', '500100732259', 12345, '2024-01-15', 'Счет 3'),
+]
+FEBRUARY = [('ООО "Альфа"', '7707083893', 10, '2024-02-01', 'Счет 4')]
+
+
+def test_cumulative_statement_is_counted_once(state):
+    data, new_rows = state.fold_statement('client', statement(JANUARY), aggregate)
+    assert new_rows == 3
+    assert len(data['column2']) == 2
+    # Выписка за январь-февраль: январские операции уже учтены
+    data, new_rows = state.fold_statement('client', statement(JANUARY + FEBRUARY), aggregate)
+    assert new_rows == 1
+    assert data['column2'][0]['debit'] == 0.1
+    data, new_rows = state.fold_statement('client', statement(JANUARY + FEBRUARY), aggregate)
+    assert (data, new_rows) == (None, 0)
+
+    report = state.load_client_report('client')
+    assert [(item['column1'], item['debit'], item['date']) for item in report] == [
+        ('ООО "Альфа"', 0.4, '2024-01-10'),
+        ('ООО "Бета"', 123.45, '2024-01-15'),
+    ]
+    assert report[0]['payment_description'] == 'Счет 1<br><br>Счет 2<br><br>Счет 4'
+
+
+def test_identical_operations_within_statement_are_kept(state):
+    state.fold_statement('client', statement(FEBRUARY * 2), aggregate)
+    assert state.load_client_report('client')[0]['debit'] == 0.2
+    # Третья такая же операция в следующей выписке - новая
+    _, new_rows = state.fold_statement('client', statement(FEBRUARY * 3), aggregate)
+    assert new_rows == 1
+    assert state.load_client_report('client')[0]['debit'] == 0.3
+
+
+def test_kopecks_do_not_accumulate_rounding_errors(state):
+    for day in range(1, 11):
+        state.fold_statement('client', statement([('ООО "Альфа"', '7707083893', 10, f'2024-01-{day:02}', '')]),
+                             aggregate)
+    assert state.load_client_report('client')[0]['debit'] == 1.0
+
+
+def test_clients_are_separate_and_can_be_reset(state):
+    state.fold_statement('first', statement(JANUARY), aggregate)
+    _, new_rows = state.fold_statement('second', statement(JANUARY), aggregate)
+    assert new_rows == 3
+    state.reset_client('first')
+    assert state.load_client_report('first') == []
+    assert len(state.load_client_report('second')) == 2
+    _, new_rows = state.fold_statement('first', statement(JANUARY), aggregate)
+    assert new_rows == 3
+
+
+def test_old_debit_column_is_migrated_to_kopecks(state, tmp_path):
+    conn = sqlite3.connect(tmp_path / 'state.db')
+    conn.execute("CREATE TABLE aggregates (client TEXT NOT NULL, name TEXT NOT NULL, inn TEXT NOT NULL, "
+                 "debit REAL NOT NULL, first_date TEXT, descriptions TEXT NOT NULL DEFAULT '', "
+                 "PRIMARY KEY (client, name, inn))")
+    conn.execute("INSERT INTO aggregates VALUES ('client', 'ООО \"Альфа\"', '7707083893', 0.30000000000000004, "
+                 "'2024-01-10', 'Счет 1')")
+    conn.commit()
+    conn.close()
+    assert state.load_client_report('client')[0]['debit'] == 0.3
+    state.fold_statement('client', statement(FEBRUARY), aggregate)
+    assert state.load_client_report('client')[0]['debit'] == 0.4
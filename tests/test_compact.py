@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from scripts.compact import compact_frame, from_kopecks, is_compact, string_categories, to_kopecks
+
+
+def statement() -> pd.DataFrame:
+    return pd.DataFrame({
+        'COLUMN1': ['ООО "Владелец"'] * 4,
+        'COLUMN1.1': ['ООО "Бета"', 'ООО "Альфа"', 'ООО "Бета"', None],
+        'COLUMN2': [7707083893, '500100732259', 7707083893.0, None],
+        'COLUMN3': [0.1, '0.2', None, 'нет'],
+        'COLUMN4': ['a', 'b', 'c', 'd'],
+        'COLUMN5': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03', None]),
+        'EXTRA': [1, 2, 3, 4],
+    }, index=[10, 11, 12, 13])
+
+
+def test_to_kopecks_is_exact():
+    kopecks = to_kopecks(pd.Series([0.1, 0.2, 1234.56, '7.05', None, 'нет']))
+    assert kopecks.dtype == np.int64
+    assert kopecks.tolist() == [10, 20, 123456, 705, 0, 0]
+    assert from_kopecks(kopecks[:2].sum()) == 0.3
+
+
+def test_string_categories_match_astype_str():
+    values = pd.Series([7707083893, '7707083893', np.nan, 'b', 'a', 'b'])
+    categories = string_categories(values)
+    assert categories.tolist() == values.astype(str).tolist()
+    assert list(categories.cat.categories) == ['7707083893', 'a', 'b', 'nan']
+    assert string_categories(pd.Series([None])).tolist() == ['nan']
+
+
+def test_compact_frame_keeps_only_aggregation_columns():
+    df = statement()
+    compact = compact_frame(df)
+    assert list(compact.columns) == ['COLUMN1', 'COLUMN1.1', 'COLUMN2', 'COLUMN3', 'COLUMN4', 'COLUMN5']
+    assert list(compact.index) == [10, 11, 12, 13]
+    assert compact['COLUMN3'].tolist() == [10, 20, 0, 0]
+    assert compact['COLUMN2'].tolist() == ['7707083893', '500100732259', '7707083893', 'nan']
+    assert is_compact(compact) and not is_compact(df)
+    # Исходная таблица не меняется, компактная возвращается как есть
+    assert df['COLUMN3'].tolist()[:2] == [0.1, '0.2']
+    assert compact_frame(compact) is compact
@@ -0,0 +1,63 @@
+import pytest
+
+from scripts import counterparties
+
+
+@pytest.fixture
+def index(tmp_path, settings):
+    settings(counterparties, {('COUNTERPARTIES', 'db'): str(tmp_path / 'counterparties.db')})
+    return counterparties
+
+
+def report(client: str, rows: list) -> dict:
+    return {'column1': client, 'column2': [
+        {'column1': name, 'company_inn': inn, 'debit': debit, 'date': date} for name, inn, debit, date in rows
+    ]}
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('ООО "Ромашка"', 'ромашка'),
+    ('  ооо  «Ромашка-Плюс»,  ', 'ромашка плюс'),
+    ('ИП Ёлкин', 'елкин'),
+    ('ООО', 'ооо'),
+    (None, ''),
+])
+def test_normalize_name(name, expected):
+    assert counterparties.normalize_name(name) == expected
+
+
+def test_normalize_inn():
+    assert counterparties.normalize_inn(7707083893.0) == '7707083893'
+    assert counterparties.normalize_inn(' 0123456789 ') == '0123456789'
+
+
+def test_report_key():
+    assert counterparties.report_key(['a', 'b'], '2024') == counterparties.report_key(['b', 'a'], '2024')
+    assert counterparties.report_key(['a'], '2024') != counterparties.report_key(['a'], '2025')
+    # Инкрементальный отчет клиента всегда под одним ключом
+    assert (counterparties.report_key(['a'], '', True, 'client')
+            == counterparties.report_key(['b'], '2024', True, 'client'))
+
+
+def test_search_by_inn_and_name_prefix(index):
+    index.record_report('r1', report('Клиент 1', [
+        ('ООО "Ромашка"', 7707083893.0, 100.5, '2024-01-10'),
+        ('ООО "Лютик"', '500100732259', 50.0, '2024-01-05'),
+    ]))
+    index.record_report('r2', report('Клиент 2', [('ООО "Ромашка"', '7707083893', 300.0, '2024-02-01')]))
+
+    found = index.search_counterparties(inn='7707083893')
+    assert [(item['client'], item['debit']) for item in found] == [('Клиент 2', 300.0), ('Клиент 1', 100.5)]
+    assert [item['name'] for item in index.search_counterparties(q='ооо ром')] == ['ООО "Ромашка"'] * 2
+    assert index.search_counterparties(inn='7707083893', q='лют') == []
+    assert len(index.search_counterparties(q='ромашка', limit=1)) == 1
+    assert index.search_counterparties() == []
+
+
+def test_same_report_is_replaced_not_doubled(index):
+    rows = [('ООО "Ромашка"', '7707083893', 100.0, '2024-01-10')]
+    index.record_report('r1', report('Клиент', rows))
+    assert index.record_report('r1', report('Клиент', rows)) == 1
+    index.record_report('r2', report('Клиент', rows))
+    [found] = index.search_counterparties(inn='7707083893')
+    assert (found['debit'], found['reports'], found['first_date']) == (200.0, 2, '2024-01-10')
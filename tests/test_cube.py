@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from scripts import cube
+
+
+def frame(rows: list) -> pd.DataFrame:
+    # Как и в process.py, даты приходят уже разобранными
+    df = pd.DataFrame(rows, columns=['COLUMN1.1', 'COLUMN5', 'COLUMN3'])
+    df['COLUMN5'] = pd.to_datetime(df['COLUMN5'])
+    return df
+
+
+ROWS = [
+    ('Бета', pd.Timestamp('2024-01-10'), 500),
+    ('Альфа', pd.Timestamp('2024-01-10 12:30'), 100),
+    ('Альфа', pd.Timestamp('2024-01-10'), 200),
+    ('Альфа', pd.Timestamp('2024-02-03'), 50),
+    ('Бета', None, 1000),
+]
+
+
+def test_frame_cube_matches_cells_cube():
+    cells = {
+        ('Альфа', '2024-01-10'): [300, 2],
+        ('Альфа', '2024-02-03'): [50, 1],
+        ('Бета', '2024-01-10'): [500, 1],
+        ('Бета', None): [1000, 1],
+    }
+    expected = cube.cells_cube(cells)
+    assert expected == {
+        'names': ['Альфа', 'Бета'], 'days': ['2024-01-10', '2024-02-03'],
+        'name': [0, 0, 1, 1], 'day': [0, 1, 0, -1], 'kopecks': [300, 50, 500, 1000], 'count': [2, 1, 1, 1],
+    }
+    result = cube.frame_cube(frame(ROWS))
+    # Порядок ячеек может различаться, сравниваем как множества
+    assert result['names'] == expected['names'] and result['days'] == expected['days']
+    assert set(zip(result['name'], result['day'], result['kopecks'], result['count'])) == \
+        set(zip(expected['name'], expected['day'], expected['kopecks'], expected['count']))
+
+
+def test_empty_cube():
+    assert cube.cells_cube({})['names'] == []
+    assert cube.cube_charts(cube.cells_cube({})) == {}
+    assert cube.cube_charts(None) == {}
+
+
+def test_totals_count_undated_rows_only_per_counterparty():
+    data = cube.frame_cube(frame(ROWS))
+    assert cube.counterparty_totals(data) == [('Бета', 1500, 2), ('Альфа', 350, 3)]
+
+    days, daily = cube.time_totals(data, 'day')
+    assert days == ['2024-01-10', '2024-02-03']
+    assert daily.tolist() == [800, 50]
+
+    months, monthly = cube.time_totals(data, 'month')
+    assert months == ['2024-01', '2024-02']
+    assert monthly.tolist() == [800, 50]
+
+
+def test_monthly_trends():
+    months, trends = cube.monthly_trends(cube.frame_cube(frame(ROWS)), ['Бета', 'Альфа'])
+    assert months == ['2024-01', '2024-02']
+    assert trends['Альфа'].tolist() == [300, 50]
+    assert trends['Бета'].tolist() == [500, 0]
+    assert all(values.dtype == np.int64 for values in trends.values())
+
+
+def test_cube_charts(settings):
+    settings(cube, {('CHARTS', 'top'): 1})
+    charts = cube.cube_charts(cube.frame_cube(frame(ROWS)))
+    assert set(charts) == {'pie', 'top', 'monthly', 'trends', 'daily'}
+    # Без дат остаются только графики по контрагентам
+    undated = cube.frame_cube(frame([('Альфа', None, 100)]))
+    assert set(cube.cube_charts(undated)) == {'pie', 'top'}
@@ -0,0 +1,68 @@
+import pandas as pd
+
+from scripts.diff import DIFF_CHANGED, DIFF_LOST, DIFF_NEW, DIFF_UNCHANGED, diff_frames, render_diff
+
+
+def statement(rows: list) -> pd.DataFrame:
+    return pd.DataFrame({
+        'COLUMN1': 'ООО "Владелец"',
+        'COLUMN1.1': [name for name, _, _, _ in rows],
+        'COLUMN2': [inn for _, inn, _, _ in rows],
+        'COLUMN3': [debit for _, _, debit, _ in rows],
+        'COLUMN4': '',
+        'COLUMN5': pd.to_datetime([date for _, _, _, date in rows]),
+    })
+
+
+ALPHA = ('ООО "Альфа"', '7707083893')
+BETA = ('ООО "Бета"', '500100732259')
+GAMMA = ('ООО "Гамма"', '7736207543')
+DELTA = ('ООО "Дельта"', '0123456789')
+
+
+def test_diff_two_statements():
+    base = statement([(*ALPHA, 100.1, '2024-01-10'), (*ALPHA, 0.2, '2024-01-11'), (*BETA, 50, '2024-01-12'),
+                      (*GAMMA, 10, '2024-01-13'), (*DELTA, 0, '2024-01-14')])
+    current = statement([(*ALPHA, 100.3, '2024-02-10'), (*BETA, 80, '2024-02-12'), (*DELTA, 5, '2024-02-14')])
+    diff = diff_frames(base, current)
+
+    assert diff['company'] == 'ООО "Владелец"'
+    assert diff['base'] == {'period': None, 'total': 160.3, 'payers': 3}
+    assert diff['current'] == {'period': None, 'total': 185.3, 'payers': 3}
+    assert diff['delta'] == 25.0
+    assert diff['summary'] == {DIFF_NEW: 1, DIFF_LOST: 1, DIFF_CHANGED: 1, DIFF_UNCHANGED: 1}
+    # Плательщики идут по убыванию модуля изменения, нулевой дебет не считается платежом
+    assert [(item['inn'], item['status'], item['delta']) for item in diff['payers']] == [
+        ('500100732259', DIFF_CHANGED, 30.0),
+        ('7736207543', DIFF_LOST, -10.0),
+        ('0123456789', DIFF_NEW, 5.0),
+        ('7707083893', DIFF_UNCHANGED, 0.0),
+    ]
+    alpha = diff['payers'][-1]
+    assert (alpha['base_payments'], alpha['current_payments']) == (2, 1)
+
+
+def test_diff_two_periods_of_one_statement():
+    df = statement([(*ALPHA, 100, '2024-01-10'), (*ALPHA, 150, '2024-02-10'), (*BETA, 20, '2024-02-11')])
+    diff = diff_frames(df, df, '2024-01', '2024-02')
+    assert diff['base']['period'] == '2024-01'
+    assert [(item['name'], item['status'], item['delta']) for item in diff['payers']] == [
+        ('ООО "Альфа"', DIFF_CHANGED, 50.0),
+        ('ООО "Бета"', DIFF_NEW, 20.0),
+    ]
+
+
+def test_diff_with_empty_side():
+    df = statement([(*ALPHA, 100, '2024-01-10')])
+    diff = diff_frames(df, df, '2024-01', '2024-03')
+    assert diff['current'] == {'period': '2024-03', 'total': 0.0, 'payers': 0}
+    assert diff['summary'][DIFF_LOST] == 1
+    assert diff['company'] == 'ООО "Владелец"'
+
+
+def test_render_diff():
+    df = statement([(*ALPHA, 100, '2024-01-10'), (*BETA, 20, '2024-02-11')])
+    html = render_diff(diff_frames(df, df, '2024-01', '2024-02'))
+    # Названия экранируются шаблоном
+    assert 'ООО &#34;Бета&#34;' in html
+    assert 'Новый плательщик' in html
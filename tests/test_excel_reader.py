@@ -0,0 +1,59 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from scripts import excel_reader
+from scripts.excel_reader import READER_CALAMINE, READER_OPENPYXL, READER_STREAM, read_first_row, read_sheet
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    import openpyxl
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Дата', 'Название', None, 'Сумма', 'ИНН'])
+    sheet.append([datetime.datetime(2024, 1, 10), 'ООО "Альфа"', None, 100.5, 7707083893])
+    sheet.append([datetime.datetime(2024, 1, 11), None, 'x', 200.0, '0123456789'])
+    sheet.append([None, None, None, None, None])
+    sheet.append([datetime.datetime(2024, 1, 12), 'ООО "Бета"', None, 0, None])
+    file_path = tmp_path / 'statement.xlsx'
+    workbook.save(file_path)
+    return str(file_path)
+
+
+def readers() -> list:
+    return [READER_STREAM] + ([READER_CALAMINE] if excel_reader.calamine_available() else [])
+
+
+@pytest.mark.parametrize('reader', readers())
+@pytest.mark.parametrize('header', [0, None])
+def test_engines_match_pandas_openpyxl(workbook_path, reader, header):
+    expected = read_sheet(workbook_path, header, READER_OPENPYXL)
+    pd.testing.assert_frame_equal(read_sheet(workbook_path, header, reader), expected)
+
+
+def test_read_first_row(workbook_path):
+    first_row, rows = read_first_row(workbook_path, READER_OPENPYXL)
+    assert first_row == ('Дата', 'Название', None, 'Сумма', 'ИНН')
+    assert rows == 5
+
+
+def test_choose_reader_by_size(workbook_path, settings):
+    settings(excel_reader, {('EXCEL', 'fast_min_mb'): 1})
+    assert excel_reader.choose_reader(workbook_path) == READER_OPENPYXL
+    settings(excel_reader, {('EXCEL', 'fast_min_mb'): 0})
+    assert excel_reader.choose_reader(workbook_path) in (READER_CALAMINE, READER_STREAM)
+    assert excel_reader.choose_reader(workbook_path, ' OpenPyXL_Stream ') == READER_STREAM
+
+
+def test_choose_reader_falls_back_without_calamine(workbook_path, settings, monkeypatch):
+    settings(excel_reader, {('EXCEL', 'reader'): READER_CALAMINE})
+    monkeypatch.setattr(excel_reader, 'calamine_available', lambda: False)
+    assert excel_reader.choose_reader(workbook_path) == READER_STREAM
+
+
+def test_choose_reader_rejects_unknown_engine(workbook_path):
+    with pytest.raises(ValueError):
+        excel_reader.choose_reader(workbook_path, 'xlrd')
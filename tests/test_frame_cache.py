@@ -0,0 +1,94 @@
+import os
+
+import pandas as pd
+import pytest
+
+from scripts import frame_cache
+from scripts.compact import compact_frame
+
+
+@pytest.fixture
+def configure(tmp_path, settings):
+    def override(**values) -> None:
+        settings(frame_cache, {('CACHE', 'dir'): str(tmp_path / 'cache'), ('CACHE', 'ttl_seconds'): 0,
+                               **{('CACHE', key): value for key, value in values.items()}})
+    override()
+    return override
+
+
+def entries(tmp_path) -> list:
+    return sorted(os.listdir(tmp_path / 'cache'))
+
+
+def statement() -> pd.DataFrame:
+    return compact_frame(pd.DataFrame({
+        'COLUMN1': ['ООО "Владелец"', 'ООО "Владелец"'],
+        'COLUMN1.1': ['ООО "Альфа"', 'ООО "Бета"'],
+        'COLUMN2': ['0123456789', None],
+        'COLUMN3': [100.5, 0.1],
+        'COLUMN4': ['Счет 1', 'Счет 2'],
+        'COLUMN5': pd.to_datetime(['2024-01-01', '2024-01-02']),
+    }))
+
+
+def test_cache_key_depends_on_every_version():
+    key = frame_cache.cache_key('digest', 'layout-1', 'replacements-1')
+    assert key == frame_cache.cache_key('digest', 'layout-1', 'replacements-1')
+    assert key != frame_cache.cache_key('digest', 'layout-2', 'replacements-1')
+    assert key != frame_cache.cache_key('digest', 'layout-1', 'replacements-2')
+    assert key != frame_cache.cache_key('other', 'layout-1', 'replacements-1')
+    assert frame_cache.cache_key('a', 'bc') != frame_cache.cache_key('ab', 'c')
+
+
+def test_file_digest_depends_on_content(tmp_path):
+    first, second = tmp_path / 'first.xlsx', tmp_path / 'second.xlsx'
+    first.write_bytes(b'statement')
+    second.write_bytes(b'statement')
+    assert frame_cache.file_digest(str(first)) == frame_cache.file_digest(str(second))
+    second.write_bytes(b'changed')
+    assert frame_cache.file_digest(str(first)) != frame_cache.file_digest(str(second))
+
+
+def test_compact_table_round_trips_through_arrow(configure, tmp_path):
+    df = statement()
+    frame_cache.store_cached_frame('key', df)
+    assert entries(tmp_path) == ['key' + frame_cache.ARROW_EXTENSION]
+    pd.testing.assert_frame_equal(frame_cache.load_cached_frame('key'), df)
+    assert frame_cache.load_cached_frame('missing') is None
+
+
+def test_mixed_type_table_falls_back_to_pickle(configure, tmp_path):
+    df = pd.DataFrame({'COLUMN4': ['text', 1, 2.5]})
+    frame_cache.store_cached_frame('key', df)
+    assert entries(tmp_path) == ['key' + frame_cache.PICKLE_EXTENSION]
+    pd.testing.assert_frame_equal(frame_cache.load_cached_frame('key'), df)
+
+
+def test_disabled_cache_is_not_used(configure, tmp_path):
+    frame_cache.store_cached_frame('key', statement())
+    configure(enabled=False)
+    assert frame_cache.load_cached_frame('key') is None
+    frame_cache.store_cached_frame('other', statement())
+    assert entries(tmp_path) == ['key' + frame_cache.ARROW_EXTENSION]
+
+
+def test_cleanup_evicts_least_recently_used(configure, tmp_path):
+    for index, key in enumerate(('old', 'used', 'new')):
+        frame_cache.store_cached_frame(key, statement())
+        path = tmp_path / 'cache' / f'{key}{frame_cache.ARROW_EXTENSION}'
+        os.utime(path, (1000 + index, 1000 + index))
+    size = os.path.getsize(path)
+    # Обращение обновляет время записи, и она становится самой свежей
+    frame_cache.load_cached_frame('old')
+    configure(max_mb=2.5 * size / 1024 / 1024)
+    assert frame_cache.cleanup_cache() == 1
+    assert entries(tmp_path) == ['new.arrow', 'old.arrow']
+
+
+def test_cleanup_removes_expired_entries(configure, tmp_path):
+    frame_cache.store_cached_frame('stale', statement())
+    os.utime(tmp_path / 'cache' / 'stale.arrow', (1000, 1000))
+    frame_cache.store_cached_frame('fresh', statement())
+    configure(ttl_seconds=60)
+    assert frame_cache.cleanup_cache() == 1
+    assert entries(tmp_path) == ['fresh.arrow']
@@ -0,0 +1,211 @@
+import pytest
+
+from scripts import jobs
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, settings, clock):
+    settings(jobs, {
+        ('JOBS', 'db'): str(tmp_path / 'jobs.db'),
+        ('JOBS', 'max_attempts'): 2,
+        ('SCHEDULER', 'interactive_max_cost'): 100,
+        ('SCHEDULER', 'aging_seconds'): 60,
+    })
+    jobs.init_jobs_db()
+    return jobs
+
+
+def test_claim_empty_queue(queue):
+    assert queue.claim_job('w1') is None
+
+
+def test_claim_takes_lease_and_counts_attempt(queue, clock):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    job = queue.claim_job('w1', lease_seconds=30)
+    assert job['id'] == job_id
+    assert job['status'] == jobs.STATUS_RUNNING
+    assert job['lease_owner'] == 'w1'
+    assert job['lease_expires'] == clock.now + 30
+    assert job['attempts'] == 1
+    # Задача с действующей арендой не выдается второму воркеру
+    assert queue.claim_job('w2', lease_seconds=30) is None
+
+
+def test_jobs_are_claimed_in_arrival_order(queue, clock):
+    first_id = queue.enqueue_job('api', 1, 'first.xlsx')
+    clock.now += 1
+    second_id = queue.enqueue_job('api', 2, 'second.xlsx')
+    assert [queue.claim_job('w1')['id'], queue.claim_job('w2')['id']] == [first_id, second_id]
+
+
+def test_expired_lease_is_requeued(queue, clock):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    queue.claim_job('w1', lease_seconds=30)
+    clock.now += 31
+    job = queue.claim_job('w2', lease_seconds=30)
+    assert job['id'] == job_id
+    assert job['lease_owner'] == 'w2'
+    assert job['attempts'] == 2
+    # Прежний владелец больше не может продлить аренду
+    assert not queue.renew_lease(job_id, 'w1')
+    assert queue.renew_lease(job_id, 'w2')
+
+
+def test_renewed_lease_is_not_requeued(queue, clock):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    queue.claim_job('w1', lease_seconds=30)
+    clock.now += 20
+    assert queue.renew_lease(job_id, 'w1', lease_seconds=30)
+    clock.now += 20
+    assert queue.claim_job('w2') is None
+
+
+def test_expired_lease_out_of_attempts_fails(queue, clock):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    for worker in ('w1', 'w2'):
+        assert queue.claim_job(worker, lease_seconds=30)['id'] == job_id
+        clock.now += 31
+    assert queue.claim_job('w3') is None
+    job = queue.get_job(job_id)
+    assert job['status'] == jobs.STATUS_FAILED
+    assert job['lease_owner'] is None
+
+
+def test_fail_job_retries_until_max_attempts(queue):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    queue.claim_job('w1')
+    assert queue.fail_job(job_id, 'w1', 'error', retry=True) is True
+    queue.claim_job('w1')
+    assert queue.fail_job(job_id, 'w1', 'error', retry=True) is False
+    assert queue.get_job(job_id)['status'] == jobs.STATUS_FAILED
+
+
+def test_fail_job_after_lost_lease_changes_nothing(queue, clock):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    queue.claim_job('w1', lease_seconds=30)
+    clock.now += 31
+    queue.claim_job('w2', lease_seconds=30)
+    assert queue.fail_job(job_id, 'w1', 'late error', retry=True) is None
+    job = queue.get_job(job_id)
+    assert job['status'] == jobs.STATUS_RUNNING
+    assert job['lease_owner'] == 'w2'
+    assert job['error'] is None
+
+
+def test_complete_job_stores_result(queue):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    queue.claim_job('w1')
+    queue.complete_job(job_id, 'w1', '/reports/report.pdf', {'rows': 3})
+    job = queue.get_job(job_id)
+    assert job['status'] == jobs.STATUS_DONE
+    assert job['result_path'] == '/reports/report.pdf'
+    assert job['meta'] == {'rows': 3}
+
+
+def test_claim_respects_lanes(queue):
+    batch_id = queue.enqueue_job('api', 1, 'large.xlsx', cost=1000)
+    interactive_id = queue.enqueue_job('api', 1, 'small.xlsx', cost=10)
+    assert queue.claim_job('w1', lanes=[jobs.LANE_BATCH])['id'] == batch_id
+    assert queue.claim_job('w2', lanes=[jobs.LANE_INTERACTIVE])['id'] == interactive_id
+
+
+def test_small_job_overtakes_recent_large_job(queue, clock):
+    queue.enqueue_job('api', 1, 'large.xlsx', cost=1000)
+    clock.now += 30
+    small_id = queue.enqueue_job('api', 1, 'small.xlsx', cost=10)
+    assert queue.claim_job('w1')['id'] == small_id
+
+
+def test_aged_large_job_goes_before_later_small_job(queue, clock):
+    large_id = queue.enqueue_job('api', 1, 'large.xlsx', cost=1000)
+    clock.now += 61
+    queue.enqueue_job('api', 1, 'small.xlsx', cost=10)
+    assert queue.claim_job('w1')['id'] == large_id
+
+
+def test_aged_large_jobs_leave_room_for_small_jobs(queue, clock):
+    large_ids = [queue.enqueue_job('api', 1, f'large{i}.xlsx', cost=1000) for i in range(3)]
+    clock.now += 61
+    small_ids = [queue.enqueue_job('api', 2, f'small{i}.xlsx', cost=10) for i in range(2)]
+    # Крупные задачи давно ждут, но занимают не больше половины выполняемых задач
+    claimed = [queue.claim_job(f'w{i}')['id'] for i in range(4)]
+    assert claimed == [large_ids[0], small_ids[0], large_ids[1], small_ids[1]]
+    # Когда быстрых задач нет, воркер берет крупную, а не простаивает
+    assert queue.claim_job('w4')['id'] == large_ids[2]
+
+
+def test_batch_share_can_be_disabled(queue, settings, clock):
+    settings(jobs, {
+        ('JOBS', 'db'): jobs.get_setting('JOBS', 'db'),
+        ('SCHEDULER', 'interactive_max_cost'): 100,
+        ('SCHEDULER', 'aging_seconds'): 60,
+        ('SCHEDULER', 'max_batch_share'): 1,
+    })
+    large_ids = [queue.enqueue_job('api', 1, f'large{i}.xlsx', cost=1000) for i in range(2)]
+    clock.now += 61
+    queue.enqueue_job('api', 2, 'small.xlsx', cost=10)
+    assert [queue.claim_job('w1')['id'], queue.claim_job('w2')['id']] == large_ids
+
+
+def test_queue_position_is_counted_within_the_lane(queue, clock):
+    large_id = queue.enqueue_job('api', 1, 'large.xlsx', cost=1000)
+    clock.now += 61
+    first_small_id = queue.enqueue_job('api', 2, 'small1.xlsx', cost=10)
+    second_small_id = queue.enqueue_job('api', 2, 'small2.xlsx', cost=10)
+    assert queue.queue_position(large_id) == 1
+    assert queue.queue_position(first_small_id) == 1
+    assert queue.queue_position(second_small_id) == 2
+    queue.claim_job('w1')
+    assert queue.queue_position(large_id) == 0
+
+
+def test_cancel_queued_job(queue):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    assert queue.cancel_job(job_id) == jobs.STATUS_CANCELLED
+    assert queue.claim_job('w1') is None
+    assert queue.cancel_job('missing') is None
+
+
+def test_cancel_running_job_is_marked_by_worker(queue):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    queue.claim_job('w1')
+    assert not queue.is_cancel_requested(job_id)
+    assert queue.cancel_job(job_id) == jobs.STATUS_RUNNING
+    assert queue.is_cancel_requested(job_id)
+    # Отметить отмену может только воркер, владеющий задачей
+    queue.mark_cancelled(job_id, 'w2')
+    assert queue.get_job(job_id)['status'] == jobs.STATUS_RUNNING
+    queue.mark_cancelled(job_id, 'w1')
+    assert queue.get_job(job_id)['status'] == jobs.STATUS_CANCELLED
+
+
+def test_expired_lease_of_cancelled_job_is_cancelled(queue, clock):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    queue.claim_job('w1', lease_seconds=30)
+    assert queue.cancel_job(job_id) == jobs.STATUS_RUNNING
+    clock.now += 31
+    # Воркер пропал, не успев отметить отмену: задача не возвращается в очередь
+    assert queue.claim_job('w2') is None
+    assert queue.get_job(job_id)['status'] == jobs.STATUS_CANCELLED
+
+
+def test_finished_job_is_not_cancelled(queue):
+    job_id = queue.enqueue_job('api', 1, 'statement.xlsx')
+    queue.claim_job('w1')
+    queue.complete_job(job_id, 'w1', 'report.pdf')
+    assert queue.cancel_job(job_id) == jobs.STATUS_DONE
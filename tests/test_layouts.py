@@ -0,0 +1,61 @@
+import json
+
+from scripts import layouts
+from scripts.synthetic import make_statement
+from scripts.layouts import DEFAULT_LAYOUTS, Layout, detect_layout, file_layout, header_columns, header_fingerprint
+
+
+def test_header_columns_match_pandas_names():
+    assert header_columns(['Операции на счетах', None, ''], 4) == [
+        'Операции на счетах', 'Unnamed: 1', 'Unnamed: 2', 'Unnamed: 3']
+
+
+def test_fingerprint_depends_on_names_and_order():
+    assert header_fingerprint(['a', 'b']) == header_fingerprint(['a', 'b'])
+    assert header_fingerprint(['a', 'b']) != header_fingerprint(['b', 'a'])
+    assert header_fingerprint(['a', 'b']) != header_fingerprint(['ab'])
+
+
+def test_trailing_empty_cells_are_part_of_fingerprint():
+    layout = Layout(DEFAULT_LAYOUTS[0])
+    assert layout.fingerprint == header_fingerprint(header_columns(['Операции на счетах'], 36))
+    assert layout.fingerprint != header_fingerprint(header_columns(['Операции на счетах'], 35))
+
+
+def test_version_changes_with_spec():
+    spec = dict(DEFAULT_LAYOUTS[0])
+    assert Layout(spec).version == Layout(dict(spec)).version
+    assert Layout(spec).version != Layout(dict(spec, skip_rows=[12])).version
+
+
+def test_detect_builtin_layouts(tmp_path, settings, monkeypatch):
+    settings(layouts, {('LAYOUTS', 'file'): str(tmp_path / 'missing.json')})
+    monkeypatch.setattr(layouts, '_registry', {'mtime': None, 'layouts': {}})
+    assert detect_layout(header_columns(['Операции на счетах'], 36)).name == 'default'
+    assert detect_layout(header_columns([], 36)).name == 'default_untitled'
+    assert detect_layout(header_columns(['Другой банк'], 36)) is None
+
+
+def test_layouts_file_adds_bank(tmp_path, settings, monkeypatch):
+    layouts_file = tmp_path / 'layouts.json'
+    layouts_file.write_text(json.dumps([{
+        'name': 'other_bank',
+        'header': ['Дата', 'Плательщик', 'ИНН', 'Сумма'],
+        'header_row': 0,
+        'columns': {'COLUMN1.1': 'Плательщик'},
+    }, {
+        'name': 'broken',
+    }], ensure_ascii=False), encoding='utf-8')
+    settings(layouts, {('LAYOUTS', 'file'): str(layouts_file)})
+    monkeypatch.setattr(layouts, '_registry', {'mtime': None, 'layouts': {}})
+    layout = detect_layout(['Дата', 'Плательщик', 'ИНН', 'Сумма'])
+    assert layout.name == 'other_bank'
+    assert layout.renames() == {'Плательщик': 'COLUMN1.1'}
+    assert detect_layout(header_columns(['Операции на счетах'], 36)).name == 'default'
+
+
+def test_synthetic_statement_has_default_layout(tmp_path, settings, monkeypatch):
+    settings(layouts, {('LAYOUTS', 'file'): str(tmp_path / 'missing.json')})
+    monkeypatch.setattr(layouts, '_registry', {'mtime': None, 'layouts': {}})
+    file_path = make_statement(str(tmp_path / 'statement.xlsx'), 20, 5)
+    assert file_layout(file_path).name == 'default'
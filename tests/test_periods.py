@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from scripts.periods import parse_period, period_mask
+
+
+def test_parse_period_range():
+    ranges, months = parse_period('2024-01-10..2024-02-05')
+    assert ranges == [(pd.Timestamp('2024-01-10'), pd.Timestamp('2024-02-06'))]
+    assert months == set()
+
+
+def test_parse_period_open_range():
+    assert parse_period('..2024-02-05')[0] == [(None, pd.Timestamp('2024-02-06'))]
+    assert parse_period('2024-01-10..')[0] == [(pd.Timestamp('2024-01-10'), None)]
+
+
+@pytest.mark.parametrize('period, start, end', [
+    ('2024-Q1', '2024-01-01', '2024-04-01'),
+    ('2024-q4', '2024-10-01', '2025-01-01'),
+    ('2024-02', '2024-02-01', '2024-03-01'),
+    ('2024', '2024-01-01', '2025-01-01'),
+])
+def test_parse_period_calendar_units(period, start, end):
+    assert parse_period(period) == ([(pd.Timestamp(start), pd.Timestamp(end))], set())
+
+
+def test_parse_period_months_without_year():
+    assert parse_period('01 02 03') == ([], {1, 2, 3})
+
+
+def test_parse_period_several_parts():
+    ranges, months = parse_period('2024-01, 2024-Q3,05')
+    assert len(ranges) == 2
+    assert months == {5}
+
+
+def test_parse_period_empty():
+    assert parse_period('') == ([], set())
+    assert parse_period(None) == ([], set())
+
+
+@pytest.mark.parametrize('period', ['2024-Q5', '2024-13', '13', '00', 'январь', '2024/01', '2024-02-30..', '2024-01?02'])
+def test_parse_period_invalid(period):
+    with pytest.raises(ValueError):
+        parse_period(period)
+
+
+def test_parse_period_rejects_reversed_range():
+    with pytest.raises(ValueError):
+        parse_period('2024-02-05..2024-01-10')
+    # Однодневный диапазон допустим
+    assert parse_period('2024-01-10..2024-01-10')[0] == [(pd.Timestamp('2024-01-10'), pd.Timestamp('2024-01-11'))]
+
+
+def test_period_mask_range_bounds_are_inclusive():
+    dates = pd.Series(pd.to_datetime(['2024-01-09 00:00', '2024-01-10 00:00', '2024-02-05 18:00', '2024-02-06 00:00']))
+    assert list(period_mask(dates, '2024-01-10..2024-02-05')) == [False, True, True, False]
+
+
+def test_period_mask_skips_rows_without_date():
+    dates = pd.Series(pd.to_datetime(['2024-03-01', None, '2023-03-01']))
+    assert list(period_mask(dates, '2024..')) == [True, False, False]
+    assert list(period_mask(dates, '..2030-01-01')) == [True, False, True]
+    assert list(period_mask(dates, '03')) == [True, False, True]
+
+
+def test_period_mask_union_keeps_row_order():
+    dates = pd.Series(pd.to_datetime(['2024-05-02', '2024-01-15', '2023-07-01', '2024-03-31']))
+    assert list(period_mask(dates, '2024-01, 07')) == [False, True, True, False]
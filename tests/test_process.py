@@ -0,0 +1,19 @@
+import os
+
+from scripts import process
+
+
+def test_statement_pool_is_shared_and_spawned(settings):
+    settings(process, {('CONSOLIDATE', 'processes'): 1})
+    pool = process.get_statement_pool()
+    try:
+        assert process.get_statement_pool() is pool
+        assert pool._mp_context.get_start_method() == 'spawn'
+        assert pool.submit(os.getpid).result(timeout=60) != os.getpid()
+        # Остановка чужого (уже замененного) пула не трогает текущий
+        process.shutdown_statement_pool(object())
+        assert process.get_statement_pool() is pool
+    finally:
+        process.shutdown_statement_pool()
+    assert process.get_statement_pool() is not pool
+    process.shutdown_statement_pool()
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.quality import (INN10_WEIGHTS, INN11_WEIGHTS, INN12_WEIGHTS, STATUS_BAD_CHECKSUM, STATUS_BAD_FORMAT,
+                             STATUS_EMPTY, STATUS_INN10, STATUS_INN12, STATUS_KPP, _control_digit, _digit_matrix,
+                             classify_inns, quality_summary)
+
+
+def test_control_digit_inn10():
+    digits = _digit_matrix(np.array(['7707083893', '7736207543']), 10)
+    assert list(_control_digit(digits, INN10_WEIGHTS)) == [3, 3]
+
+
+def test_control_digits_inn12():
+    digits = _digit_matrix(np.array(['500100732259']), 12)
+    assert _control_digit(digits, INN11_WEIGHTS)[0] == 5
+    assert _control_digit(digits, INN12_WEIGHTS)[0] == 9
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('7707083893', STATUS_INN10),
+    ('7707083894', STATUS_BAD_CHECKSUM),
+    ('500100732259', STATUS_INN12),
+    ('500100732258', STATUS_BAD_CHECKSUM),
+    ('500100732269', STATUS_BAD_CHECKSUM),
+    ('773601001', STATUS_KPP),
+    ('7736AB001', STATUS_KPP),
+    ('77070838', STATUS_BAD_FORMAT),
+    ('77070838X3', STATUS_BAD_FORMAT),
+    ('', STATUS_EMPTY),
+    ('nan', STATUS_EMPTY),
+    ('None', STATUS_EMPTY),
+    (None, STATUS_EMPTY),
+    (np.nan, STATUS_EMPTY),
+    (pd.NaT, STATUS_EMPTY),
+    (pd.NA, STATUS_EMPTY),
+])
+def test_classify_inns(value, expected):
+    assert classify_inns([value])[0] == expected
+
+
+def test_classify_inns_normalizes_numbers_and_spaces():
+    assert list(classify_inns([7707083893.0, '7707083893.0', ' 7707083893 '])) == [STATUS_INN10] * 3
+
+
+def test_classify_inns_mixed_widths_keep_positions():
+    values = ['500100732259', '7707083893', 'abc', '7707083894']
+    assert list(classify_inns(values)) == [STATUS_INN12, STATUS_INN10, STATUS_BAD_FORMAT, STATUS_BAD_CHECKSUM]
+
+
+def test_quality_summary_weights_by_row_count():
+    summary = quality_summary(10, 1, ['7707083893', '7707083894', ''], [6, 3, 1])
+    assert summary['rows'] == 10
+    assert summary['empty_names'] == 1
+    assert summary['inn'][STATUS_INN10] == 6
+    assert summary['inn'][STATUS_BAD_CHECKSUM] == 3
+    assert summary['inn'][STATUS_EMPTY] == 1
+    assert summary['examples'][STATUS_BAD_CHECKSUM] == ['7707083894']
+
+
+def test_classify_inns_accepts_series_with_missing_values():
+    values = pd.Series(['7707083893', None, np.nan], dtype=object)
+    assert list(classify_inns(values)) == [STATUS_INN10, STATUS_EMPTY, STATUS_EMPTY]
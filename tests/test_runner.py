@@ -0,0 +1,62 @@
+import os
+import sys
+from configparser import ConfigParser
+
+import pytest
+
+import runner
+
+
+def make_config(text: str) -> ConfigParser:
+    config = ConfigParser()
+    config.read_string(text)
+    return config
+
+
+def test_build_managed_processes_passes_max_jobs_to_workers():
+    config = make_config("""
+[SUPERVISOR]
+api = 1
+bot = 0
+max_jobs = 50
+[WORKER]
+processes = 2
+interactive_processes = 1
+""")
+    processes = runner.build_managed_processes(config)
+    assert [managed.name for managed in processes] == ['api', 'worker-0', 'worker-1']
+    assert processes[1].command.endswith('worker.py --id 0 --lanes interactive --max-jobs 50')
+    assert processes[2].command.endswith('worker.py --id 1 --max-jobs 50')
+
+
+def test_read_pids_supports_old_format(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / runner.PID_FILE).write_text('12345\n')
+    assert runner.read_pids() == [('main', 12345)]
+    (tmp_path / runner.PID_FILE).write_text('supervisor 1\nworker-0 2\n')
+    assert runner.read_pids() == [('supervisor', 1), ('worker-0', 2)]
+
+
+def test_format_uptime():
+    assert runner.format_uptime(3723.9) == '1ч 02м 03с'
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='нужен /proc')
+def test_spawn_writes_logs_and_keeps_no_descriptors(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    open_fds = len(os.listdir('/proc/self/fd'))
+    for _ in range(5):
+        runner.spawn(f'{sys.executable} -c "print(42)"').wait(timeout=30)
+    assert len(os.listdir('/proc/self/fd')) == open_fds
+    assert (tmp_path / 'output.log').read_text().split() == ['42'] * 5
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='группы процессов POSIX')
+def test_managed_process_start_and_stop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    managed = runner.ManagedProcess('sleeper', f'{sys.executable} -c "import time; time.sleep(60)"')
+    managed.start()
+    assert managed.state()['pid'] == managed.process.pid
+    managed.stop(timeout=10)
+    assert managed.process.poll() is not None
+    assert managed.state()['pid'] is None
@@ -0,0 +1,42 @@
+import pytest
+
+from scripts import frame_cache, layouts, process, streaming
+from scripts.synthetic import make_statement
+
+
+@pytest.fixture
+def statement(tmp_path, settings, monkeypatch):
+    # prepare_table пишет промежуточный файл в текущую папку
+    monkeypatch.chdir(tmp_path)
+    settings(frame_cache, {('CACHE', 'enabled'): False})
+    settings(layouts, {('LAYOUTS', 'file'): str(tmp_path / 'missing.json')})
+    monkeypatch.setattr(layouts, '_registry', {'mtime': None, 'layouts': {}})
+    return make_statement(str(tmp_path / 'statement.xlsx'), 1500, 40, seed=7)
+
+
+def streamed(settings, enabled: bool) -> None:
+    settings(streaming, {('EXCEL', 'stream_min_mb'): 0.0001 if enabled else 0})
+
+
+@pytest.mark.parametrize('period', ['', '2024-Q1', '03, 2024-06-01..2024-06-15'])
+def test_streaming_aggregation_matches_table(statement, settings, period):
+    streamed(settings, False)
+    expected = process.aggregate_statement(statement, False, period)
+    streamed(settings, True)
+    assert process.aggregate_statement(statement, False, period) == expected
+
+
+def test_streaming_preview_matches_table(statement, settings):
+    streamed(settings, False)
+    expected = process.preview_statement(statement, 5, '2024-Q2')
+    streamed(settings, True)
+    preview = process.preview_statement(statement, 5, '2024-Q2')
+    assert preview == expected
+    assert preview['period']['from'] >= '2024-04-01' and preview['period']['to'] <= '2024-06-30'
+
+
+def test_table_keeps_leading_zeros_of_inns(statement, settings):
+    streamed(settings, False)
+    inns = {item['company_inn'] for item in process.aggregate_statement(statement)['column2']}
+    assert any(inn.startswith('0') for inn in inns)
+    assert all(len(inn) in (10, 12) for inn in inns)
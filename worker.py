@@ -0,0 +1,99 @@
+#RU
+# Этот скрипт запускает отдельный процесс-воркер для генерации отчетов.
+# Воркер забирает задачи из общей очереди (jobs.db) и складывает готовые отчеты
+# в общую папку артефактов. Таких процессов можно запустить сколько угодно независимо от API и бота,
+# но на той же машине: SQLite в режиме WAL не работает на сетевых дисках, а задачи хранят
+# абсолютные пути к входным файлам в локальной папке downloads.
+
+#ENG
+# This script runs a standalone report worker process.
+# The worker claims jobs from the shared queue (jobs.db) and puts finished reports
+# into the shared artifacts folder. Any number of such processes can be started independently of the API
+# and the bot, but on the same host: SQLite WAL mode does not work on network drives, and jobs keep
+# absolute paths to input files in the local downloads folder.
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from main import init_logs
+from scripts.browser import get_browser_pool
+from scripts.commands import get_setting
+from scripts.jobs import init_jobs_db, LANE_INTERACTIVE, LANE_BATCH
+from scripts.process import warm_up
+from scripts.worker import work_loop, make_worker_id, cleanup_orphans
+
+#RU
+# Функция run_workers
+# На вход: номер процесса-воркера, число параллельных задач в процессе, интервал опроса, лимит задач
+# и полосы очереди, которые обслуживает воркер (по умолчанию все).
+# Возвращает: ничего.
+# Прогревает процесс и обрабатывает задачи до получения SIGTERM/SIGINT
+# или до выполнения max_jobs задач (после этого супервизор перезапускает процесс).
+
+#ENG
+# Function run_workers
+# Input: worker process index, number of concurrent jobs per process, polling interval, job limit,
+# and the queue lanes the worker serves (all by default).
+# Returns: none.
+# Warms the process up and processes jobs until SIGTERM/SIGINT is received
+# or until max_jobs jobs are done (the supervisor then restarts the process).
+async def run_workers(index: int, concurrency: int, poll_interval: float, max_jobs: int = 0,
+                      lanes: list = None) -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, AttributeError, ValueError):
+            # Windows: обработчики сигналов в цикле событий не поддерживаются
+            pass
+
+    if get_setting('RENDER', 'warmup', True, bool):
+        try:
+            await warm_up()
+        except Exception as e:
+            logging.error(f'Ошибка при прогреве воркера: {e}')
+
+    try:
+        await asyncio.gather(*(
+            work_loop(make_worker_id(f'{index}.{n}'), poll_interval, stop_event, max_jobs, lanes)
+            for n in range(concurrency)
+        ))
+    finally:
+        await get_browser_pool().close()
+        logging.info(f'Воркер {index} остановлен')
+
+#RU
+# Функция main
+# На вход: ничего (аргументы командной строки обрабатываются автоматически).
+# Возвращает: ничего.
+
+#ENG
+# Function main
+# Input: none (command-line arguments are processed automatically).
+# Returns: none.
+def main():
+    parser = argparse.ArgumentParser(description="Процесс-воркер для генерации отчетов")
+    parser.add_argument("-i", "--id", type=int, default=0, help="Номер воркера")
+    parser.add_argument("-c", "--concurrency", type=int,
+                        default=get_setting('WORKER', 'concurrency', 1, int),
+                        help="Сколько задач обрабатывать параллельно в одном процессе")
+    parser.add_argument("-p", "--poll", type=float,
+                        default=get_setting('WORKER', 'poll_interval', 2, float),
+                        help="Интервал опроса очереди в секундах")
+    parser.add_argument("-m", "--max-jobs", type=int, default=0,
+                        help="Завершить процесс после стольких задач (0 - без ограничения)")
+    parser.add_argument("-l", "--lanes", nargs="*", choices=[LANE_INTERACTIVE, LANE_BATCH],
+                        help="Полосы очереди, которые обслуживает воркер (по умолчанию все)")
+    args = parser.parse_args()
+
+    init_logs()
+    init_jobs_db()
+    cleanup_orphans()
+    logging.info(f'Запускаем воркер {args.id} ({args.concurrency} задач параллельно)')
+    asyncio.run(run_workers(args.id, max(1, args.concurrency), args.poll, args.max_jobs, args.lanes))
+
+if __name__ == "__main__":
+    main()